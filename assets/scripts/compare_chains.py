@@ -28,9 +28,15 @@ Usage:
 
 import argparse
 import gzip
+import os
 import sys
 from collections import defaultdict
 
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../bin")
+)
+from profiling import run_main  # noqa: E402
+
 
 def parse_chain_headers(path):
     """Yield one dict per `chain ...` header line in a .chain or .chain.gz file."""
@@ -199,4 +205,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    run_main(main)
@@ -0,0 +1,546 @@
+#!/usr/bin/env python3
+"""Live throughput, ETA and straggler monitor for a running pipeline.
+
+Complements nf_watchdog.sh (which only detects a stalled head job) with
+progress numbers. Every --interval seconds the monitor:
+
+  - reads the rows appended to the Nextflow trace file since the last check
+    (the newest results/pipeline_info/execution_trace_*.txt by default);
+  - reads the submitted tasks from .nextflow.log, so tasks that are still
+    running (not yet in the trace) are known, and takes their start time
+    from .command.begin in their work directory;
+  - counts finished LASTZ pairs: one per LASTZ task, and the lines of
+    packed_pairs.tsv (per-task telemetry) for LASTZ_PACKED tasks, including
+    the pairs already finished by packs still running;
+  - computes the rolling task (and pair) throughput per process over the
+    last --window seconds and projects the LASTZ finish time from the
+    remaining pair count (reference x query partitions in 01_partition,
+    summed over the pairs of --pairs for all-vs-all runs, or --total_pairs);
+  - flags stragglers: tasks whose runtime, or elapsed time while running,
+    exceeds --straggler_factor times the median runtime of at least
+    --min_peers completed tasks of the same process.
+
+The status is rewritten atomically to a text and a JSON file, so it can be
+followed with `watch cat` or scraped on a headless cluster node.
+
+Usage:
+    python3 nf_monitor.py --run_dir /path/to/launch_dir [--interval 60]
+        [--outdir results] [--trace trace.txt] [--work_dir work]
+        [--status nf_monitor_status.txt] [--json nf_monitor_status.json]
+        [--window 3600] [--straggler_factor 3] [--total_pairs N]
+        [--pairs pairs.tsv] [--once]
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+import statistics
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+LASTZ_PROCESSES = ("LASTZ", "LASTZ_PACKED")
+PACKED_MANIFEST = "packed_pairs.tsv"
+FINISHED_STATES = ("COMPLETED", "CACHED")
+FAILED_STATES = ("FAILED", "ABORTED")
+TRACE_TIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+SUBMITTED_RE = re.compile(
+    r"\[([0-9a-f]{2}/[0-9a-f]{6})\] Submitted process > (\S+)(?: \((.*)\))?\s*$"
+)
+DURATION_UNITS = {"d": 86400, "h": 3600, "m": 60, "s": 1, "ms": 0.001}
+
+
+@dataclass
+class Task:
+    """One task, from the trace (finished) or the log (running)."""
+
+    hash: str
+    process: str
+    name: str
+    status: str = "SUBMITTED"
+    workdir: str | None = None
+    start: float | None = None
+    complete: float | None = None
+    realtime: float | None = None
+    pairs: int = 0
+
+
+@dataclass
+class MonitorState:
+    """Everything read so far; the trace and the log are read incrementally."""
+
+    tasks: dict[str, Task] = field(default_factory=dict)
+    trace_path: str | None = None
+    trace_offset: int = 0
+    trace_header: list[str] | None = None
+    log_offset: int = 0
+    finished_run: bool = False
+
+
+def short_process(process: str) -> str:
+    """Drop the workflow/subworkflow prefix of a process name."""
+    return process.rsplit(":", 1)[-1]
+
+
+def parse_duration(value: str) -> float | None:
+    """Parse a trace duration ("1h 2m 3s", "850ms" or raw milliseconds)."""
+    value = (value or "").strip()
+    if not value or value == "-":
+        return None
+    if value.isdigit():
+        return int(value) / 1000
+    parts = re.findall(r"([\d.]+)\s*(ms|d|h|m|s)", value)
+    if not parts:
+        return None
+    return sum(float(number) * DURATION_UNITS[unit] for number, unit in parts)
+
+
+def parse_timestamp(value: str) -> float | None:
+    """Parse a trace timestamp ("2026-01-31 12:00:00.000") to epoch seconds."""
+    value = (value or "").strip()
+    if not value or value == "-":
+        return None
+    for fmt in (TRACE_TIME_FORMAT, "%Y-%m-%d %H:%M:%S"):
+        try:
+            return datetime.strptime(value, fmt).timestamp()
+        except ValueError:
+            continue
+    return None
+
+
+def find_trace(outdir: str) -> str | None:
+    """Return the newest execution trace of the run, if any."""
+    paths = glob.glob(os.path.join(outdir, "pipeline_info", "execution_trace_*.txt"))
+    return max(paths, key=os.path.getmtime) if paths else None
+
+
+def read_new_lines(path: str, offset: int) -> tuple[list[str], int]:
+    """Return complete lines appended to path after offset, and the new offset.
+
+    A file that shrank (a new run reusing the name) is read from the start.
+    """
+    if os.path.getsize(path) < offset:
+        offset = 0
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read()
+    end = data.rfind(b"\n") + 1
+    return data[:end].decode(errors="replace").splitlines(), offset + end
+
+
+def count_manifest_pairs(workdir: str | None) -> int | None:
+    """Return the number of pairs listed in a task's packed_pairs.tsv."""
+    if not workdir:
+        return None
+    path = os.path.join(workdir, PACKED_MANIFEST)
+    try:
+        with open(path) as f:
+            return sum(1 for line in f if line.strip())
+    except OSError:
+        return None
+
+
+def update_from_trace(state: MonitorState, pack_size: int) -> None:
+    """Apply the trace rows written since the last update."""
+    if not state.trace_path or not os.path.exists(state.trace_path):
+        return
+    lines, state.trace_offset = read_new_lines(state.trace_path, state.trace_offset)
+    for line in lines:
+        fields = line.split("\t")
+        if state.trace_header is None or fields[0] == "task_id":
+            state.trace_header = fields
+            continue
+        row = dict(zip(state.trace_header, fields))
+        task_hash = row.get("hash", "")
+        process = short_process(row.get("process", ""))
+        task = state.tasks.get(task_hash) or Task(
+            task_hash, process, row.get("name", "")
+        )
+        task.status = row.get("status", "")
+        task.workdir = row.get("workdir") or task.workdir
+        task.start = parse_timestamp(row.get("start", "")) or task.start
+        task.complete = parse_timestamp(row.get("complete", ""))
+        task.realtime = parse_duration(row.get("realtime", ""))
+        if task.status in FINISHED_STATES and process in LASTZ_PROCESSES:
+            if process == "LASTZ_PACKED":
+                pairs = count_manifest_pairs(task.workdir)
+                task.pairs = pack_size if pairs is None else pairs
+            else:
+                task.pairs = 1
+        state.tasks[task_hash] = task
+
+
+def update_from_log(state: MonitorState, log_path: str) -> None:
+    """Register tasks submitted since the last update."""
+    if not os.path.exists(log_path):
+        return
+    lines, state.log_offset = read_new_lines(log_path, state.log_offset)
+    for line in lines:
+        match = SUBMITTED_RE.search(line)
+        if match:
+            task_hash, process, tag = match.groups()
+            if task_hash not in state.tasks:
+                name = f"{short_process(process)} ({tag})" if tag else process
+                state.tasks[task_hash] = Task(task_hash, short_process(process), name)
+        elif "Goodbye" in line:
+            state.finished_run = True
+
+
+def refresh_running(state: MonitorState, work_dir: str) -> None:
+    """Locate work directories of running tasks and read their progress."""
+    for task in state.tasks.values():
+        if task.status in FINISHED_STATES or task.status in FAILED_STATES:
+            continue
+        if task.workdir is None:
+            matches = glob.glob(os.path.join(work_dir, f"{task.hash}*"))
+            task.workdir = matches[0] if len(matches) == 1 else None
+        if task.workdir and task.start is None:
+            try:
+                task.start = os.path.getmtime(
+                    os.path.join(task.workdir, ".command.begin")
+                )
+            except OSError:
+                pass
+        if task.process == "LASTZ_PACKED":
+            task.pairs = count_manifest_pairs(task.workdir) or 0
+
+
+def count_partitions(path: str) -> int | None:
+    """Return the number of partition strings in a partition file."""
+    try:
+        with open(path) as f:
+            return sum(1 for line in f if line.strip())
+    except OSError:
+        return None
+
+
+def read_pairs_sheet(path: str) -> list[tuple[str, str]]:
+    """Return the (reference_name, query_name) pairs of an all-vs-all sheet."""
+    pairs = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip() or line.startswith("#"):
+                continue
+            fields = [field.strip() for field in line.split("\t")]
+            pairs.append((fields[0], fields[2]))
+    return pairs
+
+
+def total_lastz_pairs(
+    outdir: str, total_pairs: int | None, pairs_sheet: str | None
+) -> int | None:
+    """Return the number of LASTZ pairs of the run, if it can be known."""
+    if total_pairs:
+        return total_pairs
+    partition_dir = os.path.join(outdir, "01_partition")
+    if pairs_sheet:
+        # All-vs-all runs publish the partitions of each genome to its own dir.
+        total = 0
+        for reference_name, query_name in read_pairs_sheet(pairs_sheet):
+            reference = count_partitions(
+                os.path.join(partition_dir, reference_name, "reference_partitions.txt")
+            )
+            query = count_partitions(
+                os.path.join(partition_dir, query_name, "query_partitions.txt")
+            )
+            if reference is None or query is None:
+                return None
+            total += reference * query
+        return total
+    reference = count_partitions(
+        os.path.join(partition_dir, "reference_partitions.txt")
+    )
+    query = count_partitions(os.path.join(partition_dir, "query_partitions.txt"))
+    if reference is None or query is None:
+        return None
+    return reference * query
+
+
+def summarize(state: MonitorState, args: argparse.Namespace, now: float) -> dict:
+    """Build the status report from the current state."""
+    window_start = now - args.window
+    processes: dict[str, dict] = {}
+    runtimes: dict[str, list[float]] = {}
+    for task in state.tasks.values():
+        info = processes.setdefault(
+            task.process,
+            {
+                "completed": 0,
+                "cached": 0,
+                "failed": 0,
+                "running": 0,
+                "queued": 0,
+                "tasks_per_hour": 0.0,
+            },
+        )
+        if task.status == "COMPLETED":
+            info["completed"] += 1
+            if task.realtime is not None:
+                runtimes.setdefault(task.process, []).append(task.realtime)
+            if task.complete is not None and task.complete >= window_start:
+                info["tasks_per_hour"] += 3600 / args.window
+        elif task.status == "CACHED":
+            info["cached"] += 1
+        elif task.status in FAILED_STATES:
+            info["failed"] += 1
+        else:
+            info["running" if task.start is not None else "queued"] += 1
+
+    stragglers = []
+    for process, info in processes.items():
+        values = runtimes.get(process, [])
+        info["median_runtime_s"] = statistics.median(values) if values else None
+        info["p90_runtime_s"] = (
+            statistics.quantiles(values, n=10, method="inclusive")[-1]
+            if len(values) >= 2
+            else None
+        )
+        info["tasks_per_hour"] = round(info["tasks_per_hour"], 2)
+        if len(values) < args.min_peers:
+            continue
+        median = info["median_runtime_s"]
+        for task in state.tasks.values():
+            if task.process != process or median <= 0:
+                continue
+            if task.status == "COMPLETED" and task.realtime is not None:
+                runtime, task_state = task.realtime, "completed"
+            elif task.status not in FAILED_STATES + ("CACHED",) and task.start:
+                runtime, task_state = now - task.start, "running"
+            else:
+                continue
+            if runtime > args.straggler_factor * median:
+                stragglers.append(
+                    {
+                        "process": process,
+                        "name": task.name,
+                        "hash": task.hash,
+                        "state": task_state,
+                        "runtime_s": round(runtime),
+                        "median_s": round(median),
+                        "ratio": round(runtime / median, 1),
+                        "workdir": task.workdir,
+                    }
+                )
+    stragglers.sort(key=lambda item: (item["state"] != "running", -item["ratio"]))
+
+    lastz_tasks = [t for t in state.tasks.values() if t.process in LASTZ_PROCESSES]
+    done_pairs = sum(t.pairs for t in lastz_tasks)
+    # CACHED tasks carry the timestamps of an earlier run; rates only count
+    # tasks executed by this one.
+    completed = [t for t in lastz_tasks if t.status == "COMPLETED" and t.complete]
+    recent_pairs = sum(t.pairs for t in completed if t.complete >= window_start)
+    pairs_per_hour = recent_pairs * 3600 / args.window
+    rate_scope = "window"
+    if not recent_pairs and completed:
+        # Nothing finished inside the window: fall back to the whole-run rate.
+        first = min(t.start or t.complete for t in completed)
+        elapsed = max(t.complete for t in completed) - first
+        if elapsed > 0:
+            pairs_per_hour = sum(t.pairs for t in completed) * 3600 / elapsed
+            rate_scope = "run"
+    total = total_lastz_pairs(args.outdir, args.total_pairs, args.pairs)
+    remaining = max(0, total - done_pairs) if total is not None else None
+    eta_hours = remaining / pairs_per_hour if remaining and pairs_per_hour else None
+    if remaining == 0:
+        eta_hours = 0.0
+
+    return {
+        "generated": datetime.fromtimestamp(now).isoformat(timespec="seconds"),
+        "trace": state.trace_path,
+        "window_s": args.window,
+        "run_finished": state.finished_run,
+        "processes": dict(sorted(processes.items())),
+        "lastz": {
+            "total_pairs": total,
+            "done_pairs": done_pairs,
+            "remaining_pairs": remaining,
+            "pairs_per_hour": round(pairs_per_hour, 1),
+            "rate_scope": rate_scope,
+            "eta_hours": round(eta_hours, 2) if eta_hours is not None else None,
+            "eta": (
+                (datetime.fromtimestamp(now) + timedelta(hours=eta_hours)).isoformat(
+                    timespec="minutes"
+                )
+                if eta_hours is not None
+                else None
+            ),
+        },
+        "stragglers": stragglers[: args.max_stragglers],
+    }
+
+
+def format_seconds(value: float | None) -> str:
+    """Format a duration as H:MM:SS, or '-' when unknown."""
+    if value is None:
+        return "-"
+    value = int(value)
+    return f"{value // 3600}:{value % 3600 // 60:02d}:{value % 60:02d}"
+
+
+def format_report(report: dict) -> str:
+    """Render the status report as plain text."""
+    lines = [
+        f"make_lastz_chains status at {report['generated']}",
+        f"trace: {report['trace'] or '(not found yet)'}",
+        "",
+        f"{'process':<28}{'done':>8}{'cached':>8}{'failed':>8}{'running':>9}"
+        f"{'queued':>8}{'tasks/h':>9}{'median':>10}{'p90':>10}",
+    ]
+    for process, info in report["processes"].items():
+        lines.append(
+            f"{process:<28}{info['completed']:>8}{info['cached']:>8}"
+            f"{info['failed']:>8}{info['running']:>9}{info['queued']:>8}"
+            f"{info['tasks_per_hour']:>9}{format_seconds(info['median_runtime_s']):>10}"
+            f"{format_seconds(info['p90_runtime_s']):>10}"
+        )
+    lastz = report["lastz"]
+    total = lastz["total_pairs"] if lastz["total_pairs"] is not None else "?"
+    if lastz["rate_scope"] == "run":
+        scope = (
+            f"over the whole run (none finished in the last "
+            f"{report['window_s'] // 60} min)"
+        )
+    else:
+        scope = f"over the last {report['window_s'] // 60} min"
+    lines += [
+        "",
+        f"LASTZ pairs: {lastz['done_pairs']} / {total} done, "
+        f"{lastz['pairs_per_hour']} pairs/h {scope}",
+        f"LASTZ ETA:   {lastz['eta'] or '-'}"
+        + (f" ({lastz['eta_hours']} h)" if lastz["eta_hours"] is not None else ""),
+        "",
+        f"Stragglers ({len(report['stragglers'])}):",
+    ]
+    for item in report["stragglers"]:
+        lines.append(
+            f"  [{item['hash']}] {item['name']} {item['state']} "
+            f"{format_seconds(item['runtime_s'])} = {item['ratio']}x median "
+            f"{format_seconds(item['median_s'])}"
+        )
+    if report["run_finished"]:
+        lines += ["", "Run finished."]
+    return "\n".join(lines) + "\n"
+
+
+def write_atomic(path: str, content: str) -> None:
+    """Replace path with content so readers never see a partial file."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command-line arguments for the monitor."""
+    ap = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    ap.add_argument("--run_dir", default=".", help="Nextflow launch directory")
+    ap.add_argument(
+        "--outdir", default=None, help="Pipeline outdir (default: RUN_DIR/results)"
+    )
+    ap.add_argument(
+        "--trace",
+        default=None,
+        help="Trace file (default: newest in OUTDIR/pipeline_info)",
+    )
+    ap.add_argument(
+        "--work_dir",
+        default=None,
+        help="Nextflow work directory (default: RUN_DIR/work)",
+    )
+    ap.add_argument(
+        "--status",
+        default=None,
+        help="Text status file (default: RUN_DIR/nf_monitor_status.txt)",
+    )
+    ap.add_argument(
+        "--json",
+        default=None,
+        help="JSON status file (default: RUN_DIR/nf_monitor_status.json)",
+    )
+    ap.add_argument(
+        "--interval",
+        type=int,
+        default=60,
+        help="Seconds between refreshes (default: 60)",
+    )
+    ap.add_argument(
+        "--window",
+        type=int,
+        default=3600,
+        help="Rolling throughput window in seconds (default: 3600)",
+    )
+    ap.add_argument(
+        "--straggler_factor",
+        type=float,
+        default=3.0,
+        help="Flag tasks slower than this many times the process median (default: 3)",
+    )
+    ap.add_argument(
+        "--min_peers",
+        type=int,
+        default=5,
+        help="Completed tasks needed before flagging stragglers (default: 5)",
+    )
+    ap.add_argument(
+        "--max_stragglers",
+        type=int,
+        default=20,
+        help="Stragglers listed in the report (default: 20)",
+    )
+    ap.add_argument(
+        "--total_pairs",
+        type=int,
+        default=None,
+        help="Total LASTZ pairs (default: from 01_partition)",
+    )
+    ap.add_argument(
+        "--pairs",
+        default=None,
+        help="Genome pairs sheet of an all-vs-all run (--pairs of the pipeline)",
+    )
+    ap.add_argument(
+        "--pack_size",
+        type=int,
+        default=16,
+        help="Pairs per LASTZ_PACKED task without a manifest (default: 16)",
+    )
+    ap.add_argument("--once", action="store_true", help="Write one report and exit")
+    args = ap.parse_args()
+    args.outdir = args.outdir or os.path.join(args.run_dir, "results")
+    args.work_dir = args.work_dir or os.path.join(args.run_dir, "work")
+    args.status = args.status or os.path.join(args.run_dir, "nf_monitor_status.txt")
+    args.json = args.json or os.path.join(args.run_dir, "nf_monitor_status.json")
+    args.window = max(60, args.window)
+    return args
+
+
+def main() -> None:
+    """Refresh the status report until the run finishes (or once)."""
+    args = parse_args()
+    state = MonitorState(trace_path=args.trace)
+    log_path = os.path.join(args.run_dir, ".nextflow.log")
+    while True:
+        if state.trace_path is None:
+            state.trace_path = find_trace(args.outdir)
+        update_from_log(state, log_path)
+        update_from_trace(state, args.pack_size)
+        refresh_running(state, args.work_dir)
+        report = summarize(state, args, time.time())
+        write_atomic(args.status, format_report(report))
+        write_atomic(args.json, json.dumps(report, indent=2) + "\n")
+        if args.once or state.finished_run:
+            break
+        try:
+            time.sleep(args.interval)
+        except KeyboardInterrupt:
+            break
+    print(f"Status written to {args.status} and {args.json}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
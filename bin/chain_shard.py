@@ -0,0 +1,441 @@
+#!/usr/bin/env python3
+"""Split a chain file into independent chainCleaner shards and merge them back.
+
+chainCleaner decides on a chain from the target net of its target chromosome
+and the query net of its query chromosome, and both nets are built from every
+chain on that chromosome. Shards are therefore built so that each of them
+holds the complete chain set of the chromosomes it is responsible for:
+
+  component  Chromosomes linked by chains (target and query side) form
+             connected components; whole components are packed into shards.
+             Every chain lands in exactly one shard and nothing is filtered
+             on merge. Small chains tend to link most chromosomes of a
+             genome-wide chain file into one component, so this mode may
+             produce far fewer shards than requested (split warns).
+  target     (default) Target chromosomes are packed into shards. A shard also receives,
+             as read-only context, every chain on a query chromosome touched
+             by its own chains, so the query nets are complete. On merge only
+             chains (and removed_suspects.bed lines) on the shard's own target
+             chromosomes are kept.
+
+Shards are balanced by chain bytes (largest unit into the lightest shard).
+The shard manifest records the owned target chromosomes of every shard.
+
+Subcommands:
+    split   chain(.gz) -> shards/shard_NNNN.chain + shard_manifest.tsv
+    merge   cleaned shard chains and BEDs -> cleaned chain + removed_suspects.bed;
+            chain ids that collide across shards are renumbered
+    verify  block-level comparison of a sharded against a serial result
+
+Usage:
+    chain_shard.py split --chain in.chain.gz --shards 16 --output_dir shards
+    chain_shard.py merge --manifest shard_manifest.tsv --chains cleaned/*.chain
+                         --beds suspects/*.bed --output cleaned.chain
+                         --bed_output removed_suspects.bed
+    chain_shard.py verify --serial serial.chain --sharded sharded.chain
+                          [--serial_bed a.bed --sharded_bed b.bed] --report out.tsv
+"""
+
+import argparse
+import gzip
+import hashlib
+import heapq
+import os
+import re
+import sys
+from collections import Counter, defaultdict
+from typing import Iterator, TextIO
+
+from profiling import run_main
+
+SHARD_PREFIX: str = "shard_"
+MANIFEST_COLUMNS: tuple[str, ...] = ("shard", "mode", "chains", "bytes", "targets")
+SHARD_ID_RE = re.compile(rf"({SHARD_PREFIX}\d+)")
+
+# (tName, qName, size in bytes) per chain, in file order
+ChainSummary = tuple[str, str, int]
+
+
+def open_chain(path: str) -> TextIO:
+    """Open a plain or gzipped chain file for reading."""
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt")
+    return open(path)
+
+
+def iter_chains(path: str) -> Iterator[tuple[list[str], str]]:
+    """Yield (header fields, full chain text) for every chain of a file."""
+    header: list[str] | None = None
+    lines: list[str] = []
+    with open_chain(path) as f:
+        for line in f:
+            if line.startswith("chain"):
+                if header is not None:
+                    yield header, "".join(lines)
+                header = line.split()
+                lines = [line]
+            elif header is not None and not line.startswith("#"):
+                lines.append(line)
+    if header is not None:
+        yield header, "".join(lines)
+
+
+def read_chain_summaries(path: str) -> list[ChainSummary]:
+    """Return target, query and byte size of every chain of a file."""
+    return [
+        (header[2], header[7], len(text.encode())) for header, text in iter_chains(path)
+    ]
+
+
+class UnionFind:
+    """Disjoint sets over hashable items."""
+
+    def __init__(self) -> None:
+        self.parent: dict[str, str] = {}
+
+    def find(self, item: str) -> str:
+        parent = self.parent.setdefault(item, item)
+        while parent != self.parent[parent]:
+            self.parent[parent] = self.parent[self.parent[parent]]
+            parent = self.parent[parent]
+        self.parent[item] = parent
+        return parent
+
+    def union(self, a: str, b: str) -> None:
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            self.parent[root_b] = root_a
+
+
+def pack_units(units: dict[str, int], shards: int) -> dict[str, int]:
+    """Assign weighted units to at most `shards` bins, largest first."""
+    heap = [(0, shard) for shard in range(max(1, shards))]
+    assignment: dict[str, int] = {}
+    for unit in sorted(units, key=lambda name: (-units[name], name)):
+        load, shard = heapq.heappop(heap)
+        assignment[unit] = shard
+        heapq.heappush(heap, (load + units[unit], shard))
+    return assignment
+
+
+def plan_component_shards(summaries: list[ChainSummary], shards: int) -> dict[str, int]:
+    """Map every target chromosome to the shard of its connected component."""
+    components = UnionFind()
+    for target, query, _size in summaries:
+        components.union(f"t:{target}", f"q:{query}")
+    weights: Counter[str] = Counter()
+    for target, _query, size in summaries:
+        weights[components.find(f"t:{target}")] += size
+    assignment = pack_units(dict(weights), shards)
+    return {
+        target: assignment[components.find(f"t:{target}")]
+        for target, _query, _size in summaries
+    }
+
+
+def plan_target_shards(summaries: list[ChainSummary], shards: int) -> dict[str, int]:
+    """Map every target chromosome to a shard, balanced by chain bytes."""
+    weights: Counter[str] = Counter()
+    for target, _query, size in summaries:
+        weights[target] += size
+    return pack_units(dict(weights), shards)
+
+
+def query_context(
+    summaries: list[ChainSummary], owner: dict[str, int]
+) -> dict[str, set[int]]:
+    """Return, per query chromosome, the shards owning chains on it."""
+    context: dict[str, set[int]] = defaultdict(set)
+    for target, query, _size in summaries:
+        context[query].add(owner[target])
+    return context
+
+
+def shard_name(shard: int) -> str:
+    """Return the file stem of one shard."""
+    return f"{SHARD_PREFIX}{shard:04d}"
+
+
+def split_chains(
+    path: str, output_dir: str, shards: int, mode: str
+) -> list[dict[str, object]]:
+    """Write the shard chain files; return one manifest row per shard."""
+    summaries = read_chain_summaries(path)
+    if mode == "component":
+        owner = plan_component_shards(summaries, shards)
+        context: dict[str, set[int]] = {}
+        produced = len(set(owner.values()))
+        if summaries and produced < shards:
+            print(
+                f"Warning: chains link the chromosomes into only {produced} "
+                f"component(s), so {produced} of {shards} requested shard(s) "
+                "are used; --mode target splits connected chromosomes",
+                file=sys.stderr,
+            )
+    else:
+        owner = plan_target_shards(summaries, shards)
+        context = query_context(summaries, owner)
+
+    os.makedirs(output_dir, exist_ok=True)
+    handles: dict[int, TextIO] = {}
+    chains: Counter[int] = Counter()
+    sizes: Counter[int] = Counter()
+    try:
+        # An empty input still yields one (empty) shard to clean and merge.
+        handles[0] = open(os.path.join(output_dir, f"{shard_name(0)}.chain"), "w")
+        for header, text in iter_chains(path):
+            targets = {owner[header[2]]} | context.get(header[7], set())
+            for shard in targets:
+                if shard not in handles:
+                    handles[shard] = open(
+                        os.path.join(output_dir, f"{shard_name(shard)}.chain"), "w"
+                    )
+                handles[shard].write(text)
+                chains[shard] += 1
+                sizes[shard] += len(text)
+    finally:
+        for handle in handles.values():
+            handle.close()
+
+    owned: dict[int, list[str]] = defaultdict(list)
+    for target, shard in owner.items():
+        owned[shard].append(target)
+    return [
+        {
+            "shard": shard_name(shard),
+            "mode": mode,
+            "chains": chains[shard],
+            "bytes": sizes[shard],
+            "targets": ",".join(sorted(owned[shard])),
+        }
+        for shard in sorted(handles)
+    ]
+
+
+def write_manifest(path: str, rows: list[dict[str, object]]) -> None:
+    """Write the shard manifest TSV."""
+    with open(path, "w") as f:
+        f.write("\t".join(MANIFEST_COLUMNS) + "\n")
+        for row in rows:
+            f.write("\t".join(str(row[column]) for column in MANIFEST_COLUMNS) + "\n")
+
+
+def read_manifest(path: str) -> dict[str, tuple[str, set[str]]]:
+    """Return shard -> (mode, owned target chromosomes)."""
+    shards = {}
+    with open(path) as f:
+        header = f.readline().rstrip("\n").split("\t")
+        for line in f:
+            row = dict(zip(header, line.rstrip("\n").split("\t")))
+            targets = set(row["targets"].split(",")) if row["targets"] else set()
+            shards[row["shard"]] = (row["mode"], targets)
+    return shards
+
+
+def shard_of(path: str) -> str:
+    """Return the shard id embedded in a file name."""
+    match = SHARD_ID_RE.search(os.path.basename(path))
+    if not match:
+        raise ValueError(f"No shard id in file name: {path}")
+    return match.group(1)
+
+
+def merge_shards(
+    manifest: dict[str, tuple[str, set[str]]],
+    chain_paths: list[str],
+    bed_paths: list[str],
+    output: str,
+    bed_output: str,
+) -> tuple[int, int, int]:
+    """Merge cleaned shards; return (chains written, ids renumbered, BED lines)."""
+
+    def owns(path: str, target: str) -> bool:
+        mode, targets = manifest[shard_of(path)]
+        return mode == "component" or target in targets
+
+    chain_paths = sorted(chain_paths, key=shard_of)
+    max_id = 0
+    for path in chain_paths:
+        for header, _text in iter_chains(path):
+            if owns(path, header[2]):
+                max_id = max(max_id, int(header[12]))
+
+    seen: set[int] = set()
+    written = renumbered = 0
+    with open(output, "w") as out:
+        for path in chain_paths:
+            for header, text in iter_chains(path):
+                if not owns(path, header[2]):
+                    continue
+                chain_id = int(header[12])
+                if chain_id in seen:
+                    max_id += 1
+                    chain_id = max_id
+                    header[12] = str(chain_id)
+                    text = " ".join(header) + "\n" + text.split("\n", 1)[1]
+                    renumbered += 1
+                seen.add(chain_id)
+                out.write(text)
+                written += 1
+
+    bed_lines = 0
+    with open(bed_output, "w") as out:
+        for path in sorted(bed_paths, key=shard_of):
+            with open(path) as f:
+                for line in f:
+                    if line.strip() and owns(path, line.split("\t", 1)[0]):
+                        out.write(line)
+                        bed_lines += 1
+    return written, renumbered, bed_lines
+
+
+def chain_blocks(path: str) -> Counter[str]:
+    """Return a multiset of aligned blocks (as digests) of a chain file."""
+    blocks: Counter[str] = Counter()
+    for header, text in iter_chains(path):
+        t_name, t_pos, q_name, q_strand, q_pos = (
+            header[2],
+            int(header[5]),
+            header[7],
+            header[9],
+            int(header[10]),
+        )
+        for line in text.splitlines()[1:]:
+            fields = line.split()
+            if not fields:
+                continue
+            size = int(fields[0])
+            key = f"{t_name}:{t_pos}:{q_name}:{q_strand}:{q_pos}:{size}"
+            blocks[hashlib.blake2b(key.encode(), digest_size=12).hexdigest()] += 1
+            if len(fields) == 3:
+                t_pos += size + int(fields[1])
+                q_pos += size + int(fields[2])
+    return blocks
+
+
+def bed_lines(path: str | None) -> Counter[str]:
+    """Return a multiset of the non-empty lines of a BED file."""
+    if not path:
+        return Counter()
+    with open(path) as f:
+        return Counter(line.rstrip("\n") for line in f if line.strip())
+
+
+def verify(
+    serial: str,
+    sharded: str,
+    serial_bed: str | None,
+    sharded_bed: str | None,
+) -> dict[str, int]:
+    """Compare a sharded cleaning result with the serial one, block by block."""
+    serial_blocks = chain_blocks(serial)
+    sharded_blocks = chain_blocks(sharded)
+    serial_suspects = bed_lines(serial_bed)
+    sharded_suspects = bed_lines(sharded_bed)
+    return {
+        "chains_serial": sum(1 for _ in iter_chains(serial)),
+        "chains_sharded": sum(1 for _ in iter_chains(sharded)),
+        "blocks_serial": sum(serial_blocks.values()),
+        "blocks_sharded": sum(sharded_blocks.values()),
+        "blocks_only_serial": sum((serial_blocks - sharded_blocks).values()),
+        "blocks_only_sharded": sum((sharded_blocks - serial_blocks).values()),
+        "suspects_serial": sum(serial_suspects.values()),
+        "suspects_sharded": sum(sharded_suspects.values()),
+        "suspects_only_serial": sum((serial_suspects - sharded_suspects).values()),
+        "suspects_only_sharded": sum((sharded_suspects - serial_suspects).values()),
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse the split / merge / verify command-line interface."""
+    app = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    commands = app.add_subparsers(dest="command", required=True)
+
+    split = commands.add_parser("split", help="Split a chain file into shards")
+    split.add_argument("--chain", required=True, help="Input chain file (plain or .gz)")
+    split.add_argument("--shards", type=int, required=True, help="Maximum shards")
+    split.add_argument(
+        "--mode",
+        choices=["component", "target"],
+        default="target",
+        help="Sharding unit (default: target)",
+    )
+    split.add_argument("--output_dir", required=True, help="Shard output directory")
+    split.add_argument(
+        "--manifest",
+        default="shard_manifest.tsv",
+        help="Shard manifest TSV (default: shard_manifest.tsv)",
+    )
+
+    merge = commands.add_parser("merge", help="Merge cleaned shards")
+    merge.add_argument("--manifest", required=True, help="Manifest written by split")
+    merge.add_argument("--chains", nargs="+", required=True, help="Cleaned shards")
+    merge.add_argument("--beds", nargs="*", default=[], help="Shard suspect BEDs")
+    merge.add_argument("--output", required=True, help="Merged chain output")
+    merge.add_argument("--bed_output", required=True, help="Merged BED output")
+
+    check = commands.add_parser("verify", help="Compare sharded and serial results")
+    check.add_argument("--serial", required=True, help="Serially cleaned chains")
+    check.add_argument("--sharded", required=True, help="Merged sharded chains")
+    check.add_argument("--serial_bed", default=None)
+    check.add_argument("--sharded_bed", default=None)
+    check.add_argument("--report", required=True, help="Output TSV report")
+    check.add_argument(
+        "--strict", action="store_true", help="Exit 1 when the results differ"
+    )
+    return app.parse_args()
+
+
+def main() -> None:
+    """Dispatch the chosen subcommand."""
+    args = parse_args()
+    if args.command == "split":
+        rows = split_chains(args.chain, args.output_dir, args.shards, args.mode)
+        write_manifest(args.manifest, rows)
+        print(
+            f"Wrote {len(rows)} {args.mode} shard(s) "
+            f"({sum(int(row['chains']) for row in rows)} chains incl. context) "
+            f"to {args.output_dir}",
+            file=sys.stderr,
+        )
+    elif args.command == "merge":
+        written, renumbered, bed_count = merge_shards(
+            read_manifest(args.manifest),
+            args.chains,
+            args.beds,
+            args.output,
+            args.bed_output,
+        )
+        print(
+            f"Merged {written} chains ({renumbered} renumbered ids) "
+            f"and {bed_count} suspect lines",
+            file=sys.stderr,
+        )
+    else:
+        report = verify(args.serial, args.sharded, args.serial_bed, args.sharded_bed)
+        identical = not any(
+            report[key]
+            for key in (
+                "blocks_only_serial",
+                "blocks_only_sharded",
+                "suspects_only_serial",
+                "suspects_only_sharded",
+            )
+        )
+        with open(args.report, "w") as f:
+            for key, value in report.items():
+                f.write(f"{key}\t{value}\n")
+            f.write(f"identical\t{str(identical).lower()}\n")
+        print(
+            f"Sharded result {'matches' if identical else 'DIFFERS FROM'} "
+            f"the serial result (report: {args.report})",
+            file=sys.stderr,
+        )
+        if args.strict and not identical:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    run_main(main)
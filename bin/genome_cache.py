@@ -0,0 +1,571 @@
+#!/usr/bin/env python3
+"""Content-addressed cache for prepared genomes and partition files.
+
+Preparing a genome (FASTA -> .2bit, chrom.sizes, per-chromosome FASTA for v1
+.2bit files) and partitioning it are deterministic functions of the input
+genome and a handful of parameters. This script stores those results in a
+cache directory shared across runs so that a reference aligned against many
+queries is prepared only once.
+
+Layout:
+    <cache_dir>/<namespace>/<key>/manifest.json   file sizes + sha256, metadata
+    <cache_dir>/<namespace>/<key>/...             cached files
+    <cache_dir>/<namespace>/<key>.lock            per-entry flock
+    <cache_dir>/<namespace>/<key>/.last_used      mtime drives LRU eviction
+
+Entries are published atomically (written to a temporary directory and
+renamed), verified against their manifest on every fetch, and materialized
+into the caller's directory as hard links (or copies across filesystems) so
+an eviction never removes files from under a running task.
+
+Usage:
+    genome_cache.py key   --genome hg38.fa --extra force_long_2bit=false
+    genome_cache.py fetch --cache_dir DIR --key KEY --name hg38 --dest cached
+    genome_cache.py store --cache_dir DIR --key KEY --twobit hg38.2bit
+                          --chrom_sizes hg38.chrom.sizes [--chroms_dir hg38_chroms]
+    genome_cache.py evict --cache_dir DIR --max_size 500G
+    genome_cache.py list  --cache_dir DIR
+"""
+
+import argparse
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import time
+from contextlib import contextmanager
+from typing import Iterator, Sequence
+
+from profiling import run_main
+
+LOGGER = logging.getLogger("genome_cache")
+
+CACHE_FORMAT_VERSION: int = 1
+GENOME_NAMESPACE: str = "genomes"
+PARTITION_NAMESPACE: str = "partitions"
+MANIFEST_NAME: str = "manifest.json"
+LAST_USED_NAME: str = ".last_used"
+LOCK_SUFFIX: str = ".lock"
+HASH_BLOCK_SIZE: int = 1 << 20
+
+CACHED_TWOBIT: str = "genome.2bit"
+CACHED_CHROM_SIZES: str = "genome.chrom.sizes"
+CACHED_CHROMS_DIR: str = "chroms"
+
+SIZE_UNITS: dict[str, int] = {
+    "": 1,
+    "K": 1 << 10,
+    "M": 1 << 20,
+    "G": 1 << 30,
+    "T": 1 << 40,
+}
+
+
+class CacheIntegrityError(Exception):
+    """Report a cache entry whose files do not match its manifest."""
+
+
+def configure_logging(verbose: bool) -> None:
+    """Enable concise stderr diagnostics when verbose logging is requested."""
+    logging.basicConfig(format="%(levelname)s %(name)s: %(message)s")
+    LOGGER.setLevel(logging.DEBUG if verbose else logging.INFO)
+
+
+def file_sha256(path: str) -> str:
+    """Return the hex sha256 digest of a file, read in fixed-size blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as in_file:
+        for block in iter(lambda: in_file.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def make_key(content_digests: Sequence[str], extras: dict[str, str]) -> str:
+    """Combine content digests and parameters into one cache key."""
+    digest = hashlib.sha256(f"format={CACHE_FORMAT_VERSION}\n".encode())
+    for content_digest in content_digests:
+        digest.update(f"content={content_digest}\n".encode())
+    for name in sorted(extras):
+        digest.update(f"{name}={extras[name]}\n".encode())
+    return digest.hexdigest()
+
+
+def parse_size(value: str) -> int:
+    """Parse a byte count such as ``500G``, ``1.5T`` or ``1048576``."""
+    text = value.strip().upper().removesuffix("B")
+    unit = text[-1] if text and text[-1] in SIZE_UNITS else ""
+    number = text[: len(text) - len(unit)]
+    try:
+        return int(float(number) * SIZE_UNITS[unit])
+    except ValueError as error:
+        raise ValueError(f"Malformed size {value!r}: expected e.g. 500G") from error
+
+
+def entry_path(cache_dir: str, namespace: str, key: str) -> str:
+    """Return the directory holding one cache entry."""
+    return os.path.join(cache_dir, namespace, key)
+
+
+def lock_path(cache_dir: str, namespace: str, key: str) -> str:
+    """Return the flock file guarding one cache entry."""
+    return os.path.join(cache_dir, namespace, f"{key}{LOCK_SUFFIX}")
+
+
+@contextmanager
+def entry_lock(
+    cache_dir: str, namespace: str, key: str, exclusive: bool, blocking: bool = True
+) -> Iterator[bool]:
+    """Hold a shared or exclusive flock on one entry; yield whether it was taken."""
+    os.makedirs(os.path.join(cache_dir, namespace), exist_ok=True)
+    with open(lock_path(cache_dir, namespace, key), "a") as lock_file:
+        operation = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+        if not blocking:
+            operation |= fcntl.LOCK_NB
+        try:
+            fcntl.flock(lock_file, operation)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def read_manifest(entry_dir: str) -> dict | None:
+    """Return an entry manifest, or None when the entry is absent."""
+    manifest_path = os.path.join(entry_dir, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path) as manifest_file:
+        return json.load(manifest_file)
+
+
+def verify_entry(entry_dir: str, manifest: dict, deep: bool = True) -> None:
+    """Check every cached file against its recorded size and digest."""
+    for rel_path, record in manifest["files"].items():
+        path = os.path.join(entry_dir, rel_path)
+        if not os.path.isfile(path):
+            raise CacheIntegrityError(f"{path} is missing")
+        if os.path.getsize(path) != record["size"]:
+            raise CacheIntegrityError(
+                f"{path} has {os.path.getsize(path)} bytes, expected {record['size']}"
+            )
+        if deep and file_sha256(path) != record["sha256"]:
+            raise CacheIntegrityError(f"{path} does not match its recorded sha256")
+
+
+def link_or_copy(src: str, dst: str) -> None:
+    """Hard-link a file, falling back to a copy across filesystems."""
+    os.makedirs(os.path.dirname(dst) or ".", exist_ok=True)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def touch_last_used(entry_dir: str) -> None:
+    """Record an access for LRU eviction."""
+    with open(os.path.join(entry_dir, LAST_USED_NAME), "a"):
+        pass
+    os.utime(os.path.join(entry_dir, LAST_USED_NAME))
+
+
+def fetch_entry(
+    cache_dir: str,
+    namespace: str,
+    key: str,
+    destinations: dict[str, str] | None = None,
+    deep: bool = True,
+) -> dict | None:
+    """Verify a cache entry and materialize its files; return its manifest.
+
+    ``destinations`` maps cached relative paths (or directory prefixes ending
+    in ``/``) to target paths. Returns None on a miss. A corrupt entry is
+    reported, removed and treated as a miss.
+    """
+    entry_dir = entry_path(cache_dir, namespace, key)
+    with entry_lock(cache_dir, namespace, key, exclusive=False):
+        manifest = read_manifest(entry_dir)
+        if manifest is None:
+            LOGGER.info("Cache miss: %s/%s", namespace, key)
+            return None
+        try:
+            verify_entry(entry_dir, manifest, deep=deep)
+        except CacheIntegrityError as error:
+            LOGGER.warning("Discarding corrupt cache entry %s: %s", entry_dir, error)
+        else:
+            materialize_entry(entry_dir, manifest, destinations)
+            LOGGER.info("Cache hit: %s/%s", namespace, key)
+            return manifest
+
+    # flock cannot upgrade a shared lock atomically: a concurrent store may
+    # have published a fresh entry in between, so verify again before removal.
+    with entry_lock(cache_dir, namespace, key, exclusive=True):
+        manifest = read_manifest(entry_dir)
+        if manifest is None:
+            return None
+        try:
+            verify_entry(entry_dir, manifest, deep=deep)
+        except CacheIntegrityError:
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            return None
+        LOGGER.info("Cache entry %s was replaced concurrently", entry_dir)
+        materialize_entry(entry_dir, manifest, destinations)
+    LOGGER.info("Cache hit: %s/%s", namespace, key)
+    return manifest
+
+
+def materialize_entry(
+    entry_dir: str, manifest: dict, destinations: dict[str, str] | None
+) -> None:
+    """Link the files of a verified entry into place and record the access."""
+    for rel_path in manifest["files"]:
+        target = resolve_destination(rel_path, destinations)
+        if target:
+            link_or_copy(os.path.join(entry_dir, rel_path), target)
+    touch_last_used(entry_dir)
+
+
+def resolve_destination(
+    rel_path: str, destinations: dict[str, str] | None
+) -> str | None:
+    """Map a cached relative path onto the caller's requested location."""
+    if destinations is None:
+        return None
+    if rel_path in destinations:
+        return destinations[rel_path]
+    for prefix, target_dir in destinations.items():
+        if prefix.endswith("/") and rel_path.startswith(prefix):
+            return os.path.join(target_dir, rel_path[len(prefix) :])
+    return None
+
+
+def store_entry(
+    cache_dir: str,
+    namespace: str,
+    key: str,
+    files: dict[str, str],
+    metadata: dict[str, object],
+    replace_if: str | None = None,
+) -> bool:
+    """Publish files as a cache entry; return whether anything was written.
+
+    An existing valid entry is kept unless its metadata has a false-like
+    value for ``replace_if`` and the new metadata sets it (used to upgrade a
+    genome entry with per-chromosome FASTA files).
+    """
+    entry_dir = entry_path(cache_dir, namespace, key)
+    with entry_lock(cache_dir, namespace, key, exclusive=True):
+        existing = read_manifest(entry_dir)
+        if existing is not None:
+            upgrade = (
+                replace_if is not None
+                and not existing["metadata"].get(replace_if)
+                and metadata.get(replace_if)
+            )
+            if not upgrade:
+                LOGGER.info("Cache entry already present: %s/%s", namespace, key)
+                touch_last_used(entry_dir)
+                return False
+
+        staging_dir = f"{entry_dir}.tmp-{os.getpid()}"
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        os.makedirs(staging_dir)
+        records = {}
+        for rel_path, src in sorted(files.items()):
+            link_or_copy(src, os.path.join(staging_dir, rel_path))
+            records[rel_path] = {
+                "size": os.path.getsize(src),
+                "sha256": file_sha256(src),
+            }
+        manifest = {
+            "format": CACHE_FORMAT_VERSION,
+            "namespace": namespace,
+            "key": key,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "metadata": metadata,
+            "files": records,
+        }
+        with open(os.path.join(staging_dir, MANIFEST_NAME), "w") as manifest_file:
+            json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+        touch_last_used(staging_dir)
+
+        if existing is not None:
+            retired_dir = f"{entry_dir}.old-{os.getpid()}"
+            os.rename(entry_dir, retired_dir)
+            os.rename(staging_dir, entry_dir)
+            shutil.rmtree(retired_dir, ignore_errors=True)
+        else:
+            os.rename(staging_dir, entry_dir)
+    LOGGER.info("Stored cache entry %s/%s (%d files)", namespace, key, len(records))
+    return True
+
+
+def iter_entries(cache_dir: str) -> Iterator[tuple[str, str, str]]:
+    """Yield (namespace, key, entry_dir) for every published entry."""
+    for namespace in (GENOME_NAMESPACE, PARTITION_NAMESPACE):
+        namespace_dir = os.path.join(cache_dir, namespace)
+        if not os.path.isdir(namespace_dir):
+            continue
+        for name in sorted(os.listdir(namespace_dir)):
+            entry_dir = os.path.join(namespace_dir, name)
+            if os.path.exists(os.path.join(entry_dir, MANIFEST_NAME)):
+                yield namespace, name, entry_dir
+
+
+def entry_size(entry_dir: str) -> int:
+    """Return the on-disk size of one entry in bytes."""
+    total = 0
+    for root, _dirs, names in os.walk(entry_dir):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in names)
+    return total
+
+
+def entry_last_used(entry_dir: str) -> float:
+    """Return the last access time recorded for one entry."""
+    marker = os.path.join(entry_dir, LAST_USED_NAME)
+    path = marker if os.path.exists(marker) else entry_dir
+    return os.path.getmtime(path)
+
+
+def evict(cache_dir: str, max_bytes: int, dry_run: bool = False) -> int:
+    """Remove least-recently-used entries until the cache fits in max_bytes.
+
+    Entries that are currently being fetched or stored hold a lock and are
+    skipped. Returns the number of bytes released.
+    """
+    entries = [
+        (entry_last_used(entry_dir), namespace, key, entry_dir, entry_size(entry_dir))
+        for namespace, key, entry_dir in iter_entries(cache_dir)
+    ]
+    total = sum(size for *_rest, size in entries)
+    released = 0
+    LOGGER.info(
+        "Cache holds %d entries, %.2f GB (limit %.2f GB)",
+        len(entries),
+        total / SIZE_UNITS["G"],
+        max_bytes / SIZE_UNITS["G"],
+    )
+    for _last_used, namespace, key, entry_dir, size in sorted(entries):
+        if total - released <= max_bytes:
+            break
+        with entry_lock(
+            cache_dir, namespace, key, exclusive=True, blocking=False
+        ) as locked:
+            if not locked:
+                LOGGER.info("Skipping in-use entry %s/%s", namespace, key)
+                continue
+            LOGGER.info(
+                "Evicting %s/%s (%.2f GB)%s",
+                namespace,
+                key,
+                size / SIZE_UNITS["G"],
+                " [dry run]" if dry_run else "",
+            )
+            if not dry_run:
+                # The zero-byte lock file stays: unlinking it would let later
+                # openers lock a new inode while the old one is still held.
+                shutil.rmtree(entry_dir)
+            released += size
+    return released
+
+
+def genome_files(
+    twobit: str, chrom_sizes: str, chroms_dir: str | None
+) -> dict[str, str]:
+    """Map cached relative paths to the files of one prepared genome."""
+    files = {CACHED_TWOBIT: twobit, CACHED_CHROM_SIZES: chrom_sizes}
+    if chroms_dir:
+        for name in sorted(os.listdir(chroms_dir)):
+            if name.endswith(".fa"):
+                files[f"{CACHED_CHROMS_DIR}/{name}"] = os.path.join(chroms_dir, name)
+    return files
+
+
+def twobit_version(path: str) -> int:
+    """Return the .2bit format version (0 = 32-bit offsets, 1 = 64-bit)."""
+    with open(path, "rb") as two_bit_file:
+        header = two_bit_file.read(8)
+    if header[:4] == b"\x43\x27\x41\x1a":
+        return int.from_bytes(header[4:8], "little")
+    if header[:4] == b"\x1a\x41\x27\x43":
+        return int.from_bytes(header[4:8], "big")
+    raise ValueError(f"Not a .2bit file: {path}")
+
+
+def parse_extras(values: Sequence[str]) -> dict[str, str]:
+    """Parse repeated NAME=VALUE key components."""
+    extras = {}
+    for value in values:
+        name, sep, setting = value.partition("=")
+        if not sep:
+            raise ValueError(f"Malformed --extra {value!r}: expected NAME=VALUE")
+        extras[name] = setting
+    return extras
+
+
+def cmd_key(args: argparse.Namespace) -> int:
+    """Print the cache key of a genome file."""
+    print(make_key([file_sha256(args.genome)], parse_extras(args.extra)))
+    return 0
+
+
+def cmd_fetch(args: argparse.Namespace) -> int:
+    """Materialize a cached genome; exit 0 on a hit and 2 on a miss."""
+    os.makedirs(args.dest, exist_ok=True)
+    chroms_target = os.path.join(args.dest, f"{args.name}_chroms")
+    destinations = {
+        CACHED_TWOBIT: os.path.join(args.dest, f"{args.name}.2bit"),
+        CACHED_CHROM_SIZES: os.path.join(args.dest, f"{args.name}.chrom.sizes"),
+    }
+    entry_dir = entry_path(args.cache_dir, GENOME_NAMESPACE, args.key)
+    manifest = read_manifest(entry_dir)
+    if manifest is not None and args.require_chroms:
+        metadata = manifest["metadata"]
+        if metadata.get("twobit_version") == 1 and not metadata.get("has_chroms"):
+            LOGGER.info("Cache entry %s lacks extracted chromosomes", args.key)
+            return 2
+        destinations[f"{CACHED_CHROMS_DIR}/"] = chroms_target
+
+    manifest = fetch_entry(
+        args.cache_dir, GENOME_NAMESPACE, args.key, destinations, deep=not args.quick
+    )
+    if manifest is None:
+        for path in destinations.values():
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            elif os.path.exists(path):
+                os.unlink(path)
+        return 2
+    if args.require_chroms or args.empty_chroms:
+        # v0 entries carry no chromosome FASTAs; mirror EXTRACT_CHROMS' empty dir.
+        os.makedirs(chroms_target, exist_ok=True)
+    return 0
+
+
+def cmd_store(args: argparse.Namespace) -> int:
+    """Publish one prepared genome into the cache."""
+    chroms_dir = args.chroms_dir if args.chroms_dir else None
+    files = genome_files(args.twobit, args.chrom_sizes, chroms_dir)
+    version = twobit_version(args.twobit)
+    metadata = {
+        "genome_name": args.name,
+        "twobit_version": version,
+        # EXTRACT_CHROMS leaves the directory empty in seq_fifo mode.
+        "has_chroms": version == 1
+        and any(name.startswith(f"{CACHED_CHROMS_DIR}/") for name in files),
+    }
+    store_entry(
+        args.cache_dir,
+        GENOME_NAMESPACE,
+        args.key,
+        files,
+        metadata,
+        replace_if="has_chroms",
+    )
+    return 0
+
+
+def cmd_evict(args: argparse.Namespace) -> int:
+    """Apply the size-based LRU policy."""
+    released = evict(args.cache_dir, parse_size(args.max_size), args.dry_run)
+    LOGGER.info("Released %.2f GB", released / SIZE_UNITS["G"])
+    return 0
+
+
+def cmd_list(args: argparse.Namespace) -> int:
+    """Print one line per cache entry, least recently used first."""
+    rows = sorted(
+        (entry_last_used(entry_dir), namespace, key, entry_dir)
+        for namespace, key, entry_dir in iter_entries(args.cache_dir)
+    )
+    for last_used, namespace, key, entry_dir in rows:
+        manifest = read_manifest(entry_dir) or {"metadata": {}}
+        label = manifest["metadata"].get("genome_name", "")
+        print(
+            f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(last_used))}\t"
+            f"{namespace}\t{key}\t{entry_size(entry_dir)}\t{label}"
+        )
+    return 0
+
+
+def parse_args(argv: Sequence[str] | None = None) -> argparse.Namespace:
+    """Parse the cache sub-command line."""
+    app = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    app.add_argument("--verbose", "-v", action="store_true", help="Debug logging")
+    commands = app.add_subparsers(dest="command", required=True)
+
+    key = commands.add_parser("key", help="Print the cache key of a genome file")
+    key.add_argument("--genome", required=True, help="Input FASTA or .2bit")
+    key.add_argument(
+        "--extra",
+        action="append",
+        default=[],
+        help="Additional NAME=VALUE key component (repeatable)",
+    )
+    key.set_defaults(func=cmd_key)
+
+    fetch = commands.add_parser("fetch", help="Materialize a cached genome")
+    fetch.add_argument("--cache_dir", required=True)
+    fetch.add_argument("--key", required=True)
+    fetch.add_argument("--name", required=True, help="Genome name for output files")
+    fetch.add_argument("--dest", required=True, help="Output directory")
+    fetch.add_argument(
+        "--require_chroms",
+        action="store_true",
+        help="Treat v1 entries without per-chromosome FASTA as a miss",
+    )
+    fetch.add_argument(
+        "--empty_chroms",
+        action="store_true",
+        help="Emit an empty chromosome directory instead (FIFO sequence delivery)",
+    )
+    fetch.add_argument(
+        "--quick",
+        action="store_true",
+        help="Verify file sizes only instead of full sha256 digests",
+    )
+    fetch.set_defaults(func=cmd_fetch)
+
+    store = commands.add_parser("store", help="Publish one prepared genome")
+    store.add_argument("--cache_dir", required=True)
+    store.add_argument("--key", required=True)
+    store.add_argument("--name", required=True)
+    store.add_argument("--twobit", required=True)
+    store.add_argument("--chrom_sizes", required=True)
+    store.add_argument("--chroms_dir", default=None)
+    store.set_defaults(func=cmd_store)
+
+    evict_cmd = commands.add_parser("evict", help="Size-based LRU eviction")
+    evict_cmd.add_argument("--cache_dir", required=True)
+    evict_cmd.add_argument(
+        "--max_size", required=True, help="Target cache size, e.g. 500G"
+    )
+    evict_cmd.add_argument("--dry_run", action="store_true")
+    evict_cmd.set_defaults(func=cmd_evict)
+
+    list_cmd = commands.add_parser("list", help="List cache entries")
+    list_cmd.add_argument("--cache_dir", required=True)
+    list_cmd.set_defaults(func=cmd_list)
+
+    if argv is None and len(sys.argv) < 2:
+        app.print_help()
+        sys.exit(1)
+    return app.parse_args(argv)
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    """Dispatch one cache sub-command."""
+    args = parse_args(argv)
+    configure_logging(args.verbose)
+    sys.exit(args.func(args))
+
+
+if __name__ == "__main__":
+    run_main(main)
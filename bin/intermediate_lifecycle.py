@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""Release consumed intermediates from the work directory and report disk use.
+
+The pipeline calls `release` once a stage has fully consumed a group of
+intermediate files (the LASTZ PSLs of a bucket once it is merged, the PSL
+bundles of an alignment once every bundle is chained, ...). Staged inputs are
+symlinks, so the files acted on are their resolved targets:
+
+  track     record the files only (baseline for the high-water mark)
+  compress  gzip each file in place (<file>.gz)
+  delete    remove each file
+
+Only files below --work_dir are touched; anything else (user inputs, cache
+entries, published copies) is recorded as kept. Symlinks in the --link_dir
+directories that point to a released file (the symlink-published results of
+02_lastz_psl, 03_concat_lastz_output, ...) are removed, or repointed to the
+.gz file when compressing, so no dangling links are left behind.
+
+Every file becomes one ledger row: its size, when it was written (mtime) and
+when it was released. `report` replays the merged ledgers of a run and gives,
+per stage, the bytes held at the stage's own peak, and the run's overall
+high-water mark with the share of every stage at that moment.
+
+Usage:
+    intermediate_lifecycle.py release --pair ref.qry --stage lastz_psl \\
+        --action delete --work_dir /scratch/work --link_dir results/02_lastz_psl \\
+        --output bucket.lifecycle.tsv release_*/*
+    intermediate_lifecycle.py report --ledger intermediate_ledger.tsv \\
+        --output disk_high_water.tsv
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Sequence
+
+from profiling import run_main
+
+ACTIONS: tuple[str, ...] = ("track", "compress", "delete")
+LEDGER_COLUMNS: tuple[str, ...] = (
+    "pair",
+    "stage",
+    "action",
+    "path",
+    "bytes",
+    "created",
+    "released",
+    "bytes_after",
+)
+REPORT_COLUMNS: tuple[str, ...] = (
+    "stage",
+    "files",
+    "bytes",
+    "bytes_released",
+    "stage_peak_bytes",
+    "stage_peak_time",
+    "bytes_at_run_peak",
+)
+GZIP_SUFFIX: str = ".gz"
+
+
+@dataclass
+class LedgerRow:
+    """One intermediate file and what happened to it."""
+
+    pair: str
+    stage: str
+    action: str
+    path: str
+    size: int
+    created: float
+    released: float | None
+    size_after: int
+
+    def to_line(self) -> str:
+        released = "" if self.released is None else f"{self.released:.3f}"
+        return (
+            f"{self.pair}\t{self.stage}\t{self.action}\t{self.path}\t{self.size}\t"
+            f"{self.created:.3f}\t{released}\t{self.size_after}\n"
+        )
+
+    @classmethod
+    def from_line(cls, line: str) -> "LedgerRow":
+        fields = line.rstrip("\n").split("\t")
+        if len(fields) != len(LEDGER_COLUMNS):
+            raise ValueError(f"Malformed ledger line: {line!r}")
+        pair, stage, action, path, size, created, released, size_after = fields
+        return cls(
+            pair,
+            stage,
+            action,
+            path,
+            int(size),
+            float(created),
+            float(released) if released else None,
+            int(size_after),
+        )
+
+
+def is_below(path: str, directory: str) -> bool:
+    """Return whether path lies inside directory (both resolved)."""
+    return os.path.commonpath([path, directory]) == directory
+
+
+def gzip_in_place(path: str) -> str:
+    """Compress path to path.gz (mtime kept) and return the new path."""
+    compressor = shutil.which("pigz") or "gzip"
+    subprocess.run([compressor, "-f", path], check=True)
+    return f"{path}{GZIP_SUFFIX}"
+
+
+def release_file(
+    path: str, pair: str, stage: str, action: str, work_dir: str
+) -> LedgerRow | None:
+    """Apply the action to the target of one staged file; None if it is gone."""
+    target = os.path.realpath(path)
+    if not os.path.isfile(target):
+        # Released already by an earlier attempt of the same task.
+        return None
+    stat = os.stat(target)
+    if action != "track" and not is_below(target, work_dir):
+        action = "keep"
+    released = None
+    size_after = stat.st_size
+    if action == "delete":
+        os.unlink(target)
+        released = time.time()
+        size_after = 0
+    elif action == "compress" and not target.endswith(GZIP_SUFFIX):
+        size_after = os.path.getsize(gzip_in_place(target))
+        released = time.time()
+    return LedgerRow(
+        pair, stage, action, target, stat.st_size, stat.st_mtime, released, size_after
+    )
+
+
+def fix_links(link_dirs: Sequence[str], rows: Sequence[LedgerRow]) -> int:
+    """Remove or repoint published symlinks to released files; return the count."""
+    released = {row.path: row for row in rows if row.released is not None}
+    fixed = 0
+    for link_dir in link_dirs:
+        if not os.path.isdir(link_dir):
+            continue
+        for name in os.listdir(link_dir):
+            link = os.path.join(link_dir, name)
+            if not os.path.islink(link):
+                continue
+            row = released.get(os.path.realpath(link))
+            if row is None:
+                continue
+            os.unlink(link)
+            if row.action == "compress":
+                os.symlink(f"{row.path}{GZIP_SUFFIX}", f"{link}{GZIP_SUFFIX}")
+            fixed += 1
+    return fixed
+
+
+def cmd_release(args: argparse.Namespace) -> int:
+    """Release the given files and write their ledger rows."""
+    work_dir = os.path.realpath(args.work_dir)
+    rows = []
+    for path in args.files:
+        row = release_file(path, args.pair, args.stage, args.action, work_dir)
+        if row is not None:
+            rows.append(row)
+    fixed = fix_links(args.link_dir, rows)
+    with open(args.output, "w") as out:
+        out.write("\t".join(LEDGER_COLUMNS) + "\n")
+        out.writelines(row.to_line() for row in rows)
+    freed = sum(row.size - row.size_after for row in rows if row.released)
+    print(
+        f"{args.stage}: {len(rows)} file(s), {freed / 2**30:.2f} GiB freed, "
+        f"{fixed} published link(s) updated",
+        file=sys.stderr,
+    )
+    return 0
+
+
+def read_ledger(paths: Sequence[str]) -> list[LedgerRow]:
+    """Read ledger files, skipping header lines; a file released twice counts once."""
+    rows: dict[str, LedgerRow] = {}
+    for path in paths:
+        with open(path) as ledger:
+            for line in ledger:
+                if line.startswith("\t".join(LEDGER_COLUMNS[:2])) or not line.strip():
+                    continue
+                row = LedgerRow.from_line(line)
+                # Retried release tasks find the file gone and add no row, but
+                # a resumed run may release the same path twice.
+                rows.setdefault(f"{row.path}\t{row.created}", row)
+    return list(rows.values())
+
+
+def high_water(
+    rows: Sequence[LedgerRow],
+) -> tuple[dict[str, tuple[int, float]], float, dict[str, int]]:
+    """Replay the ledger; return stage peaks, the run peak time and its breakdown.
+
+    A file counts from its mtime until its release (then with its compressed
+    size), or until the end of the run when it was only tracked or kept.
+    """
+    events: list[tuple[float, str, int]] = []
+    for row in rows:
+        events.append((row.created, row.stage, row.size))
+        if row.released is not None:
+            events.append((row.released, row.stage, row.size_after - row.size))
+    # Releases before creations at equal times, so peaks are not overstated.
+    events.sort(key=lambda event: (event[0], event[2]))
+    live: dict[str, int] = defaultdict(int)
+    stage_peaks: dict[str, tuple[int, float]] = {}
+    total = 0
+    run_peak = -1
+    run_peak_time = 0.0
+    run_breakdown: dict[str, int] = {}
+    for when, stage, delta in events:
+        live[stage] += delta
+        total += delta
+        if live[stage] > stage_peaks.get(stage, (-1, 0.0))[0]:
+            stage_peaks[stage] = (live[stage], when)
+        if total > run_peak:
+            run_peak = total
+            run_peak_time = when
+            run_breakdown = dict(live)
+    return stage_peaks, run_peak_time, run_breakdown
+
+
+def format_time(epoch: float) -> str:
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(epoch))
+
+
+def cmd_report(args: argparse.Namespace) -> int:
+    """Write the per-stage and overall disk high-water marks of a run."""
+    rows = read_ledger(args.ledger)
+    if not rows:
+        sys.exit("The ledger is empty; was intermediate_lifecycle enabled?")
+    stage_peaks, run_peak_time, breakdown = high_water(rows)
+    files: dict[str, int] = defaultdict(int)
+    sizes: dict[str, int] = defaultdict(int)
+    freed: dict[str, int] = defaultdict(int)
+    order: dict[str, float] = {}
+    for row in rows:
+        files[row.stage] += 1
+        sizes[row.stage] += row.size
+        if row.released is not None:
+            freed[row.stage] += row.size - row.size_after
+        order[row.stage] = min(order.get(row.stage, row.created), row.created)
+
+    with open(args.output, "w") as out:
+        out.write("\t".join(REPORT_COLUMNS) + "\n")
+        for stage in sorted(order, key=order.get):
+            peak, peak_time = stage_peaks[stage]
+            out.write(
+                f"{stage}\t{files[stage]}\t{sizes[stage]}\t{freed[stage]}\t"
+                f"{peak}\t{format_time(peak_time)}\t{breakdown.get(stage, 0)}\n"
+            )
+        run_peak = sum(breakdown.values())
+        out.write(
+            f"run\t{len(rows)}\t{sum(sizes.values())}\t{sum(freed.values())}\t"
+            f"{run_peak}\t{format_time(run_peak_time)}\t{run_peak}\n"
+        )
+    print(
+        f"Intermediate high-water mark: {sum(breakdown.values()) / 2**30:.2f} GiB "
+        f"at {format_time(run_peak_time)}; {sum(freed.values()) / 2**30:.2f} GiB "
+        f"released of {sum(sizes.values()) / 2**30:.2f} GiB tracked",
+        file=sys.stderr,
+    )
+    return 0
+
+
+def parse_args(argv: Sequence[str] | None = None) -> argparse.Namespace:
+    """Parse the lifecycle sub-command line."""
+    app = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    commands = app.add_subparsers(dest="command", required=True)
+
+    release = commands.add_parser("release", help="Release consumed intermediates")
+    release.add_argument("--pair", required=True, help="Alignment id")
+    release.add_argument("--stage", required=True, help="Stage that wrote the files")
+    release.add_argument("--action", choices=ACTIONS, required=True)
+    release.add_argument(
+        "--work_dir", required=True, help="Only files below this directory change"
+    )
+    release.add_argument(
+        "--link_dir",
+        action="append",
+        default=[],
+        help="Directory of published symlinks to update (repeatable)",
+    )
+    release.add_argument("--output", required=True, help="Ledger TSV to write")
+    release.add_argument("files", nargs="*", help="Staged intermediate files")
+    release.set_defaults(func=cmd_release)
+
+    report = commands.add_parser("report", help="Disk high-water marks of a run")
+    report.add_argument("--ledger", nargs="+", required=True, help="Ledger TSV files")
+    report.add_argument("--output", required=True, help="Report TSV to write")
+    report.set_defaults(func=cmd_report)
+
+    if argv is None and len(sys.argv) < 2:
+        app.print_help()
+        sys.exit(1)
+    return app.parse_args(argv)
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    """Dispatch one lifecycle sub-command."""
+    args = parse_args(argv)
+    sys.exit(args.func(args))
+
+
+if __name__ == "__main__":
+    run_main(main)
@@ -0,0 +1,1113 @@
+#!/usr/bin/env python3
+"""Run the whole pipeline for one genome pair on a single node, without Nextflow.
+
+For small and medium genome pairs on a many-core workstation, Nextflow's
+per-task staging, work directories and the LASTZ start stagger cost more than
+the alignments themselves. This runner executes the same steps with the same
+tools and scripts as the Nextflow workflow:
+
+    prepare genomes -> partition.py -> LASTZ (run_lastz_intermediate_layer.py)
+    -> psl_merge_sorted.py per reference bucket [-> psl_dedup.py]
+    -> psl_split_bundle.py -> axtChain -> chaintools antirepeat/merge
+    -> [chaintools split -> repeat_filler -> chaintools score/merge/sort]
+    -> [chainCleaner (or chain_shard.py split/merge)] -> chaintools filter
+
+Independent jobs of a step run concurrently. A job starts only while enough
+CPUs (--threads) and its estimated memory (--max_memory) are free; LASTZ pairs
+are estimated as in run_lastz_packed.py, AXT_CHAIN, REPEAT_FILLER and
+CHAIN_CLEANER through the resource advisor model. LASTZ pairs start largest
+first.
+
+Finished jobs are recorded in <outdir>/local_run_state.json. A rerun with the
+same parameters skips them, and interrupted LASTZ pairs resume from their
+completion journals. Results use the Nextflow output layout (00_genome_prep
+... 07_final/<reference>.<query>.allfilled.chain.gz).
+
+Usage:
+    local_runner.py --params_json params.json --outdir results \\
+                    --threads 64 --max_memory 500G [--param KEY=VALUE ...]
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from itertools import product
+from typing import Sequence
+
+from genome_cache import parse_size
+from profiling import run_main, span
+from psl_bundle import read_chrom_sizes
+from resource_advisor import load_model, predict_input
+from run_lastz import is_2bit_v1
+from run_lastz_packed import (
+    build_pair_command,
+    estimate_pair_memory,
+    output_name,
+    partition_bases,
+)
+
+LOGGER = logging.getLogger("local_runner")
+
+BIN_DIR = os.path.dirname(os.path.abspath(__file__))
+STATE_NAME = "local_run_state.json"
+STATE_VERSION = 1
+GB = 1024**3
+# Same threshold as FA_TO_TWO_BIT: FASTA above 4 GB gets a v1 (-long) .2bit.
+LONG_TWOBIT_FASTA_BYTES = 4 * GB
+ANTIREPEAT_CPUS = 16
+# Resources of the process_medium label used by the chaintools merge and sort.
+MEDIUM_CPUS = 8
+MEDIUM_MEMORY_GB = 50
+
+# Infrastructure defaults of nextflow.config used by the steps below; the
+# scientific parameters come from the params JSON.
+INFRA_DEFAULTS: dict[str, object] = {
+    "force_long_2bit": False,
+    "bulk_manifests": False,
+    "bulk_max_chroms": 100,
+    "bulk_max_bases": None,
+    "partition_gap_aware": False,
+    "partition_gap_tolerance": 0.05,
+    "partition_min_gap": 1000,
+    "dedup_query_overlaps": False,
+    "lastz_q": None,
+    "clean_chain_shards": 1,
+    "clean_chain_shard_mode": "target",
+    "seq_store_dir": None,
+    "seq_store_max_size": "16G",
+    "seq_fifo": False,
+    "seq_fifo_timeout": None,
+    "psl_score_prune": False,
+    "lastz_orientation": "reference",
+}
+REQUIRED_PARAMS = (
+    "reference_name",
+    "query_name",
+    "reference_genome",
+    "query_genome",
+    "seq1_chunk",
+    "seq2_chunk",
+    "seq1_lap",
+    "seq2_lap",
+    "lastz_k",
+    "lastz_h",
+    "lastz_l",
+    "lastz_y",
+    "min_chain_score",
+    "chain_linear_gap",
+    "bundle_psl_max_bases",
+    "skip_fill_chains",
+    "skip_clean_chain",
+)
+
+PipelineParams = dict[str, object]
+
+
+class LocalRunError(Exception):
+    """Report a failed job or an invalid local run."""
+
+
+@dataclass
+class Job:
+    """One command of a step, with its resource request and outputs."""
+
+    name: str
+    command: list[str]
+    cwd: str
+    outputs: list[str] = field(default_factory=list)
+    cpus: int = 1
+    memory: int = 0
+    stdout: str | None = None
+    cost: int = 0
+
+
+@dataclass
+class Genome:
+    """A prepared genome in one role of the alignment."""
+
+    role: str
+    name: str
+    twobit: str
+    chrom_sizes: str
+    chroms_dir: str | None = None
+
+
+def configure_logging(verbose: bool) -> None:
+    """Log step progress to stderr; add commands when verbose."""
+    logging.basicConfig(
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+        datefmt="%H:%M:%S",
+    )
+    LOGGER.setLevel(logging.DEBUG if verbose else logging.INFO)
+
+
+def read_params(path: str, overrides: Sequence[str]) -> PipelineParams:
+    """Read the Nextflow params JSON (trailing commas allowed) and overrides."""
+    with open(path) as params_file:
+        text = re.sub(r",(\s*[}\]])", r"\1", params_file.read())
+    params: PipelineParams = dict(INFRA_DEFAULTS)
+    params.update(json.loads(text))
+    for override in overrides:
+        key, sep, value = override.partition("=")
+        if not sep:
+            raise ValueError(f"Malformed --param {override!r}: expected KEY=VALUE")
+        try:
+            params[key] = json.loads(value)
+        except json.JSONDecodeError:
+            params[key] = value
+    missing = [key for key in REQUIRED_PARAMS if params.get(key) is None]
+    if missing:
+        raise ValueError(f"Missing required parameter(s): {', '.join(missing)}")
+    if params["reference_name"] == params["query_name"]:
+        raise ValueError("reference_name and query_name must differ")
+    return params
+
+
+def params_digest(params: PipelineParams) -> str:
+    """Return a digest of all parameters that shape the results."""
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+
+class RunState:
+    """Finished jobs of a run, persisted after every change."""
+
+    def __init__(self, path: str, digest: str, restart: bool) -> None:
+        self.path = path
+        self.digest = digest
+        self.done: dict[str, list[str]] = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path) and not restart:
+            with open(path) as state_file:
+                state = json.load(state_file)
+            if state.get("params_digest") != digest:
+                raise LocalRunError(
+                    f"{path} belongs to a run with different parameters; "
+                    "use --restart to discard it"
+                )
+            self.done = state.get("done", {})
+            LOGGER.info("Resuming: %d job(s) already finished", len(self.done))
+
+    def is_done(self, job: Job) -> bool:
+        """Return whether a job finished earlier and its outputs still exist."""
+        with self._lock:
+            outputs = self.done.get(job.name)
+        return outputs is not None and all(os.path.exists(path) for path in outputs)
+
+    def mark_done(self, job: Job) -> None:
+        """Record a finished job."""
+        with self._lock:
+            self.done[job.name] = job.outputs
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as state_file:
+                json.dump(
+                    {
+                        "version": STATE_VERSION,
+                        "params_digest": self.digest,
+                        "done": self.done,
+                    },
+                    state_file,
+                )
+            os.replace(tmp_path, self.path)
+
+
+class ResourcePool:
+    """Admit jobs while their CPUs and estimated memory are free."""
+
+    def __init__(self, cpus: int, memory: int) -> None:
+        self.cpus = max(1, cpus)
+        self.memory = memory
+        self.cpus_in_use = 0
+        self.memory_in_use = 0
+        self.failed: list[str] = []
+        self._cond = threading.Condition()
+
+    def acquire(self, job: Job) -> bool:
+        """Block until the job fits; return False once a job has failed.
+
+        A job larger than the node is still admitted when nothing else runs.
+        """
+        cpus = min(job.cpus, self.cpus)
+        with self._cond:
+            while not self.failed and not self._fits(cpus, job.memory):
+                self._cond.wait()
+            if self.failed:
+                return False
+            self.cpus_in_use += cpus
+            self.memory_in_use += job.memory
+            return True
+
+    def release(self, job: Job, failed: bool) -> None:
+        """Return a job's CPUs and memory reservation."""
+        with self._cond:
+            self.cpus_in_use -= min(job.cpus, self.cpus)
+            self.memory_in_use -= job.memory
+            if failed:
+                self.failed.append(job.name)
+            self._cond.notify_all()
+
+    def wait_idle(self) -> None:
+        """Block until every admitted job has finished."""
+        with self._cond:
+            while self.cpus_in_use:
+                self._cond.wait()
+
+    def _fits(self, cpus: int, memory: int) -> bool:
+        if self.cpus_in_use == 0:
+            return True
+        if self.cpus_in_use + cpus > self.cpus:
+            return False
+        return self.memory <= 0 or self.memory_in_use + memory <= self.memory
+
+
+def script(name: str) -> list[str]:
+    """Return the command prefix of one of the pipeline's Python scripts."""
+    return [sys.executable, os.path.join(BIN_DIR, name)]
+
+
+def reset_dir(path: str) -> str:
+    """Create an empty directory, removing leftovers of an interrupted job."""
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    os.makedirs(path)
+    return path
+
+
+def link(src: str, dst: str) -> None:
+    """Point dst at src with a relative symlink, replacing an existing link."""
+    if os.path.lexists(dst):
+        os.unlink(dst)
+    os.symlink(os.path.relpath(src, os.path.dirname(os.path.abspath(dst))), dst)
+
+
+def sorted_files(directory: str, suffix: str) -> list[str]:
+    """Return the files of a directory with the given suffix, sorted by name."""
+    return sorted(
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if name.endswith(suffix)
+    )
+
+
+def write_list(path: str, items: Sequence[str]) -> str:
+    """Write one item per line and return the path."""
+    with open(path, "w") as list_file:
+        list_file.writelines(f"{item}\n" for item in items)
+    return path
+
+
+class LocalRunner:
+    """Runs every step of one alignment on the local node."""
+
+    def __init__(self, args: argparse.Namespace, params: PipelineParams) -> None:
+        self.params = params
+        self.outdir = os.path.abspath(args.outdir)
+        self.threads = args.threads
+        self.max_memory = parse_size(args.max_memory) if args.max_memory else 0
+        self.model = load_model(args.resource_model)
+        self.pair = f"{params['reference_name']}.{params['query_name']}"
+        os.makedirs(self.outdir, exist_ok=True)
+        self.state = RunState(
+            os.path.join(self.outdir, STATE_NAME), params_digest(params), args.restart
+        )
+
+    def path(self, *parts: str) -> str:
+        """Return a path below the output directory."""
+        return os.path.join(self.outdir, *parts)
+
+    def run_jobs(self, step: str, jobs: list[Job]) -> None:
+        """Run the unfinished jobs of a step concurrently, in the given order."""
+        pending = [job for job in jobs if not self.state.is_done(job)]
+        LOGGER.info("%s: %d job(s), %d to run", step, len(jobs), len(pending))
+        pool = ResourcePool(self.threads, self.max_memory)
+        finished = 0
+        progress_lock = threading.Lock()
+        started = time.monotonic()
+
+        def run(job: Job) -> None:
+            nonlocal finished
+            failed = True
+            try:
+                LOGGER.debug("Running %s: %s", job.name, " ".join(job.command))
+                stdout = open(job.stdout, "w") if job.stdout else None
+                try:
+                    with span(step, job.name):
+                        result = subprocess.run(job.command, cwd=job.cwd, stdout=stdout)
+                finally:
+                    if stdout:
+                        stdout.close()
+                if result.returncode != 0:
+                    LOGGER.error(
+                        "%s failed with exit code %d", job.name, result.returncode
+                    )
+                    return
+                self.state.mark_done(job)
+                failed = False
+                with progress_lock:
+                    finished += 1
+                    if finished % max(1, len(pending) // 20) == 0:
+                        LOGGER.info(
+                            "%s: %d/%d done (%.0f s)",
+                            step,
+                            finished,
+                            len(pending),
+                            time.monotonic() - started,
+                        )
+            except OSError as error:
+                LOGGER.error("Could not start %s: %s", job.name, error)
+            finally:
+                pool.release(job, failed)
+
+        for job in pending:
+            if not pool.acquire(job):
+                break
+            threading.Thread(target=run, args=(job,)).start()
+        pool.wait_idle()
+        if pool.failed:
+            raise LocalRunError(f"{step} failed: {', '.join(pool.failed)}")
+
+    def run_one(self, job: Job) -> None:
+        """Run a single job that may use the whole node."""
+        self.run_jobs(job.name, [job])
+
+    # ── Steps ───────────────────────────────────────────────────────────────
+
+    def prepare_genome(self, role: str) -> Genome:
+        """Convert the genome to .2bit if needed, write chrom.sizes, extract v1."""
+        name = str(self.params[f"{role}_name"])
+        source = os.path.abspath(str(self.params[f"{role}_genome"]))
+        prep_dir = self.path("00_genome_prep")
+        os.makedirs(prep_dir, exist_ok=True)
+        twobit = os.path.join(prep_dir, f"{name}.2bit")
+        chrom_sizes = os.path.join(prep_dir, f"{name}.chrom.sizes")
+
+        jobs = []
+        if source.endswith(".2bit"):
+            link(source, twobit)
+        else:
+            use_long = self.params["force_long_2bit"] or (
+                os.path.getsize(source) > LONG_TWOBIT_FASTA_BYTES
+            )
+            command = ["faToTwoBit"] + (["-long"] if use_long else [])
+            jobs.append(
+                Job(
+                    f"fa_to_two_bit.{role}",
+                    command + [source, twobit],
+                    prep_dir,
+                    [twobit],
+                )
+            )
+        sizes_dir = os.path.join(prep_dir, f"{name}_sizes")
+        jobs.append(
+            Job(
+                f"chromsize.{role}",
+                [
+                    "sh",
+                    "-c",
+                    'chromsize -s "$1" -o "$2" && mv "$2/chrom.sizes" "$3"',
+                    "chromsize",
+                    source,
+                    sizes_dir,
+                    chrom_sizes,
+                ],
+                prep_dir,
+                [chrom_sizes],
+            )
+        )
+        self.run_jobs(f"Prepare {name}", jobs)
+
+        genome = Genome(role, name, twobit, chrom_sizes)
+        if is_2bit_v1(twobit) and not self.params["seq_fifo"]:
+            # lastz cannot read v1 .2bit; extract every chromosome once
+            # unless run_lastz.py streams the ranges through FIFOs.
+            genome.chroms_dir = os.path.join(prep_dir, f"{name}_chroms")
+            os.makedirs(genome.chroms_dir, exist_ok=True)
+            self.run_jobs(
+                f"Extract {name} chromosomes",
+                [
+                    Job(
+                        f"extract.{role}.{chrom}",
+                        ["twoBitToFa", f"-seq={chrom}", twobit, f"{chrom}.fa"],
+                        genome.chroms_dir,
+                        [os.path.join(genome.chroms_dir, f"{chrom}.fa")],
+                    )
+                    for chrom in read_chrom_sizes(chrom_sizes)
+                ],
+            )
+        return genome
+
+    def partition(self, genome: Genome) -> list[str]:
+        """Partition a genome exactly as the PARTITION module does."""
+        part_dir = self.path("01_partition")
+        os.makedirs(part_dir, exist_ok=True)
+        index = "1" if genome.role == "reference" else "2"
+        partitions = os.path.join(part_dir, f"{genome.role}_partitions.txt")
+        command = script("partition.py") + [
+            "--chrom_sizes",
+            genome.chrom_sizes,
+            "--twobit_name",
+            os.path.basename(genome.twobit),
+            "--chunk_size",
+            str(self.params[f"seq{index}_chunk"]),
+            "--overlap",
+            str(self.params[f"seq{index}_lap"]),
+            "--output",
+            partitions,
+        ]
+        os.makedirs(os.path.join(part_dir, f"{genome.role}_bulks"), exist_ok=True)
+        if self.params["bulk_manifests"]:
+            command += ["--bulk_manifest_dir", f"{genome.role}_bulks"]
+        if self.params["bulk_max_bases"]:
+            command += ["--bulk_max_bases", str(self.params["bulk_max_bases"])]
+        if self.params["bulk_max_chroms"]:
+            command += ["--bulk_max_chroms", str(self.params["bulk_max_chroms"])]
+        if self.params["partition_gap_aware"]:
+            command += [
+                "--twobit",
+                genome.twobit,
+                "--gap_tolerance",
+                str(self.params["partition_gap_tolerance"]),
+                "--min_gap",
+                str(self.params["partition_min_gap"]),
+                "--report",
+                f"{genome.role}_partition_report.tsv",
+            ]
+        self.run_one(Job(f"partition.{genome.role}", command, part_dir, [partitions]))
+        with open(partitions) as partition_file:
+            return [line.strip() for line in partition_file if line.strip()]
+
+    def lastz(
+        self,
+        reference: Genome,
+        query: Genome,
+        reference_parts: list[str],
+        query_parts: list[str],
+    ) -> dict[str, list[str]]:
+        """Align every partition pair; return PSL files by reference bucket."""
+        lastz_dir = self.path("02_lastz_psl")
+        os.makedirs(lastz_dir, exist_ok=True)
+        # The task directory of a LASTZ task: staged genomes and BULK lists.
+        for genome in (reference, query):
+            link(
+                genome.twobit, os.path.join(lastz_dir, os.path.basename(genome.twobit))
+            )
+            link(
+                genome.chrom_sizes,
+                os.path.join(lastz_dir, os.path.basename(genome.chrom_sizes)),
+            )
+            link(
+                self.path("01_partition", f"{genome.role}_bulks"),
+                os.path.join(lastz_dir, f"{genome.role}_bulks"),
+            )
+        params_json = os.path.join(lastz_dir, "params.json")
+        with open(params_json, "w") as params_file:
+            json.dump(
+                {
+                    "seq_1_len": os.path.basename(reference.chrom_sizes),
+                    "seq_2_len": os.path.basename(query.chrom_sizes),
+                    "lastz_k": self.params["lastz_k"],
+                    "lastz_h": self.params["lastz_h"],
+                    "lastz_l": self.params["lastz_l"],
+                    "lastz_y": self.params["lastz_y"],
+                    "seq_store_dir": self.params["seq_store_dir"] or "",
+                    "seq_store_max_size": self.params["seq_store_max_size"] or "",
+                    "seq_fifo": bool(self.params["seq_fifo"]),
+                    "seq_fifo_timeout": self.params["seq_fifo_timeout"] or "",
+                    "orientation": self.params["lastz_orientation"],
+                },
+                params_file,
+                indent=4,
+            )
+        pair_args = argparse.Namespace(
+            intermediate_script=os.path.join(
+                BIN_DIR, "run_lastz_intermediate_layer.py"
+            ),
+            run_lastz_script=os.path.join(BIN_DIR, "run_lastz.py"),
+            output_format="psl",
+            reference_chrom_dir=reference.chroms_dir,
+            query_chrom_dir=query.chroms_dir,
+            verbose=False,
+        )
+        sizes = (
+            read_chrom_sizes(reference.chrom_sizes),
+            read_chrom_sizes(query.chrom_sizes),
+        )
+
+        def bases(part: str, chrom_sizes: dict[str, int]) -> int:
+            # BULK manifests are relative to the LASTZ directory.
+            return partition_bases(part.replace(":@", f":@{lastz_dir}/"), chrom_sizes)
+
+        jobs = []
+        buckets: dict[str, list[str]] = {}
+        for reference_part, query_part in product(reference_parts, query_parts):
+            output = output_name(reference_part, query_part, "psl")
+            reference_bases = bases(reference_part, sizes[0])
+            query_bases = bases(query_part, sizes[1])
+            job = Job(
+                f"lastz.{output}",
+                build_pair_command(
+                    pair_args, (reference_part, query_part), params_json, output
+                ),
+                lastz_dir,
+                [],
+                memory=estimate_pair_memory(reference_bases, query_bases),
+                cost=reference_bases * query_bases,
+            )
+            jobs.append(job)
+            buckets.setdefault(bucket_key(reference_part), []).append(
+                os.path.join(lastz_dir, output)
+            )
+        jobs.sort(key=lambda job: -job.cost)
+        self.run_jobs("LASTZ", jobs)
+        return {
+            bucket: [psl for psl in psls if os.path.exists(psl)]
+            for bucket, psls in buckets.items()
+        }
+
+    def merge_buckets(self, buckets: dict[str, list[str]]) -> list[str]:
+        """Merge each bucket's sorted PSL files, then optionally deduplicate."""
+        concat_dir = self.path("03_concat_lastz_output")
+        list_dir = os.path.join(concat_dir, "lists")
+        os.makedirs(list_dir, exist_ok=True)
+        jobs = []
+        merged = []
+        for bucket, psls in sorted(buckets.items()):
+            if not psls:
+                continue
+            output = os.path.join(concat_dir, f"{bucket}.merged.psl")
+            file_list = write_list(os.path.join(list_dir, f"{bucket}.list"), psls)
+            jobs.append(
+                Job(
+                    f"psl_merge.{bucket}",
+                    script("psl_merge_sorted.py")
+                    + ["--file_list", file_list, "--tmp_dir", ".", "--output", output],
+                    concat_dir,
+                    [output],
+                )
+            )
+            merged.append(output)
+        self.run_jobs("PSL merge", jobs)
+        if not self.params["dedup_query_overlaps"]:
+            return merged
+
+        dedup_jobs = []
+        deduped = []
+        for psl in merged:
+            bucket = os.path.basename(psl)[: -len(".merged.psl")]
+            output = os.path.join(concat_dir, f"{bucket}.dedup.psl")
+            dedup_jobs.append(
+                Job(
+                    f"psl_dedup.{bucket}",
+                    script("psl_dedup.py")
+                    + [
+                        "--psl",
+                        psl,
+                        "--query_partitions",
+                        self.path("01_partition", "query_partitions.txt"),
+                        "--output",
+                        output,
+                        "--report",
+                        os.path.join(list_dir, f"{bucket}.dedup_report.tsv"),
+                        "--name",
+                        bucket,
+                    ],
+                    concat_dir,
+                    [output],
+                )
+            )
+            deduped.append(output)
+        self.run_jobs("PSL dedup", dedup_jobs)
+        return deduped
+
+    def chain_build(self, psls: list[str], reference: Genome, query: Genome) -> str:
+        """Bundle, chain, anti-repeat filter and merge; return the merged chain."""
+        chain_dir = self.path("04_axtchain")
+        bundle_dir = os.path.join(chain_dir, "split_psl")
+        antirepeat_dir = os.path.join(chain_dir, "chain_antirepeat")
+        merged_dir = os.path.join(chain_dir, "merged_chains")
+        for directory in (chain_dir, antirepeat_dir, merged_dir):
+            os.makedirs(directory, exist_ok=True)
+
+        prune_args = []
+        if self.params["psl_score_prune"]:
+            prune_args = ["--min_score", str(self.params["min_chain_score"])]
+            if self.params["lastz_q"]:
+                prune_args += ["--score_scheme", str(self.params["lastz_q"])]
+        bundle_job = Job(
+            "psl_split_bundle",
+            script("psl_split_bundle.py")
+            + [
+                "--file_list",
+                write_list(os.path.join(chain_dir, "psl.list"), psls),
+                "--chrom_sizes",
+                reference.chrom_sizes,
+                "--output_dir",
+                bundle_dir,
+                "--max_bases",
+                str(self.params["bundle_psl_max_bases"]),
+                "--tmp_dir",
+                ".",
+            ]
+            + prune_args,
+            chain_dir,
+            [bundle_dir],
+        )
+        if not self.state.is_done(bundle_job):
+            reset_dir(bundle_dir)
+        self.run_one(bundle_job)
+        bundles = sorted_files(bundle_dir, ".psl")
+
+        matrix = (
+            [f"-scoreScheme={self.params['lastz_q']}"] if self.params["lastz_q"] else []
+        )
+        chains = [
+            os.path.join(chain_dir, f"{os.path.basename(bundle)[:-4]}.chain")
+            for bundle in bundles
+        ]
+        axt_jobs = [
+            Job(
+                f"axt_chain.{os.path.basename(bundle)}",
+                [
+                    "axtChain",
+                    "-psl",
+                    "-verbose=0",
+                    f"-minScore={self.params['min_chain_score']}",
+                    f"-linearGap={self.params['chain_linear_gap']}",
+                ]
+                + matrix
+                + [bundle, reference.twobit, query.twobit, chain],
+                chain_dir,
+                [chain],
+                memory=self.advised_memory("AXT_CHAIN", bundle),
+            )
+            for bundle, chain in zip(bundles, chains)
+        ]
+        axt_jobs.sort(key=lambda job: -job.memory)
+        self.run_jobs("AXT_CHAIN", axt_jobs)
+
+        clean_chains = []
+        antirepeat_jobs = []
+        for chain in chains:
+            clean_chain = os.path.join(
+                antirepeat_dir, f"{os.path.basename(chain)[:-6]}.clean.chain"
+            )
+            antirepeat_jobs.append(
+                Job(
+                    f"antirepeat.{os.path.basename(chain)}",
+                    [
+                        "chaintools",
+                        "antirepeat",
+                        "--chain",
+                        chain,
+                        "--reference",
+                        reference.twobit,
+                        "--query",
+                        query.twobit,
+                        "--threads",
+                        str(min(ANTIREPEAT_CPUS, self.threads)),
+                        "--out-chain",
+                        clean_chain,
+                    ],
+                    antirepeat_dir,
+                    [clean_chain],
+                    cpus=ANTIREPEAT_CPUS,
+                )
+            )
+            clean_chains.append(clean_chain)
+        self.run_jobs("CHAINTOOLS_ANTIREPEAT", antirepeat_jobs)
+
+        merged = os.path.join(merged_dir, f"{self.pair}.all.chain.gz")
+        self.run_one(
+            self.merge_job("chaintools_merge", clean_chains, merged, merged_dir)
+        )
+        return merged
+
+    def merge_job(self, name: str, chains: list[str], output: str, cwd: str) -> Job:
+        """Return a chaintools merge job as run by CHAINTOOLS_MERGE."""
+        max_gb = MEDIUM_MEMORY_GB
+        if self.max_memory:
+            max_gb = max(1, min(max_gb, self.max_memory // GB))
+        return Job(
+            name,
+            [
+                "chaintools",
+                "merge",
+                "--file",
+                write_list(f"{output}.list", chains),
+                "--threads",
+                str(min(MEDIUM_CPUS, self.threads)),
+                "--max-gb",
+                str(max_gb),
+                "--sort-by",
+                "id",
+                "--rename",
+                "--gzip",
+                "--out-chain",
+                output,
+            ],
+            cwd,
+            [output],
+            cpus=MEDIUM_CPUS,
+            memory=max_gb * GB,
+        )
+
+    def fill(self, merged: str, reference: Genome, query: Genome) -> str:
+        """Fill chain gaps with repeat_filler; return the sorted filled chain."""
+        fill_dir = self.path("05_filled_chains")
+        split_dir = os.path.join(fill_dir, "split")
+        filled_dir = os.path.join(fill_dir, "filled")
+        os.makedirs(filled_dir, exist_ok=True)
+
+        split_job = Job(
+            "chaintools_split",
+            [
+                "chaintools",
+                "split",
+                "--chain",
+                merged,
+                "--files",
+                str(self.params["num_fill_jobs"]),
+                "--outdir",
+                ".",
+                "--randomize",
+                "--threads",
+                "1",
+            ],
+            split_dir,
+            [os.path.join(split_dir, "chains")],
+        )
+        if not self.state.is_done(split_job):
+            reset_dir(split_dir)
+        self.run_one(split_job)
+        chunks = sorted_files(os.path.join(split_dir, "chains"), ".chain")
+
+        unmask = [] if self.params.get("skip_fill_unmask") else ["--unmask"]
+        fill_jobs = []
+        score_jobs = []
+        scored = []
+        for chunk in chunks:
+            base = os.path.basename(chunk)
+            filled = os.path.join(filled_dir, f"{base}.filled.chain")
+            fill_jobs.append(
+                Job(
+                    f"repeat_filler.{base}",
+                    [
+                        "repeat_filler",
+                        "--chain",
+                        chunk,
+                        "--T2bit",
+                        reference.twobit,
+                        "--Q2bit",
+                        query.twobit,
+                        "--workdir",
+                        "./",
+                        "--chainMinScore",
+                        str(self.params["min_chain_score"]),
+                        "--gapMaxSizeT",
+                        str(self.params["fill_gap_max_size_t"]),
+                        "--gapMaxSizeQ",
+                        str(self.params["fill_gap_max_size_q"]),
+                        "--scoreThreshold",
+                        str(self.params["fill_insert_chain_min_score"]),
+                        "--gapMinSizeT",
+                        str(self.params["fill_gap_min_size_t"]),
+                        "--gapMinSizeQ",
+                        str(self.params["fill_gap_min_size_q"]),
+                        "--lastzParameters",
+                        f"K={self.params['fill_lastz_k']} L={self.params['fill_lastz_l']}",
+                        "--verbose",
+                    ]
+                    + unmask,
+                    filled_dir,
+                    [filled],
+                    memory=self.advised_memory("REPEAT_FILLER", chunk),
+                    stdout=filled,
+                )
+            )
+            scored_chain = os.path.join(filled_dir, f"{base}.filled.scored.chain")
+            score_jobs.append(
+                Job(
+                    f"chaintools_score.{base}",
+                    [
+                        "chaintools",
+                        "score",
+                        "--chain",
+                        filled,
+                        "--reference",
+                        reference.twobit,
+                        "--query",
+                        query.twobit,
+                        "--threads",
+                        "1",
+                        "--sort-by-score",
+                        "--out-chain",
+                        scored_chain,
+                    ],
+                    filled_dir,
+                    [scored_chain],
+                )
+            )
+            scored.append(scored_chain)
+        fill_jobs.sort(key=lambda job: -job.memory)
+        self.run_jobs("REPEAT_FILLER", fill_jobs)
+        self.run_jobs("CHAINTOOLS_SCORE", score_jobs)
+
+        filled_all = os.path.join(fill_dir, f"{self.pair}.filled.all.chain.gz")
+        self.run_one(
+            self.merge_job("chaintools_merge_filled", scored, filled_all, fill_dir)
+        )
+        sorted_chain = self.path(
+            "04_axtchain", "merged_chains", f"{self.pair}.filled.all.chain.sorted.chain"
+        )
+        self.run_one(
+            Job(
+                "chaintools_sort",
+                [
+                    "chaintools",
+                    "sort",
+                    "--chain",
+                    filled_all,
+                    "--threads",
+                    str(min(MEDIUM_CPUS, self.threads)),
+                    "--out-chain",
+                    sorted_chain,
+                ],
+                fill_dir,
+                [sorted_chain],
+                cpus=MEDIUM_CPUS,
+            )
+        )
+        return sorted_chain
+
+    def clean(self, chain: str, reference: Genome, query: Genome) -> str:
+        """Run chainCleaner serially or on shards; return the cleaned chain."""
+        clean_dir = self.path("06_cleaned_chains")
+        os.makedirs(clean_dir, exist_ok=True)
+        cleaned = os.path.join(clean_dir, "cleaned_intermediate.chain")
+        suspects = os.path.join(clean_dir, "removed_suspects.bed")
+        shards = int(self.params["clean_chain_shards"] or 1)
+        if shards <= 1:
+            self.run_one(
+                self.cleaner_job(
+                    "chain_cleaner", chain, "", clean_dir, reference, query
+                )
+            )
+            return cleaned
+
+        shard_dir = os.path.join(clean_dir, "shards")
+        manifest = os.path.join(clean_dir, "shard_manifest.tsv")
+        split_job = Job(
+            "chain_shard_split",
+            script("chain_shard.py")
+            + [
+                "split",
+                "--chain",
+                chain,
+                "--shards",
+                str(shards),
+                "--mode",
+                str(self.params["clean_chain_shard_mode"]),
+                "--output_dir",
+                shard_dir,
+                "--manifest",
+                manifest,
+            ],
+            clean_dir,
+            [manifest],
+        )
+        if not self.state.is_done(split_job):
+            reset_dir(shard_dir)
+        self.run_one(split_job)
+        shard_jobs = []
+        for shard in sorted_files(shard_dir, ".chain"):
+            prefix = f"{os.path.basename(shard)[:-6]}."
+            shard_jobs.append(
+                self.cleaner_job(
+                    f"chain_cleaner.{prefix}",
+                    shard,
+                    prefix,
+                    shard_dir,
+                    reference,
+                    query,
+                )
+            )
+        shard_jobs.sort(key=lambda job: -job.memory)
+        self.run_jobs("CHAIN_CLEANER", shard_jobs)
+        self.run_one(
+            Job(
+                "chain_shard_merge",
+                script("chain_shard.py")
+                + ["merge", "--manifest", manifest, "--chains"]
+                + sorted_files(shard_dir, "cleaned_intermediate.chain")
+                + ["--beds"]
+                + sorted_files(shard_dir, "removed_suspects.bed")
+                + ["--output", cleaned, "--bed_output", suspects],
+                clean_dir,
+                [cleaned, suspects],
+            )
+        )
+        return cleaned
+
+    def cleaner_job(
+        self,
+        name: str,
+        chain: str,
+        prefix: str,
+        cwd: str,
+        reference: Genome,
+        query: Genome,
+    ) -> Job:
+        """Return a chainCleaner job as run by CHAIN_CLEANER."""
+        cleaned = os.path.join(cwd, f"{prefix}cleaned_intermediate.chain")
+        suspects = os.path.join(cwd, f"{prefix}removed_suspects.bed")
+        return Job(
+            name,
+            [
+                "chainCleaner",
+                chain,
+                reference.twobit,
+                query.twobit,
+                cleaned,
+                suspects,
+                f"-linearGap={self.params['chain_linear_gap']}",
+                f"-tSizes={reference.chrom_sizes}",
+                f"-qSizes={query.chrom_sizes}",
+            ]
+            + str(self.params.get("clean_chain_parameters") or "").split(),
+            cwd,
+            [cleaned, suspects],
+            memory=self.advised_memory("CHAIN_CLEANER", chain),
+        )
+
+    def finalize(self, chain: str, cleaned: bool) -> str:
+        """Write 07_final/<pair>.allfilled.chain.gz."""
+        final_dir = self.path("07_final")
+        os.makedirs(final_dir, exist_ok=True)
+        final = os.path.join(final_dir, f"{self.pair}.allfilled.chain.gz")
+        if cleaned:
+            self.run_one(
+                Job(
+                    "chaintools_filter",
+                    [
+                        "chaintools",
+                        "filter",
+                        "--chain",
+                        chain,
+                        "--threads",
+                        "1",
+                        "--min-score",
+                        str(self.params["min_chain_score"]),
+                        "--gzip",
+                        "--out-chain",
+                        final,
+                    ],
+                    final_dir,
+                    [final],
+                )
+            )
+        elif chain.endswith(".gz"):
+            shutil.copyfile(chain, final)
+        else:
+            with open(chain, "rb") as src, gzip.open(final, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+        return final
+
+    def advised_memory(self, process: str, path: str) -> int:
+        """Return the resource model's memory estimate for one input file."""
+        return int(predict_input(self.model, process, "memory", path))
+
+    def run(self) -> str:
+        """Run every step and return the final chain."""
+        started = time.monotonic()
+        reference = self.prepare_genome("reference")
+        query = self.prepare_genome("query")
+        reference_parts = self.partition(reference)
+        query_parts = self.partition(query)
+        buckets = self.lastz(reference, query, reference_parts, query_parts)
+        psls = self.merge_buckets(buckets)
+        chain = self.chain_build(psls, reference, query)
+        if not self.params["skip_fill_chains"]:
+            chain = self.fill(chain, reference, query)
+        cleaned = not self.params["skip_clean_chain"]
+        if cleaned:
+            chain = self.clean(chain, reference, query)
+        final = self.finalize(chain, cleaned)
+        LOGGER.info("Final chain: %s (%.0f s)", final, time.monotonic() - started)
+        return final
+
+
+def bucket_key(partition: str) -> str:
+    """Return the PSL merge bucket of a reference partition (see LASTZ_ALIGNMENT)."""
+    fields = partition.split(":")
+    if partition.startswith("BULK"):
+        return f"bucket_ref_bulk_{fields[0].split('_')[1]}"
+    start, end = fields[2].split("-")
+    return f"bucket_ref_{fields[1]}_in_{start}_{end}"
+
+
+def parse_args(argv: Sequence[str] | None = None) -> argparse.Namespace:
+    """Parse the local runner command line."""
+    app = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    app.add_argument(
+        "--params_json", required=True, help="Pipeline params JSON (as for Nextflow)"
+    )
+    app.add_argument("--outdir", required=True, help="Output directory")
+    app.add_argument(
+        "--threads",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="CPUs to use (default: all)",
+    )
+    app.add_argument(
+        "--max_memory",
+        default=None,
+        help="Memory budget for concurrent jobs, e.g. 500G (default: unlimited)",
+    )
+    app.add_argument(
+        "--resource_model",
+        default=None,
+        help="Resource advisor model for job memory estimates (default: built-in)",
+    )
+    app.add_argument(
+        "--param",
+        action="append",
+        default=[],
+        help="Override a parameter, KEY=VALUE with a JSON value (repeatable)",
+    )
+    app.add_argument(
+        "--restart",
+        action="store_true",
+        help="Ignore the state file of an earlier run and start over",
+    )
+    app.add_argument("--verbose", "-v", action="store_true", help="Debug logging")
+    if argv is None and len(sys.argv) < 2:
+        app.print_help()
+        sys.exit(1)
+    return app.parse_args(argv)
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    """Run the pipeline for the genome pair of the params JSON."""
+    args = parse_args(argv)
+    configure_logging(args.verbose)
+    try:
+        params = read_params(args.params_json, args.param)
+        LocalRunner(args, params).run()
+    except (LocalRunError, ValueError) as error:
+        LOGGER.error("%s", error)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    run_main(main)
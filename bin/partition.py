@@ -9,13 +9,47 @@ Output (stdout): one partition string per line, e.g.:
     target.2bit:chr1:0-175000000
     target.2bit:chr1:175000000-200000000
     BULK_1:target.2bit:chr2:chr3:chr4
+
+With --twobit, partitioning is gap-aware: the N-block table of the .2bit file
+is read and a chunk boundary that falls within --gap_tolerance (a fraction of
+the chunk size) of an assembly gap of at least --min_gap Ns is moved into the
+largest such gap. The chunks on either side then end and start at the gap
+edges, with no overlap, since no alignment can span the gap. Flanking Ns are
+trimmed from every chunk, and chunks or small scaffolds that are entirely N
+are dropped. The saved windows and bases are written to --report.
+
+With --bulk_manifest_dir, small scaffolds are bin-packed first-fit decreasing
+by size into bulks bounded by --bulk_max_bases and --bulk_max_chroms, and each
+bulk's members are written to <dir>/BULK_<n>.lst. The partition string then
+references the manifest instead of listing every scaffold:
+    BULK_1:target.2bit:@target_bulks/BULK_1.lst
+so partition strings, channel items and command lines stay short however
+fragmented the assembly is. In either mode chrom.sizes is streamed and the
+chunks of large chromosomes are written as they are cut; only the small
+scaffolds due for packing are held in memory.
+
+With --cache_dir, the partition file is looked up in (and stored into) the
+content-addressed genome cache (see genome_cache.py), keyed by the chrom.sizes
+digest, the .2bit name and the partition parameters.
 """
 
 import argparse
+import bisect
 import os
 import sys
+from array import array
 from collections import defaultdict
+from typing import Iterable, Iterator
 
+from genome_cache import (
+    PARTITION_NAMESPACE,
+    fetch_entry,
+    file_sha256,
+    make_key,
+    store_entry,
+)
+from profiling import run_main
+from twobit import Blocks, TwoBitFile, covered_bases, overlapping
 
 # ── Constants (matching constants.py) ──────────────────────────────────────
 LASTZ_OUT_BUCKET_PREFIX: str = "bucket_ref"
@@ -23,21 +57,52 @@ LASTZ_OUT_BULK_PREFIX: str = "bucket_ref_bulk"
 PART_BULK_FILENAME_PREFIX: str = "BULK"
 MAX_CHROM_IN_BULK: int = 100
 CHUNK_SIZE_FRACTION_FOR_LITTLE_CHROMOSOMES: float = 0.75
+CACHED_PARTITIONS: str = "partitions.txt"
+CACHED_REPORT: str = "partition_report.tsv"
+CACHED_BULKS_PREFIX: str = "bulks/"
+BULK_MANIFEST_SUFFIX: str = ".lst"
+MAX_GAP_TOLERANCE: float = 0.5
 
 
 # ── Core logic (inlined from modules/common.py and steps_implementations/partition.py) ─
-def read_chrom_sizes(path: str) -> dict[str, int]:
-    """Read chromosome lengths from a tab-separated chrom.sizes file."""
-    sizes = {}
+def iter_chrom_sizes(path: str) -> Iterator[tuple[str, int]]:
+    """Stream (chrom, size) rows from a tab-separated chrom.sizes file."""
     with open(path) as f:
         for line in f:
             parts = line.rstrip().split("\t")
-            sizes[parts[0]] = int(parts[1])
-    return sizes
+            if parts[0]:
+                yield parts[0], int(parts[1])
+
+
+def read_chrom_sizes(path: str) -> dict[str, int]:
+    """Read chromosome lengths from a tab-separated chrom.sizes file."""
+    return dict(iter_chrom_sizes(path))
+
+
+def iter_partition(
+    chrom_sizes: Iterable[tuple[str, int]],
+    chunk_size: int,
+    overlap: int,
+    little_scaffolds: list[tuple[str, int]],
+) -> Iterator[tuple[str, int, int]]:
+    """Yield overlapping chunks of large chromosomes as they are cut.
+
+    Small scaffolds are appended to little_scaffolds instead.
+    """
+    scaffold_size_threshold = chunk_size * 0.45
+    for chrom, size in chrom_sizes:
+        if size < scaffold_size_threshold:
+            little_scaffolds.append((chrom, size))
+            continue
+        start = 0
+        while start < size:
+            end = min(start + chunk_size, size)
+            yield chrom, start, end
+            start += chunk_size - overlap
 
 
 def create_partition(
-    chrom_sizes: dict[str, int], chunk_size: int, overlap: int
+    chrom_sizes: Iterable[tuple[str, int]], chunk_size: int, overlap: int
 ) -> tuple[list[tuple[str, int, int]], list[tuple[str, int]]]:
     """Split chromosomes into overlapping chunks; collect small scaffolds separately.
 
@@ -47,28 +112,150 @@ def create_partition(
     Sequences below chunk_size * 0.45 are grouped into bulk LASTZ jobs instead of being
     excluded entirely.
     """
-    partition_list = []
-    little_scaffolds = []
+    little_scaffolds: list[tuple[str, int]] = []
+    partition_list = list(
+        iter_partition(chrom_sizes, chunk_size, overlap, little_scaffolds)
+    )
+    return partition_list, little_scaffolds
+
+
+def find_gap_cut(
+    gaps: Blocks, start: int, nominal_end: int, tolerance: int
+) -> tuple[int, int] | None:
+    """Return the largest gap usable as the boundary after start, if any.
+
+    A gap qualifies when it overlaps [nominal_end - tolerance, nominal_end +
+    tolerance] and begins after start; ties go to the gap nearest nominal_end.
+    """
+    best = None
+    best_rank = None
+    first = max(0, bisect.bisect_right(gaps, (nominal_end - tolerance,)) - 1)
+    for gap_start, gap_end in gaps[first:]:
+        if gap_start >= nominal_end + tolerance:
+            break
+        if gap_end <= nominal_end - tolerance or gap_start <= start:
+            continue
+        rank = (gap_end - gap_start, -abs(gap_start - nominal_end))
+        if best_rank is None or rank > best_rank:
+            best, best_rank = (gap_start, gap_end), rank
+    return best
+
+
+def trim_n_flanks(gaps: Blocks, start: int, end: int) -> tuple[int, int]:
+    """Shrink [start, end) past leading and trailing N runs (may become empty)."""
+    clipped = overlapping(gaps, start, end)
+    if clipped and clipped[0][0] == start:
+        start = clipped[0][1]
+    if clipped and clipped[-1][1] == end:
+        end = max(start, clipped[-1][0])
+    return start, end
+
+
+def iter_gap_aware_partition(
+    chrom_sizes: Iterable[tuple[str, int]],
+    chunk_size: int,
+    overlap: int,
+    n_blocks: dict[str, Blocks],
+    gap_tolerance: float,
+    min_gap: int,
+    little_scaffolds: list[tuple[str, int]],
+    stats: dict[str, int],
+) -> Iterator[tuple[str, int, int]]:
+    """Like iter_partition, but cut chromosomes inside assembly gaps.
+
+    Small scaffolds that are not entirely N are appended to little_scaffolds;
+    stats counts the gap cuts made and the windows and scaffolds dropped.
+    """
     scaffold_size_threshold = chunk_size * 0.45
+    tolerance = int(chunk_size * min(gap_tolerance, MAX_GAP_TOLERANCE))
+    for key in ("gap_cuts", "all_n_windows", "all_n_scaffolds"):
+        stats.setdefault(key, 0)
 
-    for chrom, size in chrom_sizes.items():
+    for chrom, size in chrom_sizes:
+        gaps = n_blocks.get(chrom, [])
         if size < scaffold_size_threshold:
-            little_scaffolds.append((chrom, size))
+            if covered_bases(gaps, 0, size) == size:
+                stats["all_n_scaffolds"] += 1
+            else:
+                little_scaffolds.append((chrom, size))
             continue
+        large_gaps = [gap for gap in gaps if gap[1] - gap[0] >= min_gap]
         start = 0
         while start < size:
             end = min(start + chunk_size, size)
-            partition_list.append((chrom, start, end))
-            start += chunk_size - overlap
-    return partition_list, little_scaffolds
+            next_start = start + chunk_size - overlap
+            cut = (
+                find_gap_cut(large_gaps, start, end, tolerance) if end < size else None
+            )
+            if cut is not None:
+                end, next_start = cut
+                stats["gap_cuts"] += 1
+            window_start, window_end = trim_n_flanks(gaps, start, end)
+            if window_start < window_end:
+                yield chrom, window_start, window_end
+            else:
+                stats["all_n_windows"] += 1
+            start = next_start
+
+
+def create_gap_aware_partition(
+    chrom_sizes: Iterable[tuple[str, int]],
+    chunk_size: int,
+    overlap: int,
+    n_blocks: dict[str, Blocks],
+    gap_tolerance: float,
+    min_gap: int,
+) -> tuple[list[tuple[str, int, int]], list[tuple[str, int]], dict[str, int]]:
+    """Like create_partition, but cut chromosomes inside assembly gaps.
+
+    Returns the partitions, the small scaffolds that are not entirely N, and
+    counters of the gap cuts made and the windows and scaffolds dropped.
+    """
+    little_scaffolds: list[tuple[str, int]] = []
+    stats: dict[str, int] = {}
+    partition_list = list(
+        iter_gap_aware_partition(
+            chrom_sizes,
+            chunk_size,
+            overlap,
+            n_blocks,
+            gap_tolerance,
+            min_gap,
+            little_scaffolds,
+            stats,
+        )
+    )
+    return partition_list, little_scaffolds, stats
+
+
+def partition_bases(
+    partition_list: Iterable[tuple[str, int, int]],
+    little_scaffolds: list[tuple[str, int]],
+) -> int:
+    """Return the number of bases handed to LASTZ by a partitioning."""
+    return sum(end - start for _chrom, start, end in partition_list) + sum(
+        size for _chrom, size in little_scaffolds
+    )
+
+
+def write_report(path: str, rows: dict[str, int]) -> None:
+    """Write the gap-aware partitioning report as a two-column TSV."""
+    with open(path, "w") as f:
+        for key, value in rows.items():
+            f.write(f"{key}\t{value}\n")
 
 
 def create_buckets_for_little_scaffolds(
-    little_scaffolds: list[tuple[str, int]], chunk_size: int
+    little_scaffolds: list[tuple[str, int]],
+    chunk_size: int,
+    max_bases: int | None = None,
+    max_chroms: int = MAX_CHROM_IN_BULK,
 ) -> defaultdict[int, list[str]]:
     """Group small scaffolds into bulks to avoid excessive LASTZ jobs."""
     bulk_num_to_chroms = defaultdict(list)
-    bulk_size_threshold = chunk_size * CHUNK_SIZE_FRACTION_FOR_LITTLE_CHROMOSOMES
+    bulk_size_threshold = max_bases or (
+        chunk_size * CHUNK_SIZE_FRACTION_FOR_LITTLE_CHROMOSOMES
+    )
     bulk_number = 1
     current_bulk_size = 0
     chrom_count = 0
@@ -76,7 +263,7 @@ def create_buckets_for_little_scaffolds(
     for chrom, size in little_scaffolds:
         if (
             current_bulk_size + size
-        ) > bulk_size_threshold or chrom_count >= MAX_CHROM_IN_BULK:
+        ) > bulk_size_threshold or chrom_count >= max_chroms:
             bulk_number += 1
             current_bulk_size = 0
             chrom_count = 0
@@ -86,6 +273,59 @@ def create_buckets_for_little_scaffolds(
     return bulk_num_to_chroms
 
 
+def pack_bulks_first_fit_decreasing(
+    little_scaffolds: list[tuple[str, int]], max_bases: int, max_chroms: int
+) -> dict[int, list[str]]:
+    """Bin-pack small scaffolds first-fit decreasing by size.
+
+    A bulk accepts a scaffold while it stays within max_bases and holds fewer
+    than max_chroms scaffolds. The first bulk with room is found through a
+    max segment tree over the remaining capacity of every bulk (-1 once a
+    bulk is full by count), so packing is O(n log n) for millions of
+    scaffolds. A scaffold larger than max_bases gets a bulk of its own.
+    """
+    n_items = len(little_scaffolds)
+    if n_items == 0:
+        return {}
+    leaves = 1
+    while leaves < n_items:
+        leaves *= 2
+    tree = array("q", [max_bases]) * (2 * leaves)
+    counts = array("l", [0]) * leaves
+    members: dict[int, list[str]] = defaultdict(list)
+
+    order = sorted(range(n_items), key=lambda i: -little_scaffolds[i][1])
+    for index in order:
+        chrom, size = little_scaffolds[index]
+        size = min(size, max_bases)
+        node = 1
+        while node < leaves:
+            node = 2 * node if tree[2 * node] >= size else 2 * node + 1
+        leaf = node - leaves
+        members[leaf].append(chrom)
+        counts[leaf] += 1
+        tree[node] = tree[node] - size if counts[leaf] < max_chroms else -1
+        node //= 2
+        while node:
+            tree[node] = max(tree[2 * node], tree[2 * node + 1])
+            node //= 2
+    return {leaf + 1: chroms for leaf, chroms in sorted(members.items())}
+
+
+def write_bulk_manifests(
+    bulk_map: dict[int, list[str]], manifest_dir: str
+) -> dict[int, str]:
+    """Write one member list per bulk; return bulk number -> manifest path."""
+    os.makedirs(manifest_dir, exist_ok=True)
+    paths = {}
+    for bulk_number, chroms in bulk_map.items():
+        name = f"{PART_BULK_FILENAME_PREFIX}_{bulk_number}{BULK_MANIFEST_SUFFIX}"
+        paths[bulk_number] = os.path.join(manifest_dir, name)
+        with open(paths[bulk_number], "w") as f:
+            f.write("\n".join(chroms) + "\n")
+    return paths
+
+
 def parse_args() -> argparse.Namespace:
     """Parse command-line arguments for genome partitioning."""
     app = argparse.ArgumentParser(description=__doc__)
@@ -117,43 +357,229 @@ def parse_args() -> argparse.Namespace:
         required=True,
         help="Output partition file path (one partition string per line)",
     )
+    app.add_argument(
+        "--cache_dir",
+        default=None,
+        help="Optional genome cache directory to read and populate",
+    )
+    app.add_argument(
+        "--twobit",
+        default=None,
+        help="Path to the .2bit file; enables gap-aware partitioning",
+    )
+    app.add_argument(
+        "--gap_tolerance",
+        type=float,
+        default=0.05,
+        help="Max distance a boundary may move into a gap, as a fraction of "
+        "--chunk_size (default: 0.05, capped at 0.5; 0 only trims/drops Ns)",
+    )
+    app.add_argument(
+        "--min_gap",
+        type=int,
+        default=1000,
+        help="Minimum N-run length usable as a chunk boundary (default: 1000)",
+    )
+    app.add_argument(
+        "--bulk_manifest_dir",
+        default=None,
+        help="Pack small scaffolds first-fit decreasing and write BULK member "
+        "lists into this directory; BULK partitions then reference them by ID",
+    )
+    app.add_argument(
+        "--bulk_max_bases",
+        type=int,
+        default=None,
+        help="Maximum bases per bulk (default: 0.75 * --chunk_size)",
+    )
+    app.add_argument(
+        "--bulk_max_chroms",
+        type=int,
+        default=MAX_CHROM_IN_BULK,
+        help=f"Maximum scaffolds per bulk (default: {MAX_CHROM_IN_BULK})",
+    )
+    app.add_argument(
+        "--report",
+        default=None,
+        help="Optional TSV with the windows and bases saved by gap-aware partitioning",
+    )
     if len(sys.argv) < 2:
         app.print_help()
         sys.exit(1)
     return app.parse_args()
 
 
+def get_cache_key(args: argparse.Namespace, gap_digest: str | None) -> str:
+    """Return the cache key for one partitioning of one chrom.sizes file.
+
+    Gap-aware partitionings also depend on the N-block layout of the .2bit
+    file and on the gap options.
+    """
+    options = {
+        "twobit_name": args.twobit_name,
+        "chunk_size": str(args.chunk_size),
+        "overlap": str(args.overlap),
+    }
+    if args.bulk_max_bases or args.bulk_max_chroms != MAX_CHROM_IN_BULK:
+        options["bulk_max_bases"] = str(args.bulk_max_bases)
+        options["bulk_max_chroms"] = str(args.bulk_max_chroms)
+    if args.bulk_manifest_dir:
+        options["bulk_manifests"] = os.path.basename(
+            os.path.normpath(args.bulk_manifest_dir)
+        )
+    if gap_digest:
+        options.update(
+            {
+                "gap_layout": gap_digest,
+                "gap_tolerance": str(args.gap_tolerance),
+                "min_gap": str(args.min_gap),
+            }
+        )
+    return make_key([file_sha256(args.chrom_sizes)], options)
+
+
 def main() -> None:
     """Write regular and bulk LASTZ partition entries."""
     args = parse_args()
-    chrom_sizes = read_chrom_sizes(args.chrom_sizes)
-    twobit_name = args.twobit_name  # e.g. "target.2bit"
+    n_blocks = None
+    gap_digest = None
+    if args.twobit:
+        with TwoBitFile(args.twobit) as twobit:
+            n_blocks = {name: twobit.n_blocks(name) for name in twobit.names}
+            gap_digest = twobit.layout_digest()
 
-    partition_list, little_scaffolds = create_partition(
-        chrom_sizes, args.chunk_size, args.overlap
-    )
-    bulk_map = create_buckets_for_little_scaffolds(little_scaffolds, args.chunk_size)
+    cached_files = {CACHED_PARTITIONS: args.output}
+    if n_blocks is not None and args.report:
+        cached_files[CACHED_REPORT] = args.report
+    if args.bulk_manifest_dir:
+        os.makedirs(args.bulk_manifest_dir, exist_ok=True)
+    cache_key = get_cache_key(args, gap_digest) if args.cache_dir else None
+    destinations = dict(cached_files)
+    if args.bulk_manifest_dir:
+        destinations[CACHED_BULKS_PREFIX] = args.bulk_manifest_dir
+    if cache_key and fetch_entry(
+        args.cache_dir, PARTITION_NAMESPACE, cache_key, destinations
+    ):
+        print(f"Reused cached partitions for {args.chrom_sizes}", file=sys.stderr)
+        return
 
-    n_parts = len(partition_list)
-    n_bulks = len(bulk_map)
-    print(
-        f"Partitioning: {n_parts} regular partitions + {n_bulks} bulk groups",
-        file=sys.stderr,
+    twobit_name = args.twobit_name  # e.g. "target.2bit"
+    bulk_max_bases = args.bulk_max_bases or int(
+        args.chunk_size * CHUNK_SIZE_FRACTION_FOR_LITTLE_CHROMOSOMES
     )
 
+    def make_bulks(scaffolds: list[tuple[str, int]]) -> dict[int, list[str]]:
+        if args.bulk_manifest_dir:
+            return pack_bulks_first_fit_decreasing(
+                scaffolds, bulk_max_bases, args.bulk_max_chroms
+            )
+        return create_buckets_for_little_scaffolds(
+            scaffolds, args.chunk_size, bulk_max_bases, args.bulk_max_chroms
+        )
+
+    little_scaffolds: list[tuple[str, int]] = []
+    if n_blocks is not None:
+        # Baseline of plain partitioning, counted without keeping its chunks.
+        baseline_parts = 0
+        baseline_bases = 0
+        for _chrom, start, end in iter_partition(
+            iter_chrom_sizes(args.chrom_sizes),
+            args.chunk_size,
+            args.overlap,
+            little_scaffolds,
+        ):
+            baseline_parts += 1
+            baseline_bases += end - start
+        baseline_windows = baseline_parts + len(make_bulks(little_scaffolds))
+        baseline_bases += partition_bases([], little_scaffolds)
+        little_scaffolds = []
+        gap_stats: dict[str, int] = {}
+        chunks = iter_gap_aware_partition(
+            iter_chrom_sizes(args.chrom_sizes),
+            args.chunk_size,
+            args.overlap,
+            n_blocks,
+            args.gap_tolerance,
+            args.min_gap,
+            little_scaffolds,
+            gap_stats,
+        )
+    else:
+        chunks = iter_partition(
+            iter_chrom_sizes(args.chrom_sizes),
+            args.chunk_size,
+            args.overlap,
+            little_scaffolds,
+        )
+
     with open(args.output, "w") as out:
-        for chrom, start, end in partition_list:
+        n_parts = 0
+        chunk_bases = 0
+        for chrom, start, end in chunks:
             out.write(f"{twobit_name}:{chrom}:{start}-{end}\n")
+            n_parts += 1
+            chunk_bases += end - start
+
+        bulk_map = make_bulks(little_scaffolds)
+        manifests = {}
+        if args.bulk_manifest_dir:
+            manifests = write_bulk_manifests(bulk_map, args.bulk_manifest_dir)
+            manifest_dir_name = os.path.basename(
+                os.path.normpath(args.bulk_manifest_dir)
+            )
+            for path in manifests.values():
+                rel_path = f"{CACHED_BULKS_PREFIX}{os.path.basename(path)}"
+                cached_files[rel_path] = path
         for bulk_number, chroms in sorted(bulk_map.items()):
-            chroms_ids = ":".join(chroms)
+            if manifests:
+                manifest = os.path.basename(manifests[bulk_number])
+                chroms_ids = f"@{manifest_dir_name}/{manifest}"
+            else:
+                chroms_ids = ":".join(chroms)
             out.write(
                 f"{PART_BULK_FILENAME_PREFIX}_{bulk_number}:{twobit_name}:{chroms_ids}\n"
             )
 
+    n_bulks = len(bulk_map)
+    print(
+        f"Partitioning: {n_parts} regular partitions + {n_bulks} bulk groups",
+        file=sys.stderr,
+    )
+    if n_blocks is not None:
+        windows = n_parts + n_bulks
+        bases = partition_bases([], little_scaffolds) + chunk_bases
+        report = {
+            "windows_baseline": baseline_windows,
+            "windows": windows,
+            "windows_saved": baseline_windows - windows,
+            "bases_baseline": baseline_bases,
+            "bases": bases,
+            "bases_saved": baseline_bases - bases,
+            **gap_stats,
+        }
+        print(
+            f"Gap-aware partitioning: {report['gap_cuts']} cuts moved into gaps, "
+            f"{report['all_n_windows']} all-N windows and "
+            f"{report['all_n_scaffolds']} all-N scaffolds dropped; "
+            f"{baseline_windows - windows} windows and "
+            f"{baseline_bases - bases} bases saved",
+            file=sys.stderr,
+        )
+        if args.report:
+            write_report(args.report, report)
+
     print(
         f"Wrote {n_parts + n_bulks} partition entries to {args.output}", file=sys.stderr
     )
+    if cache_key:
+        store_entry(
+            args.cache_dir,
+            PARTITION_NAMESPACE,
+            cache_key,
+            cached_files,
+            {"twobit_name": twobit_name},
+        )
 
 
 if __name__ == "__main__":
-    main()
+    run_main(main)
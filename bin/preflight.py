@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""Pre-flight checks of the input genomes before any LASTZ task is submitted.
+
+`scan` reads only the sequence index, N-block and soft-mask tables of a .2bit
+file (no sequence is decoded) and reports:
+
+  masked fraction   soft-masked share of the non-N bases; poorly masked
+                    genomes make LASTZ runtimes explode
+  N content         share of N bases
+  hardmasking       interior N runs per Mb of sequence: assembly gaps are
+                    rare, hardmasked repeats leave thousands per Mb
+  scaffold names    whitespace or ':' (break partition strings) and dots
+                    (discouraged, see the README)
+
+`estimate` partitions a genome pair as PARTITION does and sums the LASTZ
+runtime predicted by the resource model (resource_advisor.py) over every
+reference x query task, giving the expected LASTZ CPU-hours.
+
+Findings are written one per line as "<level>\\t<message>" next to a
+key/value report. With --mode abort, any error-level finding (suspected
+hardmasking, masking below --min_masked, unusable names, more CPU-hours than
+--max_cpu_hours) exits non-zero; with --mode warn they are only reported.
+
+Usage:
+    preflight.py scan --twobit hg38.2bit --name hg38 --mode warn
+    preflight.py estimate --reference_chrom_sizes hg38.chrom.sizes \\
+        --query_chrom_sizes mm39.chrom.sizes --seq1_chunk 175000000 \\
+        --seq1_lap 0 --seq2_chunk 50000000 --seq2_lap 10000 --name hg38.mm39
+"""
+
+import argparse
+import bisect
+import re
+import sys
+from dataclasses import dataclass, field
+from itertools import accumulate
+from typing import Sequence
+
+from partition import (
+    create_buckets_for_little_scaffolds,
+    create_partition,
+    iter_chrom_sizes,
+)
+from profiling import run_main
+from resource_advisor import load_model
+from twobit import TwoBitFile
+
+MODES: tuple[str, ...] = ("warn", "abort")
+DEFAULT_MIN_MASKED: float = 0.1
+DEFAULT_MAX_N_RUNS_PER_MB: float = 20.0
+HIGH_N_FRACTION: float = 0.5
+NAME_EXAMPLES: int = 5
+# Name problems: (label, pattern, error level)
+NAME_CHECKS: tuple[tuple[str, re.Pattern, str], ...] = (
+    ("whitespace", re.compile(r"\s"), "error"),
+    ("':'", re.compile(r":"), "error"),
+    ("dots", re.compile(r"\."), "warning"),
+)
+
+Finding = tuple[str, str]
+
+
+@dataclass
+class GenomeScan:
+    """Masking, N content and naming summary of one genome."""
+
+    sequences: int = 0
+    bases: int = 0
+    n_bases: int = 0
+    masked_bases: int = 0
+    interior_n_runs: int = 0
+    bad_names: dict[str, list[str]] = field(default_factory=dict)
+    bad_name_counts: dict[str, int] = field(default_factory=dict)
+
+    @property
+    def acgt_bases(self) -> int:
+        return self.bases - self.n_bases
+
+    @property
+    def masked_fraction(self) -> float:
+        return self.masked_bases / self.acgt_bases if self.acgt_bases else 0.0
+
+    @property
+    def n_fraction(self) -> float:
+        return self.n_bases / self.bases if self.bases else 0.0
+
+    @property
+    def n_runs_per_mb(self) -> float:
+        return (
+            self.interior_n_runs / (self.acgt_bases / 1e6) if self.acgt_bases else 0.0
+        )
+
+
+def masked_n_overlap(n_starts, n_sizes, mask_starts, mask_sizes) -> int:
+    """Return the bases inside both the N and the mask blocks of a sequence."""
+    overlap = 0
+    for n_start, n_size in zip(n_starts, n_sizes):
+        n_end = n_start + n_size
+        index = max(0, bisect.bisect_right(mask_starts, n_start) - 1)
+        while index < len(mask_starts) and mask_starts[index] < n_end:
+            mask_end = mask_starts[index] + mask_sizes[index]
+            overlap += max(0, min(mask_end, n_end) - max(mask_starts[index], n_start))
+            index += 1
+    return overlap
+
+
+def check_name(scan: GenomeScan, name: str) -> None:
+    """Record the naming problems of one sequence."""
+    for label, pattern, _level in NAME_CHECKS:
+        if pattern.search(name):
+            scan.bad_name_counts[label] = scan.bad_name_counts.get(label, 0) + 1
+            examples = scan.bad_names.setdefault(label, [])
+            if len(examples) < NAME_EXAMPLES:
+                examples.append(name)
+
+
+def scan_genome(path: str) -> GenomeScan:
+    """Summarize the block tables and names of every sequence of a .2bit file."""
+    scan = GenomeScan()
+    with TwoBitFile(path) as twobit:
+        for name in twobit.names:
+            size, n_starts, n_sizes, mask_starts, mask_sizes = twobit.block_tables(name)
+            n_bases = sum(n_sizes)
+            scan.sequences += 1
+            scan.bases += size
+            scan.n_bases += n_bases
+            scan.masked_bases += sum(mask_sizes)
+            if n_bases and mask_starts:
+                scan.masked_bases -= masked_n_overlap(
+                    n_starts, n_sizes, mask_starts, mask_sizes
+                )
+            scan.interior_n_runs += len(n_starts)
+            if n_starts and n_starts[0] == 0:
+                scan.interior_n_runs -= 1
+            if n_starts and n_starts[-1] + n_sizes[-1] == size and size:
+                scan.interior_n_runs -= 1
+            check_name(scan, name)
+    scan.interior_n_runs = max(0, scan.interior_n_runs)
+    return scan
+
+
+def scan_findings(
+    scan: GenomeScan, min_masked: float, max_n_runs_per_mb: float
+) -> list[Finding]:
+    """Return the (level, message) findings of a genome scan."""
+    findings = []
+    if scan.n_runs_per_mb > max_n_runs_per_mb:
+        findings.append(
+            (
+                "error",
+                f"suspected hardmasking: {scan.interior_n_runs} interior N runs "
+                f"({scan.n_runs_per_mb:.1f} per Mb, limit {max_n_runs_per_mb:g}); "
+                "softmask repeats instead of replacing them with N",
+            )
+        )
+    if scan.masked_fraction < min_masked:
+        findings.append(
+            (
+                "error",
+                f"only {scan.masked_fraction:.1%} of the bases are soft-masked "
+                f"(minimum {min_masked:.0%}); poorly masked genomes cause runaway "
+                "LASTZ runtimes",
+            )
+        )
+    if scan.n_fraction > HIGH_N_FRACTION:
+        findings.append(("warning", f"{scan.n_fraction:.1%} of the bases are N"))
+    for label, _pattern, level in NAME_CHECKS:
+        count = scan.bad_name_counts.get(label, 0)
+        if count:
+            examples = ", ".join(repr(name) for name in scan.bad_names[label])
+            findings.append(
+                (level, f"{count} sequence name(s) contain {label}, e.g. {examples}")
+            )
+    return findings
+
+
+def task_bases(chrom_sizes_path: str, chunk_size: int, overlap: int) -> list[int]:
+    """Return the bases of every LASTZ partition of a genome (plain partitioning)."""
+    partitions, little_scaffolds = create_partition(
+        iter_chrom_sizes(chrom_sizes_path), chunk_size, overlap
+    )
+    little_sizes = dict(little_scaffolds)
+    bulks = create_buckets_for_little_scaffolds(little_scaffolds, chunk_size)
+    return [end - start for _chrom, start, end in partitions] + [
+        sum(little_sizes[chrom] for chrom in members) for members in bulks.values()
+    ]
+
+
+def lastz_seconds(
+    term: dict[str, object], reference: list[int], query: list[int]
+) -> float:
+    """Sum the predicted runtime of every reference x query LASTZ task.
+
+    The model is linear in the base product (Gbp x Gbp) and clamped to
+    [min, max], so for each reference partition the sorted query sizes split
+    into a clamped-low, a linear and a clamped-high range whose sums come from
+    prefix sums: O(R log Q) instead of O(R x Q).
+    """
+    intercept = float(term["intercept"])
+    slope = float(term["slope"]) / 1e18
+    low = float(term.get("min") or 0)
+    high = float(term["max"]) if term.get("max") is not None else float("inf")
+    query = sorted(query)
+    prefix = [0, *accumulate(query)]
+    total = 0.0
+    for bases in reference:
+        scale = slope * bases
+        if scale <= 0:
+            total += len(query) * min(max(intercept, low), high)
+            continue
+        first = bisect.bisect_left(query, (low - intercept) / scale)
+        last = max(first, bisect.bisect_right(query, (high - intercept) / scale))
+        total += first * low
+        if last < len(query):
+            total += (len(query) - last) * high
+        total += (last - first) * intercept + scale * (prefix[last] - prefix[first])
+    return total
+
+
+def write_report(path: str, rows: dict[str, object]) -> None:
+    """Write a two-column key/value TSV."""
+    with open(path, "w") as report:
+        for key, value in rows.items():
+            report.write(f"{key}\t{value}\n")
+
+
+def finish(name: str, findings: list[Finding], mode: str, issues_path: str) -> int:
+    """Write and print the findings; return 1 when abort mode meets an error."""
+    with open(issues_path, "w") as issues:
+        for level, message in findings:
+            issues.write(f"{level}\t{message}\n")
+            print(f"{name}: {level}: {message}", file=sys.stderr)
+    errors = [message for level, message in findings if level == "error"]
+    if errors and mode == "abort":
+        print(
+            f"{name}: pre-flight check failed ({len(errors)} error(s)); "
+            "rerun with --preflight warn to continue anyway",
+            file=sys.stderr,
+        )
+        return 1
+    return 0
+
+
+def cmd_scan(args: argparse.Namespace) -> int:
+    """Scan one genome and report masking, N content and names."""
+    scan = scan_genome(args.twobit)
+    write_report(
+        f"{args.name}.preflight.tsv",
+        {
+            "genome": args.name,
+            "sequences": scan.sequences,
+            "bases": scan.bases,
+            "n_bases": scan.n_bases,
+            "n_fraction": f"{scan.n_fraction:.4f}",
+            "masked_bases": scan.masked_bases,
+            "masked_fraction": f"{scan.masked_fraction:.4f}",
+            "interior_n_runs": scan.interior_n_runs,
+            "n_runs_per_mb": f"{scan.n_runs_per_mb:.2f}",
+        },
+    )
+    findings = scan_findings(scan, args.min_masked, args.max_n_runs_per_mb)
+    return finish(args.name, findings, args.mode, f"{args.name}.preflight_issues.txt")
+
+
+def cmd_estimate(args: argparse.Namespace) -> int:
+    """Estimate the LASTZ tasks and CPU-hours of one genome pair."""
+    reference = task_bases(args.reference_chrom_sizes, args.seq1_chunk, args.seq1_lap)
+    query = task_bases(args.query_chrom_sizes, args.seq2_chunk, args.seq2_lap)
+    term = load_model(args.resource_model)["LASTZ"]["time"]
+    cpu_hours = lastz_seconds(term, reference, query) / 3600
+    write_report(
+        f"{args.name}.preflight.tsv",
+        {
+            "pair": args.name,
+            "reference_partitions": len(reference),
+            "query_partitions": len(query),
+            "lastz_tasks": len(reference) * len(query),
+            "lastz_cpu_hours": f"{cpu_hours:.1f}",
+        },
+    )
+    print(
+        f"{args.name}: {len(reference) * len(query)} LASTZ tasks, "
+        f"~{cpu_hours:.0f} CPU-hours",
+        file=sys.stderr,
+    )
+    findings = []
+    if args.max_cpu_hours is not None and cpu_hours > args.max_cpu_hours:
+        findings.append(
+            (
+                "error",
+                f"LASTZ is expected to take {cpu_hours:.0f} CPU-hours "
+                f"(limit {args.max_cpu_hours:g})",
+            )
+        )
+    return finish(args.name, findings, args.mode, f"{args.name}.preflight_issues.txt")
+
+
+def parse_args(argv: Sequence[str] | None = None) -> argparse.Namespace:
+    """Parse the pre-flight sub-command line."""
+    app = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    commands = app.add_subparsers(dest="command", required=True)
+
+    scan = commands.add_parser("scan", help="Scan the masking of one genome")
+    scan.add_argument("--twobit", required=True, help="Genome .2bit (v0 or v1)")
+    scan.add_argument("--name", required=True, help="Genome name for output files")
+    scan.add_argument("--mode", choices=MODES, default="warn")
+    scan.add_argument(
+        "--min_masked",
+        type=float,
+        default=DEFAULT_MIN_MASKED,
+        help="Minimum soft-masked fraction of the non-N bases",
+    )
+    scan.add_argument(
+        "--max_n_runs_per_mb",
+        type=float,
+        default=DEFAULT_MAX_N_RUNS_PER_MB,
+        help="Interior N runs per Mb above which hardmasking is suspected",
+    )
+    scan.set_defaults(func=cmd_scan)
+
+    estimate = commands.add_parser("estimate", help="LASTZ CPU-hours of one pair")
+    estimate.add_argument("--reference_chrom_sizes", required=True)
+    estimate.add_argument("--query_chrom_sizes", required=True)
+    estimate.add_argument("--seq1_chunk", type=int, required=True)
+    estimate.add_argument("--seq1_lap", type=int, required=True)
+    estimate.add_argument("--seq2_chunk", type=int, required=True)
+    estimate.add_argument("--seq2_lap", type=int, required=True)
+    estimate.add_argument("--name", required=True, help="Pair id for output files")
+    estimate.add_argument(
+        "--resource_model", default=None, help="Model JSON (default: built-in)"
+    )
+    estimate.add_argument(
+        "--max_cpu_hours", type=float, default=None, help="CPU-hour limit"
+    )
+    estimate.add_argument("--mode", choices=MODES, default="warn")
+    estimate.set_defaults(func=cmd_estimate)
+
+    if argv is None and len(sys.argv) < 2:
+        app.print_help()
+        sys.exit(1)
+    return app.parse_args(argv)
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    """Dispatch one pre-flight sub-command."""
+    args = parse_args(argv)
+    sys.exit(args.func(args))
+
+
+if __name__ == "__main__":
+    run_main(main)
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""Opt-in profiling for the pipeline's Python scripts.
+
+Every script runs its main() through run_main(), which is a plain call unless
+MLC_PROFILE is set in the environment:
+
+    MLC_PROFILE=cpu,mem,spans   any of cpu (cProfile), mem (tracemalloc),
+                                spans (timed subprocess calls); "all" or "1"
+                                enables everything
+    MLC_PROFILE_DIR=DIR         output directory (default: the working
+                                directory, i.e. the Nextflow task directory)
+    MLC_PROFILE_TOP=N           allocation sites kept per memory snapshot (25)
+
+Each profiled process writes <script>.<pid>.prof (pstats), <script>.<pid>.mem.tsv
+(peak traced memory and the top allocation sites of the snapshot taken at the
+highest observed usage) and <script>.<pid>.spans.tsv (one row per span).
+Child scripts inherit the environment, so a LASTZ task yields profiles of
+the intermediate layer and of every run_lastz.py call.
+
+Usage:
+    profiling.py report --work_dir work [--top 40] [--output hotspots.txt]
+"""
+
+import argparse
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Callable, Iterator, Sequence, TextIO
+
+PROFILE_ENV: str = "MLC_PROFILE"
+PROFILE_DIR_ENV: str = "MLC_PROFILE_DIR"
+PROFILE_TOP_ENV: str = "MLC_PROFILE_TOP"
+MODES: tuple[str, ...] = ("cpu", "mem", "spans")
+PROF_SUFFIX: str = ".prof"
+MEM_SUFFIX: str = ".mem.tsv"
+SPANS_SUFFIX: str = ".spans.tsv"
+DEFAULT_TOP: int = 25
+
+
+def enabled_modes() -> set[str]:
+    """Return the profiling modes requested through MLC_PROFILE."""
+    value = os.environ.get(PROFILE_ENV, "").strip().lower()
+    if value in ("", "0", "false", "no"):
+        return set()
+    if value in ("1", "all", "true", "yes"):
+        return set(MODES)
+    return {mode.strip() for mode in value.split(",") if mode.strip() in MODES}
+
+
+class Profiler:
+    """Collects the profiles of one process and writes them on finish."""
+
+    def __init__(self, script: str, modes: set[str]) -> None:
+        self.modes = modes
+        out_dir = os.environ.get(PROFILE_DIR_ENV) or "."
+        os.makedirs(out_dir, exist_ok=True)
+        self.prefix = os.path.join(out_dir, f"{script}.{os.getpid()}")
+        self.top = int(os.environ.get(PROFILE_TOP_ENV, DEFAULT_TOP))
+        self.spans: list[tuple[str, float, float, str]] = []
+        self._lock = threading.Lock()
+        self._cpu = cProfile.Profile() if "cpu" in modes else None
+        self._peak_snapshot: tracemalloc.Snapshot | None = None
+        self._peak_current = 0
+        if "mem" in modes:
+            tracemalloc.start()
+        if self._cpu is not None:
+            self._cpu.enable()
+
+    def sample_memory(self) -> None:
+        """Keep a snapshot if traced memory is the highest seen so far."""
+        if "mem" not in self.modes:
+            return
+        current, _peak = tracemalloc.get_traced_memory()
+        with self._lock:
+            if current > self._peak_current:
+                self._peak_current = current
+                self._peak_snapshot = tracemalloc.take_snapshot()
+
+    def add_span(self, name: str, started: float, seconds: float, detail: str) -> None:
+        """Record one timed span."""
+        with self._lock:
+            self.spans.append((name, started, seconds, detail))
+
+    def finish(self) -> None:
+        """Stop collection and write every enabled profile."""
+        if self._cpu is not None:
+            self._cpu.disable()
+            self._cpu.dump_stats(f"{self.prefix}{PROF_SUFFIX}")
+        if "mem" in self.modes:
+            self.sample_memory()
+            _current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            with open(f"{self.prefix}{MEM_SUFFIX}", "w") as mem_file:
+                mem_file.write(f"#peak_traced_bytes\t{peak}\n")
+                mem_file.write(f"#snapshot_traced_bytes\t{self._peak_current}\n")
+                if self._peak_snapshot is not None:
+                    stats = self._peak_snapshot.statistics("lineno")
+                    for stat in stats[: self.top]:
+                        frame = stat.traceback[0]
+                        mem_file.write(
+                            f"{frame.filename}:{frame.lineno}\t{stat.size}\t{stat.count}\n"
+                        )
+        if "spans" in self.modes:
+            with open(f"{self.prefix}{SPANS_SUFFIX}", "w") as spans_file:
+                for name, started, seconds, detail in self.spans:
+                    spans_file.write(
+                        f"{name}\t{started:.3f}\t{seconds:.6f}\t{detail}\n"
+                    )
+
+
+PROFILER: Profiler | None = None
+
+
+def run_main(main: Callable[[], None]) -> None:
+    """Call a script's main(), profiled when MLC_PROFILE asks for it."""
+    global PROFILER
+    modes = enabled_modes()
+    if not modes:
+        main()
+        return
+    script = os.path.splitext(os.path.basename(sys.argv[0]))[0] or "python"
+    PROFILER = Profiler(script, modes)
+    try:
+        main()
+    finally:
+        PROFILER.finish()
+        PROFILER = None
+
+
+@contextmanager
+def span(name: str, detail: str = "") -> Iterator[None]:
+    """Time a block, typically one subprocess call, when spans are profiled."""
+    profiler = PROFILER
+    if profiler is None or "spans" not in profiler.modes:
+        yield
+        return
+    started = time.time()
+    clock = time.perf_counter()
+    try:
+        yield
+    finally:
+        profiler.add_span(name, started, time.perf_counter() - clock, detail)
+        profiler.sample_memory()
+
+
+def find_profiles(work_dir: str, suffix: str) -> list[str]:
+    """Return every profile file with the given suffix below work_dir."""
+    paths = []
+    for root, _dirs, names in os.walk(work_dir):
+        paths.extend(
+            os.path.join(root, name) for name in names if name.endswith(suffix)
+        )
+    return sorted(paths)
+
+
+def script_of(path: str, suffix: str) -> str:
+    """Return the script name encoded in a profile file name."""
+    return os.path.basename(path)[: -len(suffix)].rsplit(".", 1)[0]
+
+
+def report_cpu(paths: list[str], top: int, out: TextIO) -> None:
+    """Write the merged cProfile hot spots of every script."""
+    by_script: dict[str, list[str]] = defaultdict(list)
+    for path in paths:
+        by_script[script_of(path, PROF_SUFFIX)].append(path)
+    for script, script_paths in sorted(by_script.items()):
+        buffer = io.StringIO()
+        stats = pstats.Stats(script_paths[0], stream=buffer)
+        for path in script_paths[1:]:
+            stats.add(path)
+        stats.sort_stats("tottime").print_stats(top)
+        out.write(f"## CPU: {script} ({len(script_paths)} processes)\n")
+        out.write(buffer.getvalue().split("\n\n", 1)[-1].strip("\n") + "\n\n")
+
+
+def report_spans(paths: list[str], out: TextIO) -> None:
+    """Write count, total, mean and max seconds of every span name."""
+    totals: dict[str, list[float]] = defaultdict(list)
+    for path in paths:
+        with open(path) as spans_file:
+            for line in spans_file:
+                fields = line.rstrip("\n").split("\t")
+                if len(fields) >= 3:
+                    totals[fields[0]].append(float(fields[2]))
+    out.write("## Spans\nname\tcount\ttotal_s\tmean_s\tmax_s\n")
+    for name, seconds in sorted(totals.items(), key=lambda item: -sum(item[1])):
+        total = sum(seconds)
+        out.write(
+            f"{name}\t{len(seconds)}\t{total:.1f}\t"
+            f"{total / len(seconds):.3f}\t{max(seconds):.3f}\n"
+        )
+    out.write("\n")
+
+
+def report_memory(paths: list[str], top: int, out: TextIO) -> None:
+    """Write the peak traced memory per script and its largest allocation sites."""
+    peaks: dict[str, tuple[int, str]] = {}
+    sites: dict[str, dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    for path in paths:
+        script = script_of(path, MEM_SUFFIX)
+        with open(path) as mem_file:
+            for line in mem_file:
+                fields = line.rstrip("\n").split("\t")
+                if fields[0] == "#peak_traced_bytes":
+                    if int(fields[1]) > peaks.get(script, (-1, ""))[0]:
+                        peaks[script] = (int(fields[1]), os.path.dirname(path))
+                elif not fields[0].startswith("#") and len(fields) >= 2:
+                    site = sites[script]
+                    site[fields[0]] = max(site[fields[0]], int(fields[1]))
+    out.write("## Memory\n")
+    for script, (peak, where) in sorted(peaks.items(), key=lambda item: -item[1][0]):
+        out.write(f"{script}\tpeak {peak / (1 << 20):.1f} MiB\t{where}\n")
+        ranked = sorted(sites[script].items(), key=lambda item: -item[1])
+        for site, size in ranked[:top]:
+            out.write(f"    {size / (1 << 20):9.1f} MiB  {site}\n")
+    out.write("\n")
+
+
+def parse_args(argv: Sequence[str] | None = None) -> argparse.Namespace:
+    """Parse the report command line."""
+    app = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    commands = app.add_subparsers(dest="command", required=True)
+    report = commands.add_parser("report", help="Merge profiles into one report")
+    report.add_argument(
+        "--work_dir", required=True, help="Nextflow work dir (searched recursively)"
+    )
+    report.add_argument("--top", type=int, default=40, help="Entries per section")
+    report.add_argument("--output", default=None, help="Report file (default stdout)")
+    if argv is None and len(sys.argv) < 2:
+        app.print_help()
+        sys.exit(1)
+    return app.parse_args(argv)
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    """Merge the profiles found under a work dir into one hot-spot report."""
+    args = parse_args(argv)
+    out = open(args.output, "w") if args.output else sys.stdout
+    try:
+        cpu_paths = find_profiles(args.work_dir, PROF_SUFFIX)
+        span_paths = find_profiles(args.work_dir, SPANS_SUFFIX)
+        mem_paths = find_profiles(args.work_dir, MEM_SUFFIX)
+        if not (cpu_paths or span_paths or mem_paths):
+            sys.exit(f"No profiles found below {args.work_dir}; was MLC_PROFILE set?")
+        if cpu_paths:
+            report_cpu(cpu_paths, args.top, out)
+        if span_paths:
+            report_spans(span_paths, out)
+        if mem_paths:
+            report_memory(mem_paths, args.top, out)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -14,6 +14,7 @@ import argparse
 import os
 import sys
 
+from profiling import run_main
 
 MAX_BASES_DEFAULT: int = 1_000_000
 
@@ -142,4 +143,4 @@ def main() -> None:
 
 
 if __name__ == "__main__":
-    main()
+    run_main(main)
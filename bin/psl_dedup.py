@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""Remove PSL alignments duplicated by overlapping query chunks.
+
+partition.py cuts each query chromosome into chunks that overlap by seq2_lap
+bases, so an alignment that falls into an overlap is found by both neighbouring
+LASTZ pairs. The second copy is either identical or a truncated (contained)
+version of the first. This script streams a PSL file sorted by target name and
+target start, and for records whose query span touches a chunk overlap keeps
+exactly one of every group of duplicate or contained alignments.
+
+Record B is contained in record A when both share target, query and strand and
+every aligned base pair of B is also aligned, on the same diagonal, in A.
+Records outside overlap regions are passed through unchanged, in input order.
+
+Usage:
+    psl_dedup.py --psl bucket.merged.psl --query_partitions query_partitions.txt
+                 --output bucket.dedup.psl [--report bucket.dedup_report.tsv]
+"""
+
+import argparse
+import bisect
+import sys
+from collections import defaultdict, deque
+from typing import Iterator, TextIO
+
+from profiling import run_main
+
+PSL_FIELDS: int = 21
+REPORT_COLUMNS: tuple[str, ...] = (
+    "name",
+    "records_in",
+    "candidates",
+    "removed_duplicate",
+    "removed_contained",
+    "records_out",
+)
+
+
+class PslRecord:
+    """One PSL line together with the fields needed for duplicate detection."""
+
+    __slots__ = (
+        "line",
+        "q_name",
+        "t_name",
+        "strand",
+        "t_start",
+        "t_end",
+        "q_start",
+        "q_end",
+        "blocks",
+        "candidate",
+        "alive",
+        "_diagonals",
+    )
+
+    def __init__(self, line: str, fields: list[str]) -> None:
+        self.line = line
+        self.strand = fields[8]
+        self.q_name = fields[9]
+        self.q_start = int(fields[11])
+        self.q_end = int(fields[12])
+        self.t_name = fields[13]
+        self.t_start = int(fields[15])
+        self.t_end = int(fields[16])
+        sizes = [int(x) for x in fields[18].rstrip(",").split(",") if x]
+        q_starts = [int(x) for x in fields[19].rstrip(",").split(",") if x]
+        t_starts = [int(x) for x in fields[20].rstrip(",").split(",") if x]
+        self.blocks = list(zip(t_starts, q_starts, sizes))
+        self.candidate = False
+        self.alive = True
+        self._diagonals: dict[int, list[tuple[int, int]]] | None = None
+
+    def diagonals(self) -> dict[int, list[tuple[int, int]]]:
+        """Return target intervals per diagonal (tStart - qStart), sorted."""
+        if self._diagonals is None:
+            diagonals: dict[int, list[tuple[int, int]]] = defaultdict(list)
+            for t_start, q_start, size in self.blocks:
+                diagonals[t_start - q_start].append((t_start, t_start + size))
+            for intervals in diagonals.values():
+                intervals.sort()
+            self._diagonals = dict(diagonals)
+        return self._diagonals
+
+
+def read_overlap_regions(path: str) -> dict[str, list[tuple[int, int]]]:
+    """Derive per-chromosome query overlap regions from a partition file.
+
+    BULK lines hold whole small scaffolds and never overlap; they are ignored.
+    """
+    chunks: dict[str, list[tuple[int, int]]] = defaultdict(list)
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("BULK"):
+                continue
+            _twobit, chrom, interval = line.split(":")
+            start, end = interval.split("-")
+            chunks[chrom].append((int(start), int(end)))
+
+    regions: dict[str, list[tuple[int, int]]] = {}
+    for chrom, intervals in chunks.items():
+        intervals.sort()
+        overlaps = [
+            (nxt[0], prev[1])
+            for prev, nxt in zip(intervals, intervals[1:])
+            if nxt[0] < prev[1]
+        ]
+        if overlaps:
+            regions[chrom] = overlaps
+    return regions
+
+
+def touches_overlap(
+    regions: dict[str, list[tuple[int, int]]], chrom: str, start: int, end: int
+) -> bool:
+    """Return True if [start, end) intersects an overlap region of chrom."""
+    intervals = regions.get(chrom)
+    if not intervals:
+        return False
+    idx = bisect.bisect_left(intervals, (end,))
+    return idx > 0 and intervals[idx - 1][1] > start
+
+
+def is_contained(inner: PslRecord, outer: PslRecord) -> bool:
+    """Return True if every aligned base pair of inner is aligned in outer."""
+    if (
+        inner.t_start < outer.t_start
+        or inner.t_end > outer.t_end
+        or inner.q_start < outer.q_start
+        or inner.q_end > outer.q_end
+    ):
+        return False
+    outer_diagonals = outer.diagonals()
+    for diagonal, intervals in inner.diagonals().items():
+        covering = outer_diagonals.get(diagonal)
+        if covering is None:
+            return False
+        for start, end in intervals:
+            idx = bisect.bisect_right(covering, (start, sys.maxsize)) - 1
+            while start < end:
+                if idx < 0 or idx >= len(covering) or covering[idx][0] > start:
+                    return False
+                if covering[idx][1] <= start:
+                    idx += 1
+                    continue
+                start = covering[idx][1]
+                idx += 1
+    return True
+
+
+def iter_records(handle: TextIO) -> Iterator[PslRecord]:
+    """Yield PSL records, skipping headers and blank lines."""
+    for line in handle:
+        fields = line.rstrip("\n").split("\t")
+        if len(fields) < PSL_FIELDS or not fields[0].isdigit():
+            continue
+        yield PslRecord(line if line.endswith("\n") else line + "\n", fields)
+
+
+def dedup_stream(
+    handle: TextIO,
+    out: TextIO,
+    regions: dict[str, list[tuple[int, int]]],
+    counts: dict[str, int],
+) -> None:
+    """Stream records from handle to out, dropping duplicated overlap records.
+
+    Records are held in a FIFO until no later record can overlap them on the
+    target, which keeps memory bounded by the longest alignment and preserves
+    the input order of everything that is kept.
+    """
+    pending: deque[PslRecord] = deque()
+    active: dict[tuple[str, str], list[PslRecord]] = defaultdict(list)
+    cur_target = None
+    cur_start = -1
+
+    def flush(position: int | None) -> None:
+        while pending and (
+            position is None or not pending[0].candidate or pending[0].t_end <= position
+        ):
+            record = pending.popleft()
+            if record.alive:
+                out.write(record.line)
+                counts["records_out"] += 1
+
+    for record in iter_records(handle):
+        counts["records_in"] += 1
+        if record.t_name != cur_target:
+            flush(None)
+            active.clear()
+            cur_target = record.t_name
+            cur_start = -1
+        if record.t_start < cur_start:
+            raise ValueError(
+                f"PSL input is not sorted by target start on {cur_target} "
+                f"({record.t_start} after {cur_start})"
+            )
+        cur_start = record.t_start
+
+        record.candidate = touches_overlap(
+            regions, record.q_name, record.q_start, record.q_end
+        )
+        if record.candidate:
+            counts["candidates"] += 1
+            key = (record.q_name, record.strand)
+            live = [r for r in active[key] if r.alive and r.t_end > record.t_start]
+            for other in live:
+                if is_contained(record, other):
+                    record.alive = False
+                    same = is_contained(other, record)
+                    counts["removed_duplicate" if same else "removed_contained"] += 1
+                    break
+                if is_contained(other, record):
+                    other.alive = False
+                    counts["removed_contained"] += 1
+            active[key] = [r for r in live if r.alive]
+            if record.alive:
+                active[key].append(record)
+
+        pending.append(record)
+        flush(record.t_start)
+
+    flush(None)
+
+
+def write_report(path: str, name: str, counts: dict[str, int]) -> None:
+    """Write a one-row TSV report of the dedup counts."""
+    with open(path, "w") as f:
+        f.write("\t".join(REPORT_COLUMNS) + "\n")
+        row = [name] + [str(counts[col]) for col in REPORT_COLUMNS[1:]]
+        f.write("\t".join(row) + "\n")
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command-line arguments for overlap deduplication."""
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument(
+        "--psl",
+        required=True,
+        help="PSL file sorted by target name and start ('-' for stdin)",
+    )
+    ap.add_argument(
+        "--query_partitions",
+        required=True,
+        help="Query partition file written by partition.py",
+    )
+    ap.add_argument("--output", required=True, help="Deduplicated PSL output")
+    ap.add_argument("--report", default=None, help="Optional TSV report path")
+    ap.add_argument(
+        "--name", default=None, help="Row label in the report (default: --psl)"
+    )
+    if len(sys.argv) < 2:
+        ap.print_help()
+        sys.exit(1)
+    return ap.parse_args()
+
+
+def main() -> None:
+    """Deduplicate one PSL file against the query partition layout."""
+    args = parse_args()
+    regions = read_overlap_regions(args.query_partitions)
+    n_regions = sum(len(v) for v in regions.values())
+    print(f"Loaded {n_regions} query overlap regions", file=sys.stderr)
+
+    counts = {col: 0 for col in REPORT_COLUMNS[1:]}
+    infile = sys.stdin if args.psl == "-" else open(args.psl)
+    try:
+        with open(args.output, "w") as out:
+            dedup_stream(infile, out, regions, counts)
+    finally:
+        if infile is not sys.stdin:
+            infile.close()
+
+    removed = counts["removed_duplicate"] + counts["removed_contained"]
+    print(
+        f"Kept {counts['records_out']}/{counts['records_in']} records "
+        f"({removed} removed: {counts['removed_duplicate']} duplicate, "
+        f"{counts['removed_contained']} contained)",
+        file=sys.stderr,
+    )
+    if args.report:
+        write_report(args.report, args.name or args.psl, counts)
+
+
+if __name__ == "__main__":
+    run_main(main)
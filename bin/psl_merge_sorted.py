@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""Merge target-sorted PSL files with a streaming k-way merge.
+
+run_lastz.py writes every PSL output sorted by target name and start, so a
+bucket of per-pair files can be combined with a heap-based merge that holds a
+single record per open input. When there are more inputs than --max_open,
+they are merged in groups into temporary runs first, keeping the number of
+open files bounded.
+
+The module also provides the sort helpers used by run_lastz.py and
+run_lastz_intermediate_layer.py: sort_lines() sorts an arbitrary record
+stream in memory and spills sorted runs to disk once it exceeds
+SORT_BUFFER_RECORDS records.
+
+Usage:
+    psl_merge_sorted.py --file_list psl.list --output bucket.merged.psl
+    psl_merge_sorted.py --output bucket.merged.psl a.psl b.psl ...
+"""
+
+import argparse
+import heapq
+import logging
+import os
+import sys
+import tempfile
+from typing import Iterable, Iterator, Sequence, TextIO
+
+from profiling import run_main
+
+__author__ = "Alejandro Gonzales-Irribarren"
+__credits__ = ["Bogdan M. Kirilenko, Nil Tianchen Mu"]
+__email__ = "alejandrxgzi@gmail.com"
+__github__ = "https://github.com/hillerlab/make_lastz_chains"
+__version__ = "0.0.1"
+
+
+LOGGER = logging.getLogger("psl_merge_sorted")
+
+MAX_OPEN_FILES = 256
+SORT_BUFFER_RECORDS = 1_000_000
+
+PslKey = tuple[str, int, int, str, int]
+# (path, start offset, end offset or None for end of file)
+Source = tuple[str, int, int | None]
+
+
+class UnsortedInputError(ValueError):
+    """Report a PSL input that is not sorted by target name and start."""
+
+
+def configure_logging(verbose: bool) -> None:
+    """Log merge progress to stderr; add per-group detail when verbose."""
+    logging.basicConfig(format="%(levelname)s %(name)s: %(message)s")
+    LOGGER.setLevel(logging.DEBUG if verbose else logging.INFO)
+
+
+def psl_sort_key(line: str) -> PslKey:
+    """Return the sort key of a PSL line: target, target start/end, query, start."""
+    fields = line.split("\t", 17)
+    return (fields[13], int(fields[15]), int(fields[16]), fields[9], int(fields[11]))
+
+
+def is_psl_record(line: str) -> bool:
+    """Return True for PSL data lines (header and blank lines are skipped)."""
+    return line[:1].isdigit()
+
+
+def iter_source_lines(source: Source) -> Iterator[str]:
+    """Yield the PSL records of one source, checking that they are sorted."""
+    path, start, end = source
+    previous: PslKey | None = None
+    with open(path) as f:
+        f.seek(start)
+        position = start
+        for line in f:
+            if end is not None and position >= end:
+                break
+            position += len(line.encode())
+            if is_psl_record(line):
+                key = psl_sort_key(line)
+                if previous is not None and key < previous:
+                    raise UnsortedInputError(f"{path} is not sorted by target start")
+                previous = key
+                yield line if line.endswith("\n") else line + "\n"
+
+
+def write_run(lines: Iterable[str], tmp_dir: str | None) -> str:
+    """Write lines to a new temporary run file and return its path."""
+    fd, path = tempfile.mkstemp(prefix="psl_run_", suffix=".psl", dir=tmp_dir)
+    with os.fdopen(fd, "w") as f:
+        f.writelines(lines)
+    return path
+
+
+def merge_sources(
+    sources: Sequence[Source],
+    out: TextIO,
+    tmp_dir: str | None = None,
+    max_open: int = MAX_OPEN_FILES,
+) -> int:
+    """Merge sorted sources into out; return the number of records written."""
+    max_open = max(2, max_open)
+    runs: list[str] = []
+    try:
+        sources = list(sources)
+        while len(sources) > max_open:
+            merged: list[Source] = []
+            for i in range(0, len(sources), max_open):
+                group = sources[i : i + max_open]
+                LOGGER.debug("Merging group of %d inputs into a run", len(group))
+                path = write_run(
+                    heapq.merge(*map(iter_source_lines, group), key=psl_sort_key),
+                    tmp_dir,
+                )
+                runs.append(path)
+                merged.append((path, 0, None))
+            sources = merged
+
+        count = 0
+        for line in heapq.merge(*map(iter_source_lines, sources), key=psl_sort_key):
+            out.write(line)
+            count += 1
+        return count
+    finally:
+        for path in runs:
+            os.unlink(path)
+
+
+def sort_lines(
+    lines: Iterable[str],
+    out: TextIO,
+    tmp_dir: str | None = None,
+    max_records: int = SORT_BUFFER_RECORDS,
+) -> int:
+    """Sort PSL records into out, spilling sorted runs for large inputs."""
+    buffer: list[str] = []
+    runs: list[str] = []
+    try:
+        for line in lines:
+            if not is_psl_record(line):
+                continue
+            buffer.append(line if line.endswith("\n") else line + "\n")
+            if len(buffer) >= max_records:
+                buffer.sort(key=psl_sort_key)
+                runs.append(write_run(buffer, tmp_dir))
+                buffer = []
+        buffer.sort(key=psl_sort_key)
+        if not runs:
+            out.writelines(buffer)
+            return len(buffer)
+        if buffer:
+            runs.append(write_run(buffer, tmp_dir))
+        LOGGER.debug("External sort over %d spilled runs", len(runs))
+        return merge_sources([(path, 0, None) for path in runs], out, tmp_dir)
+    finally:
+        for path in runs:
+            os.unlink(path)
+
+
+def iter_unchecked_lines(paths: Sequence[str]) -> Iterator[str]:
+    """Yield every line of paths without any order check."""
+    for path in paths:
+        with open(path) as f:
+            yield from f
+
+
+def parse_args(argv: Sequence[str] | None = None) -> argparse.Namespace:
+    """Parse the PSL merge command-line interface."""
+    app = argparse.ArgumentParser(description=__doc__)
+    app.add_argument("inputs", nargs="*", help="Sorted PSL files")
+    app.add_argument("--file_list", default=None, help="File with one PSL per line")
+    app.add_argument("--output", required=True, help="Merged PSL output")
+    app.add_argument("--tmp_dir", default=None, help="Directory for temporary runs")
+    app.add_argument(
+        "--max_open",
+        type=int,
+        default=MAX_OPEN_FILES,
+        help=f"Maximum simultaneously open inputs (default: {MAX_OPEN_FILES})",
+    )
+    app.add_argument("--verbose", "-v", action="store_true")
+    return app.parse_args(argv)
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    """Merge sorted PSL inputs; fall back to a full sort for unsorted ones."""
+    args = parse_args(argv)
+    configure_logging(args.verbose)
+    paths = list(args.inputs)
+    if args.file_list:
+        with open(args.file_list) as f:
+            paths.extend(line.strip() for line in f if line.strip())
+    if not paths:
+        sys.exit("No PSL inputs given")
+    LOGGER.info("Merging %d sorted PSL file(s) into %s", len(paths), args.output)
+
+    try:
+        with open(args.output, "w") as out:
+            count = merge_sources(
+                [(path, 0, None) for path in paths], out, args.tmp_dir, args.max_open
+            )
+    except UnsortedInputError as error:
+        # Outputs of an older run_lastz.py (e.g. reused by -resume) are not
+        # sorted; sort everything instead of failing the bucket.
+        LOGGER.warning("%s; falling back to a full sort", error)
+        with open(args.output, "w") as out:
+            count = sort_lines(iter_unchecked_lines(paths), out, args.tmp_dir)
+    LOGGER.info("Wrote %d records", count)
+
+
+if __name__ == "__main__":
+    run_main(main)
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""Split merged PSL files by target chromosome straight into axtChain bundles.
+
+Fuses the former PSLTOOLS_SPLIT + psl_bundle.py steps. The bundle plan is
+computed from chrom.sizes alone, with the same rule psl_bundle.py applies
+(chromosomes by decreasing size, a bundle closes once it reaches --max_bases
+or holds more than 1000 chromosomes). The input PSL files, which
+PSL_MERGE_SORTED writes sorted by target, are then k-way merged in a single
+streaming pass and every record is appended to the bundle of its target
+chromosome. Bundle files are kept open in a small LRU cache bounded by
+--max_open. Bundles that receive no records are not written.
+
+With --min_score, a pre-pass drops (target, query, strand) groups that
+cannot yield a chain of that score. axtChain chains blocks of one such group
+only, and a chain scores at most the sum of its block scores minus
+non-negative gap costs; a block of n bases scores at most n times the best
+substitution score (100 for axtChain's default matrix, or the largest entry
+of --score_scheme). Groups whose aligned bases times that score stay below
+--min_score are therefore dropped without changing the chains axtChain keeps.
+
+Usage:
+    psl_split_bundle.py --chrom_sizes target.chrom.sizes --output_dir split_psl/
+                        [--max_bases 1000000] [--min_score 1000]
+                        a.merged.psl b.merged.psl ...
+"""
+
+import argparse
+import gzip
+import os
+import sys
+from collections import OrderedDict
+from typing import Iterator, Sequence, TextIO
+
+from psl_bundle import MAX_BASES_DEFAULT, read_chrom_sizes
+from profiling import run_main
+from psl_merge_sorted import UnsortedInputError, is_psl_record, merge_sources
+
+MAX_CHROMS_PER_BUNDLE: int = 1000
+MAX_OPEN_DEFAULT: int = 128
+# Best substitution score of axtChain's default (blastz) scoring matrix.
+DEFAULT_MAX_BASE_SCORE: int = 100
+BASES = frozenset("ACGTacgt")
+
+# (target, query, strand) — the records axtChain may chain together
+ChainGroup = tuple[str, str, str]
+
+
+def plan_bundles(chrom_size: dict[str, int], max_bases: int) -> dict[str, int]:
+    """Assign every chromosome to a bundle index."""
+    plan: dict[str, int] = {}
+    cur_bases = 0
+    cur_count = 0
+    cur_bundle = 0
+    for chrom in sorted(chrom_size, key=chrom_size.get, reverse=True):
+        plan[chrom] = cur_bundle
+        cur_bases += chrom_size[chrom]
+        cur_count += 1
+        if cur_bases >= max_bases or cur_count > MAX_CHROMS_PER_BUNDLE:
+            cur_bundle += 1
+            cur_bases = 0
+            cur_count = 0
+    return plan
+
+
+def read_max_base_score(path: str) -> int:
+    """Return the largest substitution score of an axtChain/lastz score file."""
+    best: int | None = None
+    with open(path) as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) < 5 or fields[0] not in BASES:
+                continue
+            try:
+                scores = [int(value) for value in fields[1:]]
+            except ValueError:
+                continue
+            best = max(scores + ([best] if best is not None else []))
+    if best is None:
+        raise ValueError(f"No substitution matrix found in {path}")
+    return best
+
+
+def chain_group(fields: list[str]) -> ChainGroup:
+    """Return the (target, query, strand) group of split PSL fields."""
+    # Only the query strand; a coarser group can only raise the bound.
+    return fields[13], fields[9], fields[8][:1]
+
+
+def aligned_bases_by_group(paths: Sequence[str]) -> dict[ChainGroup, int]:
+    """Sum the block sizes of every (target, query, strand) group."""
+    bases: dict[ChainGroup, int] = {}
+    for line in iter_concatenated(paths):
+        fields = line.split("\t", 19)
+        group = chain_group(fields)
+        block_sizes = sum(int(size) for size in fields[18].split(",") if size)
+        bases[group] = bases.get(group, 0) + block_sizes
+    return bases
+
+
+def unchainable_groups(
+    paths: Sequence[str], min_score: int, max_base_score: int
+) -> set[ChainGroup]:
+    """Return the groups whose best possible chain scores below min_score."""
+    return {
+        group
+        for group, bases in aligned_bases_by_group(paths).items()
+        if bases * max_base_score < min_score
+    }
+
+
+class BundleRouter:
+    """Route PSL lines to bundle files, keeping at most max_open files open.
+
+    Provides write() so it can be used as the output of merge_sources().
+    """
+
+    def __init__(
+        self,
+        plan: dict[str, int],
+        output_dir: str,
+        prefix: str,
+        max_open: int,
+        skip: set[ChainGroup] | None = None,
+    ) -> None:
+        self.plan = plan
+        self.skip = skip or set()
+        self.output_dir = output_dir
+        self.prefix = prefix
+        self.max_open = max(1, max_open)
+        self.handles: OrderedDict[int, TextIO] = OrderedDict()
+        self.records: dict[int, int] = {}
+        self.unplanned: dict[str, int] = {}
+        self.skipped = 0
+
+    def path(self, bundle: int) -> str:
+        """Return the output path of one bundle."""
+        return os.path.join(self.output_dir, f"{self.prefix}.{bundle}.psl")
+
+    def write(self, line: str) -> None:
+        """Append one record to the bundle of its target chromosome."""
+        fields = line.split("\t", 14)
+        if self.skip and chain_group(fields) in self.skip:
+            self.skipped += 1
+            return
+        target = fields[13]
+        bundle = self.plan.get(target)
+        if bundle is None:
+            self.unplanned[target] = self.unplanned.get(target, 0) + 1
+            return
+        handle = self.handles.get(bundle)
+        if handle is None:
+            if len(self.handles) >= self.max_open:
+                _, oldest = self.handles.popitem(last=False)
+                oldest.close()
+            mode = "a" if bundle in self.records else "w"
+            handle = open(self.path(bundle), mode)
+            self.handles[bundle] = handle
+            self.records.setdefault(bundle, 0)
+        else:
+            self.handles.move_to_end(bundle)
+        handle.write(line)
+        self.records[bundle] += 1
+
+    def close(self) -> None:
+        """Close every open bundle file."""
+        for handle in self.handles.values():
+            handle.close()
+        self.handles.clear()
+
+    def reset(self) -> None:
+        """Discard everything written so far."""
+        self.close()
+        for bundle in self.records:
+            os.unlink(self.path(bundle))
+        self.records.clear()
+        self.unplanned.clear()
+        self.skipped = 0
+
+
+def open_psl(path: str) -> TextIO:
+    """Open a plain or gzipped PSL file for reading."""
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt")
+    return open(path)
+
+
+def iter_concatenated(paths: Sequence[str]) -> Iterator[str]:
+    """Yield PSL records of every input in file order."""
+    for path in paths:
+        with open_psl(path) as f:
+            for line in f:
+                if is_psl_record(line):
+                    yield line if line.endswith("\n") else line + "\n"
+
+
+def split_into_bundles(
+    paths: Sequence[str],
+    router: BundleRouter,
+    max_open: int,
+    tmp_dir: str | None,
+) -> None:
+    """Stream all inputs once, merged by target, and route every record."""
+    if not any(path.endswith(".gz") for path in paths):
+        try:
+            merge_sources(
+                [(path, 0, None) for path in paths], router, tmp_dir, max_open
+            )
+            return
+        except UnsortedInputError as error:
+            # Order inside a bundle does not matter to axtChain; restart as a
+            # plain concatenation rather than failing on unsorted input.
+            print(f"WARNING: {error}; routing inputs in file order", file=sys.stderr)
+            router.reset()
+    for line in iter_concatenated(paths):
+        router.write(line)
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command-line arguments for split-and-bundle."""
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("inputs", nargs="*", help="Merged PSL files (plain or .gz)")
+    ap.add_argument("--file_list", default=None, help="File with one PSL per line")
+    ap.add_argument(
+        "--chrom_sizes",
+        required=True,
+        help="Target chrom.sizes file (defines the bundle plan)",
+    )
+    ap.add_argument(
+        "--output_dir", required=True, help="Output directory for bundle .psl files"
+    )
+    ap.add_argument(
+        "--max_bases",
+        type=int,
+        default=MAX_BASES_DEFAULT,
+        help=f"Maximum bases per bundle (default: {MAX_BASES_DEFAULT})",
+    )
+    ap.add_argument(
+        "--max_open",
+        type=int,
+        default=MAX_OPEN_DEFAULT,
+        help=f"Maximum simultaneously open files (default: {MAX_OPEN_DEFAULT})",
+    )
+    ap.add_argument(
+        "--prefix", default="bundle", help="Bundle file prefix (default: bundle)"
+    )
+    ap.add_argument("--tmp_dir", default=None, help="Directory for temporary runs")
+    ap.add_argument(
+        "--min_score",
+        type=int,
+        default=0,
+        help="Drop groups that cannot reach this chain score (default: 0, off)",
+    )
+    ap.add_argument(
+        "--score_scheme",
+        default=None,
+        help="axtChain -scoreScheme file bounding the per-base score",
+    )
+    if len(sys.argv) < 2:
+        ap.print_help()
+        sys.exit(1)
+    return ap.parse_args()
+
+
+def main() -> None:
+    """Plan bundles from chrom.sizes and fill them in one pass over the PSLs."""
+    args = parse_args()
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    paths = list(args.inputs)
+    if args.file_list:
+        with open(args.file_list) as f:
+            paths.extend(line.strip() for line in f if line.strip())
+    print(f"Found {len(paths)} PSL files to split", file=sys.stderr)
+
+    plan = plan_bundles(read_chrom_sizes(args.chrom_sizes), args.max_bases)
+    n_planned = len(set(plan.values()))
+    print(f"Planned {n_planned} bundles from {len(plan)} chroms", file=sys.stderr)
+
+    skip: set[ChainGroup] = set()
+    if args.min_score > 0:
+        max_base_score = (
+            read_max_base_score(args.score_scheme)
+            if args.score_scheme
+            else DEFAULT_MAX_BASE_SCORE
+        )
+        skip = unchainable_groups(paths, args.min_score, max_base_score)
+        print(
+            f"{len(skip)} (target, query, strand) groups cannot reach chain "
+            f"score {args.min_score} (at most {max_base_score} per base)",
+            file=sys.stderr,
+        )
+
+    # Merge inputs and bundle files share the open-file budget.
+    max_open = max(2, args.max_open // 2)
+    router = BundleRouter(plan, args.output_dir, args.prefix, max_open, skip)
+    try:
+        split_into_bundles(paths, router, max_open, args.tmp_dir)
+    finally:
+        router.close()
+
+    # axtChain would have written an empty chain file; keep one (empty)
+    # bundle so every alignment still reaches the merge.
+    if router.skipped and not router.records:
+        open(router.path(0), "w").close()
+        router.records[0] = 0
+
+    for target, count in sorted(router.unplanned.items()):
+        print(
+            f"WARNING: {count} records on {target} were not bundled "
+            f"(chrom not found in chrom.sizes)",
+            file=sys.stderr,
+        )
+    n_records = sum(router.records.values())
+    print(
+        f"Produced {len(router.records)} bundle files with {n_records} records "
+        f"in {args.output_dir}",
+        file=sys.stderr,
+    )
+    if args.min_score > 0:
+        print(
+            f"Pruned {router.skipped} records that cannot form a chain of "
+            f"score {args.min_score}",
+            file=sys.stderr,
+        )
+
+
+if __name__ == "__main__":
+    run_main(main)
@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+"""Predict per-task memory and runtime from task input sizes.
+
+The model is a small JSON file with, for each advised process and resource, a
+linear prediction from one input-size feature:
+
+    value = intercept + slope * feature, clamped to [min, max]
+
+Memory is in bytes, time in seconds. Features per process:
+
+    LASTZ          memory: reference_bases   time: base_product (Gbp x Gbp)
+    AXT_CHAIN      memory/time: input_bytes  (PSL bundle)
+    REPEAT_FILLER  memory/time: input_bytes  (chain chunk)
+    CHAIN_CLEANER  memory/time: chain_bytes  (plain chain or chain shard
+                   bytes; gzipped chains count CHAIN_GZIP_RATIO x their size;
+                   also fits CHAIN_CLEANER_SHARD/_SERIAL)
+
+nextflow.config reads the same file (params.resource_model) when
+params.resource_advisor is enabled and turns predictions into per-task
+memory/time directives. Subcommands:
+
+    default   write the built-in model (assets/resource_model.json)
+    fit       refit intercepts/slopes from Nextflow trace files of past runs
+    predict   print the prediction for one process and feature value
+"""
+
+import argparse
+import csv
+import json
+import logging
+import math
+import os
+import re
+from typing import Iterable, Sequence
+
+from profiling import run_main
+from run_lastz_packed import partition_bases
+
+__author__ = "Alejandro Gonzales-Irribarren"
+__credits__ = ["Bogdan M. Kirilenko, Nil Tianchen Mu"]
+__email__ = "alejandrxgzi@gmail.com"
+__github__ = "https://github.com/hillerlab/make_lastz_chains"
+__version__ = "0.0.1"
+
+
+LOGGER = logging.getLogger("resource_advisor")
+
+MODEL_VERSION = 2
+GB = 1024**3
+# Typical compression ratio of gzipped chain files; nextflow.config uses the
+# same factor so a directive never has to decompress a chain.
+CHAIN_GZIP_RATIO = 4.0
+DEFAULT_QUANTILE = 0.95
+MIN_OBSERVATIONS = 5
+
+Model = dict[str, dict[str, dict[str, object]]]
+
+DEFAULT_MODEL: Model = {
+    "LASTZ": {
+        "memory": {
+            "feature": "reference_bases",
+            "intercept": 1 * GB,
+            "slope": 16,
+            "min": 2 * GB,
+        },
+        "time": {
+            "feature": "base_product",
+            "intercept": 300,
+            "slope": 200_000,
+            "min": 600,
+        },
+    },
+    "AXT_CHAIN": {
+        "memory": {
+            "feature": "input_bytes",
+            "intercept": 2 * GB,
+            "slope": 20,
+            "min": 4 * GB,
+        },
+        "time": {
+            "feature": "input_bytes",
+            "intercept": 600,
+            "slope": 2e-6,
+            "min": 900,
+        },
+    },
+    "REPEAT_FILLER": {
+        "memory": {
+            "feature": "input_bytes",
+            "intercept": 2 * GB,
+            "slope": 50,
+            "min": 4 * GB,
+        },
+        "time": {
+            "feature": "input_bytes",
+            "intercept": 600,
+            "slope": 1e-4,
+            "min": 900,
+        },
+    },
+    "CHAIN_CLEANER": {
+        "memory": {
+            "feature": "chain_bytes",
+            "intercept": 8 * GB,
+            "slope": 10,
+            "min": 16 * GB,
+        },
+        "time": {
+            "feature": "chain_bytes",
+            "intercept": 1800,
+            "slope": 2.5e-6,
+            "min": 3600,
+        },
+    },
+}
+
+# Trace columns (see the trace scope in nextflow.config) → model resource.
+TRACE_RESOURCES = {"memory": "peak_rss", "time": "realtime"}
+# Processes that run the tool of a modelled process on the same kind of input.
+PROCESS_ALIASES = {
+    "CHAIN_CLEANER_SHARD": "CHAIN_CLEANER",
+    "CHAIN_CLEANER_SERIAL": "CHAIN_CLEANER",
+}
+
+
+def configure_logging(verbose: bool) -> None:
+    """Log fit summaries to stderr; add per-task detail when verbose."""
+    logging.basicConfig(format="%(levelname)s %(name)s: %(message)s")
+    LOGGER.setLevel(logging.DEBUG if verbose else logging.INFO)
+
+
+def load_model(path: str | None) -> Model:
+    """Load a model file, or return the built-in model for None."""
+    if path is None:
+        return json.loads(json.dumps(DEFAULT_MODEL))
+    with open(path) as f:
+        data = json.load(f)
+    if data.get("version") != MODEL_VERSION:
+        raise ValueError(f"Unsupported resource model version in {path}")
+    return data["processes"]
+
+
+def write_model(model: Model, path: str) -> None:
+    """Write a model file."""
+    with open(path, "w") as f:
+        json.dump({"version": MODEL_VERSION, "processes": model}, f, indent=4)
+        f.write("\n")
+
+
+def predict(model: Model, process: str, resource: str, feature: float) -> float:
+    """Return the predicted memory (bytes) or time (seconds)."""
+    term = model[process][resource]
+    value = float(term["intercept"]) + float(term["slope"]) * feature
+    value = max(value, float(term.get("min", 0)))
+    if term.get("max") is not None:
+        value = min(value, float(term["max"]))
+    return value
+
+
+def chain_bytes(path: str) -> float:
+    """Return the plain size of a chain file, estimated for gzipped ones."""
+    size = os.path.getsize(path)
+    return size * CHAIN_GZIP_RATIO if path.endswith(".gz") else size
+
+
+def input_features(path: str) -> dict[str, float]:
+    """Derive the file-based features of a task input."""
+    return {"input_bytes": os.path.getsize(path), "chain_bytes": chain_bytes(path)}
+
+
+def predict_input(model: Model, process: str, resource: str, path: str) -> float:
+    """Predict one resource of a task from its input file."""
+    feature = model[process][resource]["feature"]
+    return predict(model, process, resource, input_features(path)[feature])
+
+
+def lastz_features(
+    tag: str,
+    chunks: tuple[int, int],
+    chrom_sizes: tuple[dict[str, int], dict[str, int]],
+) -> dict[str, float]:
+    """Derive LASTZ features from a task tag "<reference> vs <query>"."""
+    reference_part, query_part = tag.split(" vs ", 1)
+    reference_bases = partition_bases(reference_part, chrom_sizes[0], chunks[0])
+    query_bases = partition_bases(query_part, chrom_sizes[1], chunks[1])
+    return {
+        "reference_bases": reference_bases,
+        "query_bases": query_bases,
+        "base_product": (reference_bases / 1e9) * (query_bases / 1e9),
+    }
+
+
+def parse_memory(value: str) -> float | None:
+    """Parse a trace memory value ("1.2 GB", "512 MB" or raw bytes)."""
+    match = re.fullmatch(r"\s*([\d.]+)\s*([KMGT]?B)?\s*", value or "")
+    if not match:
+        return None
+    scale = {None: 1, "B": 1, "KB": 1024, "MB": 1024**2, "GB": GB, "TB": 1024**4}
+    return float(match.group(1)) * scale[match.group(2)]
+
+
+def parse_duration(value: str) -> float | None:
+    """Parse a trace duration ("1h 2m 3s", "850ms" or raw milliseconds)."""
+    value = (value or "").strip()
+    if not value or value == "-":
+        return None
+    if value.isdigit():
+        return int(value) / 1000
+    units = {"d": 86400, "h": 3600, "m": 60, "s": 1, "ms": 0.001}
+    parts = re.findall(r"([\d.]+)\s*(ms|d|h|m|s)", value)
+    if not parts:
+        return None
+    return sum(float(number) * units[unit] for number, unit in parts)
+
+
+def read_chrom_sizes(path: str | None) -> dict[str, int]:
+    """Read a chrom.sizes file, or return an empty mapping for None."""
+    if not path:
+        return {}
+    sizes = {}
+    with open(path) as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) >= 2:
+                sizes[fields[0]] = int(fields[1])
+    return sizes
+
+
+def iter_observations(
+    trace_paths: Iterable[str],
+    chunks: tuple[int, int],
+    chrom_sizes: tuple[dict[str, int], dict[str, int]],
+) -> Iterable[tuple[str, dict[str, float], dict[str, float]]]:
+    """Yield (process, features, measured resources) for completed tasks."""
+    for trace_path in trace_paths:
+        with open(trace_path) as f:
+            for row in csv.DictReader(f, delimiter="\t"):
+                if row.get("status") not in ("COMPLETED", "CACHED"):
+                    continue
+                process = row.get("process", row.get("name", "")).split(":")[-1]
+                process = process.split(" ")[0]
+                process = PROCESS_ALIASES.get(process, process)
+                if process not in DEFAULT_MODEL:
+                    continue
+                tag = row.get("tag", "")
+                if process == "LASTZ":
+                    features = lastz_features(tag, chunks, chrom_sizes)
+                else:
+                    workdir = row.get("workdir")
+                    if not workdir or not tag:
+                        continue
+                    input_path = os.path.join(workdir, tag)
+                    if not os.path.exists(input_path):
+                        LOGGER.debug("Input %s no longer exists", input_path)
+                        continue
+                    features = input_features(input_path)
+                measured = {
+                    "memory": parse_memory(row.get(TRACE_RESOURCES["memory"], "")),
+                    "time": parse_duration(row.get(TRACE_RESOURCES["time"], "")),
+                }
+                yield process, features, measured
+
+
+def quantile(values: Sequence[float], q: float) -> float:
+    """Return the q-quantile of values (nearest rank)."""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))
+    return ordered[index]
+
+
+def fit_term(
+    points: Sequence[tuple[float, float]], term: dict[str, object], q: float
+) -> dict[str, object]:
+    """Fit a non-negative slope and shift the intercept to cover quantile q."""
+    n = len(points)
+    mean_x = sum(x for x, _ in points) / n
+    mean_y = sum(y for _, y in points) / n
+    var_x = sum((x - mean_x) ** 2 for x, _ in points)
+    slope = 0.0
+    if var_x > 0:
+        slope = max(0.0, sum((x - mean_x) * (y - mean_y) for x, y in points) / var_x)
+    intercept = mean_y - slope * mean_x
+    residuals = [y - (intercept + slope * x) for x, y in points]
+    intercept += max(0.0, quantile(residuals, q))
+    fitted = dict(term)
+    fitted["intercept"] = max(0.0, intercept)
+    fitted["slope"] = slope
+    fitted["observations"] = n
+    return fitted
+
+
+def fit_model(
+    model: Model,
+    observations: Iterable[tuple[str, dict[str, float], dict[str, float]]],
+    q: float,
+) -> Model:
+    """Refit every term that has at least MIN_OBSERVATIONS measurements."""
+    points: dict[tuple[str, str], list[tuple[float, float]]] = {}
+    for process, features, measured in observations:
+        for resource, term in model[process].items():
+            value = measured.get(resource)
+            feature = features.get(str(term["feature"]))
+            if value is None or feature is None:
+                continue
+            points.setdefault((process, resource), []).append((feature, value))
+
+    fitted = json.loads(json.dumps(model))
+    for (process, resource), term_points in sorted(points.items()):
+        if len(term_points) < MIN_OBSERVATIONS:
+            LOGGER.info(
+                "%s %s: only %d observation(s), keeping previous model",
+                process,
+                resource,
+                len(term_points),
+            )
+            continue
+        fitted[process][resource] = fit_term(term_points, model[process][resource], q)
+        LOGGER.info(
+            "%s %s: fitted on %d task(s): intercept=%.4g slope=%.4g",
+            process,
+            resource,
+            len(term_points),
+            fitted[process][resource]["intercept"],
+            fitted[process][resource]["slope"],
+        )
+    return fitted
+
+
+def parse_args(argv: Sequence[str] | None = None) -> argparse.Namespace:
+    """Parse the resource advisor command-line interface."""
+    app = argparse.ArgumentParser(description=__doc__)
+    app.add_argument("--verbose", "-v", action="store_true")
+    commands = app.add_subparsers(dest="command", required=True)
+
+    default = commands.add_parser("default", help="Write the built-in model")
+    default.add_argument("--output", required=True)
+
+    fit = commands.add_parser("fit", help="Refit the model from trace files")
+    fit.add_argument("--trace", nargs="+", required=True, help="Nextflow trace files")
+    fit.add_argument("--model", default=None, help="Starting model (default: built-in)")
+    fit.add_argument("--output", required=True)
+    fit.add_argument("--seq1_chunk", type=int, default=175_000_000)
+    fit.add_argument("--seq2_chunk", type=int, default=50_000_000)
+    fit.add_argument("--reference_chrom_sizes", default=None)
+    fit.add_argument("--query_chrom_sizes", default=None)
+    fit.add_argument(
+        "--quantile",
+        type=float,
+        default=DEFAULT_QUANTILE,
+        help=f"Fraction of past tasks the prediction must cover (default: {DEFAULT_QUANTILE})",
+    )
+
+    predict_cmd = commands.add_parser("predict", help="Predict one task")
+    predict_cmd.add_argument("--model", default=None)
+    predict_cmd.add_argument("--process", required=True, choices=sorted(DEFAULT_MODEL))
+    group = predict_cmd.add_mutually_exclusive_group(required=True)
+    group.add_argument("--input", help="Input file (AXT_CHAIN, REPEAT_FILLER, ...)")
+    group.add_argument("--pair", help='LASTZ tag "<reference_part> vs <query_part>"')
+    predict_cmd.add_argument("--seq1_chunk", type=int, default=175_000_000)
+    predict_cmd.add_argument("--seq2_chunk", type=int, default=50_000_000)
+    return app.parse_args(argv)
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    """Dispatch one advisor subcommand."""
+    args = parse_args(argv)
+    configure_logging(args.verbose)
+
+    if args.command == "default":
+        write_model(load_model(None), args.output)
+    elif args.command == "fit":
+        observations = iter_observations(
+            args.trace,
+            (args.seq1_chunk, args.seq2_chunk),
+            (
+                read_chrom_sizes(args.reference_chrom_sizes),
+                read_chrom_sizes(args.query_chrom_sizes),
+            ),
+        )
+        model = fit_model(load_model(args.model), observations, args.quantile)
+        write_model(model, args.output)
+    else:
+        model = load_model(args.model)
+        if args.pair:
+            features = lastz_features(
+                args.pair, (args.seq1_chunk, args.seq2_chunk), ({}, {})
+            )
+        else:
+            features = input_features(args.input)
+        for resource, term in model[args.process].items():
+            value = predict(model, args.process, resource, features[term["feature"]])
+            if resource == "memory":
+                print(f"memory\t{value / GB:.2f} GB")
+            else:
+                print(f"time\t{value / 3600:.2f} h")
+
+
+if __name__ == "__main__":
+    run_main(main)
@@ -1,5 +1,29 @@
 #!/usr/bin/env python3
-"""Run one LASTZ alignment and optionally convert its AXT output to PSL."""
+"""Run one LASTZ alignment and optionally convert its AXT output to PSL.
+
+PSL output is written sorted by target name and start (see
+psl_merge_sorted.sort_lines), so per-pair files can be combined downstream
+with a streaming k-way merge instead of a full sort. axtToPsl's output is
+streamed into the sort, which spills sorted runs for large outputs.
+
+When the params JSON sets ``seq_store_dir``, collapsed BULK FASTA files and
+v1 chromosome extracts are resolved through the node-local sequence store
+(seq_store.py), so concurrent workers on one node share a single copy.
+
+When it sets ``seq_fifo``, those sequences are instead decoded on the fly and
+streamed to LASTZ through named pipes (seq_fifo.py): a v1 chromosome range
+is decoded for the range only, and the AXT coordinates are shifted back onto
+the whole chromosome before the PSL conversion.
+
+When it sets ``orientation`` to ``auto``, the side with fewer unmasked bases
+(from the .2bit N-block and mask tables) is passed to LASTZ as the target:
+its seed table and memory scale with the indexed target, while the query is
+scanned one sequence at a time. The other side must have at least
+SWAP_RATIO times as many unmasked bases. Swapped AXT output is turned back
+into reference-as-target records before the PSL conversion.
+``--orientation_benchmark`` runs both orientations and reports whether the
+converted alignments match.
+"""
 
 import argparse
 import json
@@ -8,17 +32,30 @@ import os
 import random
 import shlex
 import shutil
+import signal
 import string
 import subprocess
+import sys
+import threading
+import time
+from bisect import bisect_right
+from collections import Counter
+from contextlib import ExitStack
 from subprocess import PIPE
-from typing import Sequence
+from typing import Sequence, TextIO
 
+from genome_cache import parse_size
+from profiling import run_main, span
+from psl_merge_sorted import sort_lines
+from seq_fifo import DEFAULT_OPEN_TIMEOUT, FifoRecord, SequenceFifo
+from seq_store import SequenceStore, fasta_size, file_identity, make_key
+from twobit import TwoBitFile
 
 __author__ = "Alejandro Gonzales-Irribarren"
 __credits__ = ["Bogdan M. Kirilenko, Nil Tianchen Mu"]
 __email__ = "alejandrxgzi@gmail.com"
 __github__ = "https://github.com/hillerlab/make_lastz_chains"
-__version__ = "0.0.3"
+__version__ = "0.0.4"
 
 
 LOGGER = logging.getLogger("run_lastz")
@@ -27,7 +64,18 @@ BLASTZ_PREFIX = "lastz_"
 FORMAT_ARG = "--format=axt+"
 ALLOC_ARG = "--traceback=800.0M"
 
+DEFAULT_SEQ_STORE_SIZE = "16G"
+
+ORIENTATIONS = ("reference", "auto")
+# Index the query once the reference has this many times its unmasked bases.
+SWAP_RATIO: float = 2.0
+COMPLEMENT = str.maketrans("ACGTNacgtn", "TGCANtgcan")
+
 FileSpec = tuple[str, str | None, int | None, int | None]
+# (start, end, sequence size) of a range streamed without its flanks
+RangeShift = tuple[int, int, int]
+# (bases, unmasked bases) of a sequence argument
+SequenceContent = tuple[int, int]
 PipelineParams = dict[str, object]
 
 
@@ -91,6 +139,12 @@ def parse_args(argv: Sequence[str] | None = None) -> argparse.Namespace:
         default=None,
         help="Optional directory of pre-extracted <chrom>.fa files for the query genome",
     )
+    app.add_argument(
+        "--orientation_benchmark",
+        default=None,
+        metavar="REPORT",
+        help="Run both target/query orientations and write a comparison TSV",
+    )
     return app.parse_args(argv)
 
 
@@ -121,6 +175,48 @@ def get_optional_string_param(params: PipelineParams, key: str) -> str | None:
     return value
 
 
+def open_sequence_store(params: PipelineParams) -> SequenceStore | None:
+    """Return the node-local sequence store configured in the params, if any."""
+    root = get_optional_string_param(params, "seq_store_dir")
+    if not root:
+        return None
+    max_size = get_optional_string_param(params, "seq_store_max_size")
+    store = SequenceStore(root, parse_size(max_size or DEFAULT_SEQ_STORE_SIZE))
+    LOGGER.debug("Using sequence store %s (cap %d bytes)", root, store.max_bytes)
+    return store
+
+
+def get_fifo_timeout(params: PipelineParams) -> float | None:
+    """Return the FIFO open timeout when FIFO delivery is enabled, else None."""
+    enabled = params.get("seq_fifo")
+    if enabled not in (True, "true"):
+        return None
+    timeout = params.get("seq_fifo_timeout")
+    if timeout in (None, ""):
+        return DEFAULT_OPEN_TIMEOUT
+    try:
+        return float(timeout)
+    except (TypeError, ValueError) as error:
+        raise ValueError(
+            "Pipeline parameter 'seq_fifo_timeout' must be a number"
+        ) from error
+
+
+def get_orientation(params: PipelineParams) -> str:
+    """Return the target/query orientation policy of the params."""
+    orientation = params.get("orientation") or "reference"
+    if orientation not in ORIENTATIONS:
+        raise ValueError(
+            f"Pipeline parameter 'orientation' must be one of {', '.join(ORIENTATIONS)}"
+        )
+    return str(orientation)
+
+
+def exit_on_sigterm() -> None:
+    """Turn SIGTERM into SystemExit so FIFOs and the workspace are cleaned up."""
+    signal.signal(signal.SIGTERM, lambda signum, _frame: sys.exit(128 + signum))
+
+
 def get_temp_dir(parent_dir: str | None) -> str:
     """Create and return an owned temporary workspace under a parent directory."""
     if parent_dir and not os.path.isdir(parent_dir):
@@ -193,28 +289,282 @@ def build_lastz_command(
 
 
 def call_lastz(command: str) -> str:
-    """Run LASTZ and return decoded AXT output."""
+    """Run LASTZ and return decoded AXT output.
+
+    LASTZ is killed when the wrapper is interrupted, so it never outlives the
+    FIFOs it reads from.
+    """
     LOGGER.debug("Running LASTZ subprocess: %s", command)
-    try:
-        return subprocess.check_output(command, shell=True, stderr=PIPE).decode("utf-8")
-    except subprocess.CalledProcessError as error:
-        error_message = error.stderr.decode("utf-8")
+    with span("lastz", command):
+        process = subprocess.Popen(
+            f"exec {command}", shell=True, stdout=PIPE, stderr=PIPE
+        )
+        try:
+            output, stderr = process.communicate()
+        except BaseException:
+            process.kill()
+            process.wait()
+            raise
+    if process.returncode != 0:
         raise LastzProcessError(
-            f"LASTZ command failed with exit code {error.returncode}: {error_message}"
-        ) from error
+            f"LASTZ command failed with exit code {process.returncode}: "
+            f"{stderr.decode('utf-8')}"
+        )
+    return output.decode("utf-8")
+
+
+def shift_axt_coordinates(
+    axt: str,
+    reference_shift: RangeShift | None,
+    query_shift: RangeShift | None,
+) -> str:
+    """Map AXT coordinates of streamed ranges back onto the whole sequences.
+
+    A streamed range starts at position 1, so target and forward-strand query
+    positions move by the range start. Reverse-strand query positions count
+    from the end of the sequence and move by its size minus the range end.
+    """
+    if reference_shift is None and query_shift is None:
+        return axt
+    shifted = []
+    sequence_lines = 0
+    for line in axt.splitlines(keepends=True):
+        if sequence_lines:
+            sequence_lines -= 1
+        elif line.strip() and not line.startswith("#"):
+            fields = line.split()
+            if reference_shift is not None:
+                offset = reference_shift[0]
+                fields[2] = str(int(fields[2]) + offset)
+                fields[3] = str(int(fields[3]) + offset)
+            if query_shift is not None:
+                start, end, size = query_shift
+                offset = start if fields[7] == "+" else size - end
+                fields[5] = str(int(fields[5]) + offset)
+                fields[6] = str(int(fields[6]) + offset)
+            line = " ".join(fields) + "\n"
+            sequence_lines = 2
+        shifted.append(line)
+    return "".join(shifted)
+
+
+def blocks_in_range(starts, sizes, start: int, end: int) -> int:
+    """Return the bases of sorted (start, size) blocks inside [start, end)."""
+    covered = 0
+    index = max(0, bisect_right(starts, start) - 1)
+    while index < len(starts) and starts[index] < end:
+        block_end = starts[index] + sizes[index]
+        covered += max(0, min(block_end, end) - max(starts[index], start))
+        index += 1
+    return covered
+
+
+def sequence_content(arg: str) -> SequenceContent | None:
+    """Return the bases and unmasked bases of a .2bit range or .lst argument.
+
+    Unmasked bases are neither N nor soft-masked (overlaps of both are
+    subtracted twice, which is fine for comparing orientations). Returns
+    None when the argument is not backed by a readable .2bit file.
+    """
+    try:
+        if arg.endswith(".lst"):
+            with open(arg) as list_file:
+                content = [line.rstrip() for line in list_file if line.strip()]
+            ranges = [
+                (path, chrom, 0, None)
+                for path, chrom in parse_list_entries(arg, content)
+            ]
+        else:
+            path, chrom, start, end = parse_file_spec(arg)
+            if chrom is None:
+                return None
+            ranges = [(path, chrom, start, end)]
+        bases = unmasked = 0
+        for path, chrom, start, end in ranges:
+            if not path.endswith(".2bit"):
+                return None
+            with TwoBitFile(path) as twobit:
+                size, n_starts, n_sizes, mask_starts, mask_sizes = twobit.block_tables(
+                    chrom
+                )
+            stop = size if end is None else min(end, size)
+            covered = blocks_in_range(n_starts, n_sizes, start, stop)
+            covered += blocks_in_range(mask_starts, mask_sizes, start, stop)
+            bases += stop - start
+            unmasked += max(0, stop - start - covered)
+    except (OSError, KeyError, ValueError) as error:
+        LOGGER.debug("No sequence content for %s: %s", arg, error)
+        return None
+    return bases, unmasked
+
+
+def choose_swap(
+    reference: SequenceContent | None, query: SequenceContent | None
+) -> bool:
+    """Return whether LASTZ should index the query instead of the reference."""
+    if reference is None or query is None:
+        return False
+    swap = reference[1] > SWAP_RATIO * max(query[1], 1)
+    LOGGER.debug(
+        "Unmasked bases: reference %d, query %d; %s is the LASTZ target",
+        reference[1],
+        query[1],
+        "query" if swap else "reference",
+    )
+    return swap
+
+
+def read_sizes(chrom_sizes_path: str, names: set[str]) -> dict[str, int]:
+    """Return the chrom.sizes entries of the given sequence names."""
+    sizes = {}
+    with open(chrom_sizes_path) as chrom_sizes_file:
+        for line in chrom_sizes_file:
+            fields = line.split()
+            if len(fields) >= 2 and fields[0] in names:
+                sizes[fields[0]] = int(fields[1])
+    return sizes
+
+
+def reverse_complement(sequence: str) -> str:
+    """Reverse-complement an aligned sequence line, keeping gaps and case."""
+    return sequence[::-1].translate(COMPLEMENT)
 
 
-def make_psl_if_needed(
+def swap_axt_orientation(
+    axt: str, reference_sizes_path: str, query_sizes_path: str
+) -> str:
+    """Turn AXT records with the query as target into reference-as-target ones.
+
+    Forward-strand records only exchange the two sides. A reverse-strand
+    record is reverse-complemented so the reference reads forward, and both
+    coordinate ranges move to the other strand of their sequence.
+    """
+    records = []
+    header_fields = None
+    sequences: list[str] = []
+    for line in axt.splitlines():
+        if header_fields is not None:
+            sequences.append(line)
+            if len(sequences) == 2:
+                records.append((header_fields, *sequences))
+                header_fields, sequences = None, []
+        elif line.strip() and not line.startswith("#"):
+            header_fields = line.split()
+    reference_sizes = read_sizes(reference_sizes_path, {r[0][4] for r in records})
+    query_sizes = read_sizes(query_sizes_path, {r[0][1] for r in records})
+
+    swapped = []
+    for fields, query_line, reference_line in records:
+        number, q_name, q_start, q_end, r_name, r_start, r_end, strand = fields[:8]
+        if strand == "-":
+            r_size, q_size = reference_sizes[r_name], query_sizes[q_name]
+            r_start, r_end = r_size - int(r_end) + 1, r_size - int(r_start) + 1
+            q_start, q_end = q_size - int(q_end) + 1, q_size - int(q_start) + 1
+            reference_line = reverse_complement(reference_line)
+            query_line = reverse_complement(query_line)
+        header = [number, r_name, r_start, r_end, q_name, q_start, q_end, strand]
+        swapped.append(" ".join(str(field) for field in header + fields[8:]))
+        swapped.extend((reference_line, query_line, ""))
+    return "\n".join(swapped) + "\n" if swapped else ""
+
+
+def run_oriented_lastz(
+    reference_specs: FileSpec,
+    query_specs: FileSpec,
+    blastz_options: str,
+    shifts: dict[str, RangeShift | None],
+    swap: bool,
+    reference_sizes_path: str,
+    query_sizes_path: str,
+) -> str:
+    """Run LASTZ in one orientation and return reference-as-target AXT."""
+    if not swap:
+        return shift_axt_coordinates(
+            call_lastz(
+                build_lastz_command(reference_specs, query_specs, blastz_options)
+            ),
+            shifts["reference"],
+            shifts["query"],
+        )
+    axt = shift_axt_coordinates(
+        call_lastz(build_lastz_command(query_specs, reference_specs, blastz_options)),
+        shifts["query"],
+        shifts["reference"],
+    )
+    return swap_axt_orientation(axt, reference_sizes_path, query_sizes_path)
+
+
+def axt_records(axt: str) -> Counter:
+    """Count the AXT records of an output, ignoring their numbering."""
+    records: Counter = Counter()
+    lines = [
+        line for line in axt.splitlines() if line.strip() and not line.startswith("#")
+    ]
+    for index in range(0, len(lines) - 2, 3):
+        header = tuple(lines[index].split()[1:])
+        records[(header, lines[index + 1], lines[index + 2])] += 1
+    return records
+
+
+def benchmark_orientations(
+    reference_specs: FileSpec,
+    query_specs: FileSpec,
+    blastz_options: str,
+    shifts: dict[str, RangeShift | None],
+    reference_sizes_path: str,
+    query_sizes_path: str,
+    report_path: str,
+) -> str:
+    """Run both orientations, report timing and agreement; return the default."""
+    outputs = {}
+    rows: list[tuple[str, object]] = []
+    for label, swap in (("reference", False), ("swapped", True)):
+        started = time.monotonic()
+        outputs[label] = run_oriented_lastz(
+            reference_specs,
+            query_specs,
+            blastz_options,
+            shifts,
+            swap,
+            reference_sizes_path,
+            query_sizes_path,
+        )
+        rows.append((f"{label}_seconds", f"{time.monotonic() - started:.2f}"))
+    reference_records = axt_records(outputs["reference"])
+    swapped_records = axt_records(outputs["swapped"])
+    matching = sum((reference_records & swapped_records).values())
+    rows += [
+        ("reference_records", sum(reference_records.values())),
+        ("swapped_records", sum(swapped_records.values())),
+        ("matching_records", matching),
+        ("only_reference", sum(reference_records.values()) - matching),
+        ("only_swapped", sum(swapped_records.values()) - matching),
+        ("identical", str(reference_records == swapped_records).lower()),
+    ]
+    with open(report_path, "w") as report:
+        report.writelines(f"{key}\t{value}\n" for key, value in rows)
+    if reference_records != swapped_records:
+        LOGGER.warning(
+            "Swapped orientation differs: %d of %d alignments match",
+            matching,
+            sum(reference_records.values()),
+        )
+    return outputs["reference"]
+
+
+def write_sorted_psl(
     raw_output: str,
-    output_format: str,
     reference_sizes_path: str,
     query_sizes_path: str,
     axt_to_psl: str,
-) -> str:
-    """Return AXT output unchanged or convert it to PSL."""
-    if output_format == "axt":
-        return raw_output
+    out: TextIO,
+    tmp_dir: str | None,
+) -> int:
+    """Convert AXT output to PSL and write it sorted; return the record count.
 
+    axtToPsl's stdout is streamed into sort_lines, so the PSL is never held
+    as a whole: large outputs are sorted in spilled runs.
+    """
     command = [
         axt_to_psl,
         "/dev/stdin",
@@ -223,13 +573,51 @@ def make_psl_if_needed(
         "stdout",
     ]
     LOGGER.debug("Running AXT-to-PSL subprocess: %s", shlex.join(command))
-    process = subprocess.Popen(command, stdout=PIPE, stderr=PIPE, stdin=PIPE)
-    stdout_bytes, stderr_bytes = process.communicate(input=raw_output.encode())
-    stdout = stdout_bytes.decode("utf-8")
-    stderr = stderr_bytes.decode("utf-8")
+    with span("axtToPsl", f"{len(raw_output)} bytes"):
+        process = subprocess.Popen(
+            command,
+            stdout=PIPE,
+            stderr=PIPE,
+            stdin=PIPE,
+            text=True,
+            encoding="utf-8",
+        )
+        stderr_parts: list[str] = []
+
+        def feed_axt() -> None:
+            try:
+                process.stdin.write(raw_output)
+                process.stdin.close()
+            except BrokenPipeError:
+                pass  # axtToPsl exited early; its exit code reports why
+
+        feeder = threading.Thread(target=feed_axt, daemon=True)
+        drainer = threading.Thread(
+            target=lambda: stderr_parts.append(process.stderr.read()), daemon=True
+        )
+        feeder.start()
+        drainer.start()
+        records = sort_lines(process.stdout, out, tmp_dir)
+        feeder.join()
+        drainer.join()
+        process.wait()
     if process.returncode != 0:
-        raise LastzProcessError(f"axtToPsl command failed: {stderr}")
-    return stdout
+        raise LastzProcessError(f"axtToPsl command failed: {''.join(stderr_parts)}")
+    return records
+
+
+def parse_list_entries(list_path: str, content: list[str]) -> list[tuple[str, str]]:
+    """Split .lst lines into (2bit path, chromosome) entries."""
+    entries = []
+    for elem in content:
+        try:
+            path, chrom = elem.split(":")[:2]
+        except ValueError as error:
+            raise ValueError(
+                f"Malformed .lst entry {elem!r} in {list_path}: expected <path>:<chrom>"
+            ) from error
+        entries.append((path, chrom))
+    return entries
 
 
 def extract_list_to_fasta(list_path: str, tmp_dir: str) -> str:
@@ -239,29 +627,82 @@ def extract_list_to_fasta(list_path: str, tmp_dir: str) -> str:
 
     fasta_path = os.path.join(tmp_dir, f"{_gen_random_string(8)}_collapsed.fa")
     LOGGER.debug("Saving collapsed FASTA to: %s", fasta_path)
+    write_list_fasta(parse_list_entries(list_path, content), fasta_path, tmp_dir)
+    return fasta_path
+
+
+def write_list_fasta(
+    entries: list[tuple[str, str]], fasta_path: str, tmp_dir: str
+) -> None:
+    """Write the sequences of (2bit path, chromosome) entries to one FASTA file."""
     with open(fasta_path, "w") as fasta_file:
-        for elem in content:
-            try:
-                path, chrom = elem.split(":")[:2]
-            except ValueError as error:
-                raise ValueError(
-                    f"Malformed .lst entry {elem!r} in {list_path}: expected <path>:<chrom>"
-                ) from error
-            LOGGER.debug("Extracting .lst entry: %s", elem)
+        for path, chrom in entries:
+            LOGGER.debug("Extracting .lst entry: %s:%s", path, chrom)
             tmp_chrom_fa = os.path.join(tmp_dir, f"{_gen_random_string(8)}_chrom.fa")
-            command = ["twoBitToFa", f"-seq={chrom}", path, tmp_chrom_fa]
-            LOGGER.debug("Running twoBitToFa subprocess: %s", shlex.join(command))
-            result = subprocess.run(command, stderr=PIPE)
-            if result.returncode != 0:
-                raise RuntimeError(f"twoBitToFa failed: {result.stderr.decode()}")
+            run_two_bit_to_fa(path, chrom, tmp_chrom_fa)
             with open(tmp_chrom_fa) as chrom_fasta_file:
-                fasta_file.write(chrom_fasta_file.read())
+                shutil.copyfileobj(chrom_fasta_file, fasta_file)
             os.unlink(tmp_chrom_fa)
-    return fasta_path
 
 
-def parse_seq_arg(arg: str, tmp_dir: str | None) -> str:
-    """Resolve a direct sequence argument or collapse a multi-entry .lst file."""
+def twobit_fasta_size(entries: list[tuple[str, str]]) -> int:
+    """Return the FASTA byte size of (2bit path, chromosome) entries."""
+    sizes = []
+    for path in dict.fromkeys(path for path, _chrom in entries):
+        with TwoBitFile(path) as twobit:
+            sizes.extend(
+                (chrom, twobit.size(chrom)) for p, chrom in entries if p == path
+            )
+    return fasta_size(sizes)
+
+
+def stored_list_fasta(
+    store: SequenceStore,
+    leases: ExitStack,
+    list_path: str,
+    content: list[str],
+    tmp_dir: str | None,
+) -> str | None:
+    """Return the collapsed FASTA of a .lst file from the sequence store.
+
+    The key covers the identity of every member, so all tasks on a node that
+    share a BULK partition share its FASTA. Returns None if it does not fit.
+    """
+    entries = parse_list_entries(list_path, content)
+    key = make_key(
+        ["lst"] + [f"{file_identity(path)}:{chrom}" for path, chrom in entries]
+    )
+    build_dir = tmp_dir or store.root
+    return leases.enter_context(
+        store.fasta(
+            key,
+            twobit_fasta_size(entries),
+            lambda fasta_path: write_list_fasta(entries, fasta_path, build_dir),
+        )
+    )
+
+
+def open_sequence_fifo(
+    records: list[FifoRecord], tmp_dir: str, leases: ExitStack, timeout: float
+) -> str:
+    """Create a FIFO streaming records that is removed when the leases close."""
+    fifo_path = os.path.join(tmp_dir, f"{_gen_random_string(8)}_stream.fa")
+    fifo = leases.enter_context(SequenceFifo(fifo_path, records, timeout))
+    LOGGER.debug("Streaming %d sequence(s) through FIFO: %s", len(records), fifo.path)
+    return fifo.path
+
+
+def parse_seq_arg(
+    arg: str,
+    tmp_dir: str | None,
+    store: SequenceStore | None = None,
+    leases: ExitStack | None = None,
+    fifo_timeout: float | None = None,
+) -> str:
+    """Resolve a direct sequence argument or collapse a multi-entry .lst file.
+
+    With a FIFO timeout, a multi-entry .lst file is streamed through a FIFO.
+    """
     if not arg.endswith(".lst"):
         LOGGER.debug("Sequence argument is not a .lst file: %s", arg)
         return arg
@@ -272,6 +713,15 @@ def parse_seq_arg(arg: str, tmp_dir: str | None) -> str:
     if len(content) == 1:
         LOGGER.debug(".lst file contains one element: %s", content[0])
         return content[0]
+    if fifo_timeout is not None and tmp_dir is not None and leases is not None:
+        entries = parse_list_entries(arg, content)
+        records = [(path, chrom, 0, None) for path, chrom in entries]
+        return open_sequence_fifo(records, tmp_dir, leases, fifo_timeout)
+    if store is not None and leases is not None:
+        stored_path = stored_list_fasta(store, leases, arg, content, tmp_dir)
+        if stored_path:
+            LOGGER.debug("Resolved .lst through the sequence store: %s", stored_path)
+            return stored_path
     if tmp_dir is None:
         raise RuntimeError("A temporary workspace is required to collapse a .lst file")
     return extract_list_to_fasta(arg, tmp_dir)
@@ -331,16 +781,42 @@ def missing_twobit_message(
     )
 
 
+def run_two_bit_to_fa(two_bit_path: str, chrom: str, fasta_path: str) -> None:
+    """Extract one chromosome of a .2bit file to FASTA with twoBitToFa."""
+    command = ["twoBitToFa", f"-seq={chrom}", two_bit_path, fasta_path]
+    LOGGER.debug("Running twoBitToFa subprocess: %s", shlex.join(command))
+    with span("twoBitToFa", chrom):
+        result = subprocess.run(command, stderr=PIPE)
+    if result.returncode != 0:
+        raise RuntimeError(f"twoBitToFa failed: {result.stderr.decode()}")
+
+
 def extract_chrom_to_fasta(
     two_bit_path: str,
     chrom: str,
     shared_chrom_dir: str | None = None,
+    store: SequenceStore | None = None,
+    leases: ExitStack | None = None,
 ) -> str:
     """Return a cached one-chromosome FASTA extracted from a v1 .2bit file."""
     shared_path = get_shared_chrom_fasta(shared_chrom_dir, chrom)
     if shared_path:
         return shared_path
 
+    if store is not None and leases is not None:
+        with TwoBitFile(two_bit_path) as twobit:
+            size_hint = fasta_size([(chrom, twobit.size(chrom))])
+        stored_path = leases.enter_context(
+            store.fasta(
+                make_key(["chrom", file_identity(two_bit_path), chrom]),
+                size_hint,
+                lambda fasta_path: run_two_bit_to_fa(two_bit_path, chrom, fasta_path),
+            )
+        )
+        if stored_path:
+            LOGGER.debug("Using sequence store chromosome FASTA: %s", stored_path)
+            return stored_path
+
     cache_dir = os.path.abspath("./_v1_chrom_cache")
     os.makedirs(cache_dir, exist_ok=True)
     fasta_path = os.path.join(cache_dir, f"{os.path.basename(two_bit_path)}_{chrom}.fa")
@@ -348,11 +824,7 @@ def extract_chrom_to_fasta(
         LOGGER.debug("Using task-local chromosome FASTA cache: %s", fasta_path)
         return fasta_path
 
-    command = ["twoBitToFa", f"-seq={chrom}", two_bit_path, fasta_path]
-    LOGGER.debug("Running twoBitToFa subprocess: %s", shlex.join(command))
-    result = subprocess.run(command, stderr=PIPE)
-    if result.returncode != 0:
-        raise RuntimeError(f"twoBitToFa failed: {result.stderr.decode()}")
+    run_two_bit_to_fa(two_bit_path, chrom, fasta_path)
     return fasta_path
 
 
@@ -369,15 +841,36 @@ def main(argv: Sequence[str] | None = None) -> None:
     temp_parent = args.temp_dir or get_optional_string_param(
         pipeline_params, "temp_dir"
     )
+    fifo_timeout = get_fifo_timeout(pipeline_params)
+    orientation = get_orientation(pipeline_params)
+    if args.orientation_benchmark and fifo_timeout is not None:
+        raise ValueError(
+            "--orientation_benchmark runs LASTZ twice and cannot read FIFOs; "
+            "disable seq_fifo"
+        )
+    store = None if fifo_timeout is not None else open_sequence_store(pipeline_params)
+    if fifo_timeout is not None:
+        exit_on_sigterm()
     tmp_dir: str | None = None
+    leases = ExitStack()
+    shifts: dict[str, RangeShift | None] = {"reference": None, "query": None}
 
     try:
         if check_temp_is_needed(args.reference, args.query):
             tmp_dir = get_temp_dir(temp_parent)
         LOGGER.debug("Temporary workspace: %s", tmp_dir)
 
-        reference_specs = parse_file_spec(parse_seq_arg(args.reference, tmp_dir))
-        query_specs = parse_file_spec(parse_seq_arg(args.query, tmp_dir))
+        # Decided on the arguments: once resolved, BULK lists are FASTA files.
+        swap = orientation == "auto" and choose_swap(
+            sequence_content(args.reference), sequence_content(args.query)
+        )
+
+        reference_specs = parse_file_spec(
+            parse_seq_arg(args.reference, tmp_dir, store, leases, fifo_timeout)
+        )
+        query_specs = parse_file_spec(
+            parse_seq_arg(args.query, tmp_dir, store, leases, fifo_timeout)
+        )
         LOGGER.debug("Reference specs: %s", reference_specs)
         LOGGER.debug("Query specs: %s", query_specs)
 
@@ -419,9 +912,22 @@ def main(argv: Sequence[str] | None = None) -> None:
                 continue
             if tmp_dir is None:
                 tmp_dir = get_temp_dir(temp_parent)
-            fasta_path = extract_chrom_to_fasta(path, chrom, chrom_dirs[label])
-            LOGGER.debug("Resolved v1 %s chromosome to FASTA: %s", label, fasta_path)
-            resolved_specs = (fasta_path, chrom, start, end)
+            if fifo_timeout is not None:
+                with TwoBitFile(path) as twobit:
+                    size = twobit.size(chrom)
+                fifo_path = open_sequence_fifo(
+                    [(path, chrom, start, end)], tmp_dir, leases, fifo_timeout
+                )
+                shifts[label] = (start, end, size)
+                resolved_specs = (fifo_path, None, None, None)
+            else:
+                fasta_path = extract_chrom_to_fasta(
+                    path, chrom, chrom_dirs[label], store, leases
+                )
+                LOGGER.debug(
+                    "Resolved v1 %s chromosome to FASTA: %s", label, fasta_path
+                )
+                resolved_specs = (fasta_path, chrom, start, end)
             if label == "reference":
                 reference_specs = resolved_specs
             else:
@@ -430,28 +936,51 @@ def main(argv: Sequence[str] | None = None) -> None:
         define_if_not(pipeline_params, "lastz_h", 2000)
         blastz_options = get_blastz_params(pipeline_params)
         LOGGER.debug("LASTZ options: %s", blastz_options)
-        lastz_output = call_lastz(
-            build_lastz_command(reference_specs, query_specs, blastz_options)
-        )
-
-        if check_if_output_is_non_empty(lastz_output):
-            output_to_save = make_psl_if_needed(
-                lastz_output,
-                args.output_format,
+        if args.orientation_benchmark:
+            lastz_output = benchmark_orientations(
+                reference_specs,
+                query_specs,
+                blastz_options,
+                shifts,
                 reference_sizes_path,
                 query_sizes_path,
-                args.axt_to_psl,
+                args.orientation_benchmark,
             )
+        else:
+            lastz_output = run_oriented_lastz(
+                reference_specs,
+                query_specs,
+                blastz_options,
+                shifts,
+                swap,
+                reference_sizes_path,
+                query_sizes_path,
+            )
+        # Every FIFO has been read; a writer failure means truncated input.
+        leases.close()
+
+        if check_if_output_is_non_empty(lastz_output):
             LOGGER.debug("Appending alignment output to: %s", args.output)
             with open(args.output, "a") as output_file:
-                output_file.write(output_to_save)
+                if args.output_format == "psl":
+                    write_sorted_psl(
+                        lastz_output,
+                        reference_sizes_path,
+                        query_sizes_path,
+                        args.axt_to_psl,
+                        output_file,
+                        tmp_dir or temp_parent,
+                    )
+                else:
+                    output_file.write(lastz_output)
         else:
             LOGGER.debug("LASTZ output contains no alignment records; no file written")
     finally:
+        leases.close()
         if tmp_dir and os.path.isdir(tmp_dir):
             LOGGER.debug("Removing temporary workspace: %s", tmp_dir)
             shutil.rmtree(tmp_dir)
 
 
 if __name__ == "__main__":
-    main()
+    run_main(main)
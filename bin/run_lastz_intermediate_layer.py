@@ -1,14 +1,30 @@
 #!/usr/bin/env python3
-"""Expand LASTZ BULK partitions and invoke the single-alignment wrapper."""
+"""Expand LASTZ BULK partitions and invoke the single-alignment wrapper.
+
+Every finished reference-query interval is recorded in a completion journal
+next to the output file. Each interval is first written to a private part
+file and only appended to the shared output once it is complete, so a task
+that is re-executed in the same directory (for example after preemption)
+truncates any uncommitted bytes, skips journaled intervals, and resumes with
+the first unfinished one.
+
+For PSL output, each interval is already sorted by target (run_lastz.py);
+once every interval is committed, the sorted segments are k-way merged so the
+task output is sorted as a whole, and a final journal row marks it as such.
+"""
 
 import argparse
 import json
 import logging
 import os
 import shlex
+import shutil
 import subprocess
 from itertools import product
-from typing import Sequence
+from typing import Sequence, TextIO
+
+from profiling import run_main, span
+from psl_merge_sorted import merge_sources
 
 LOGGER = logging.getLogger("run_lastz_intermediate_layer")
 
@@ -16,7 +32,14 @@ __author__ = "Alejandro Gonzales-Irribarren"
 __credits__ = ["Bogdan M. Kirilenko, Nil Tianchen Mu"]
 __email__ = "alejandrxgzi@gmail.com"
 __github__ = "https://github.com/hillerlab/make_lastz_chains"
-__version__ = "0.0.2"
+__version__ = "0.0.5"
+
+JOURNAL_SUFFIX = ".journal"
+PART_SUFFIX = ".part"
+JOURNAL_HEADER_TAG = "#journal"
+JOURNAL_SORTED_TAG = "#sorted"
+SORTED_SUFFIX = ".sorted"
+BULK_MANIFEST_PREFIX = "@"
 
 PipelineParams = dict[str, object]
 
@@ -115,11 +138,29 @@ def parse_args(argv: Sequence[str] | None = None) -> argparse.Namespace:
         default=None,
         help="Optional directory of pre-extracted <chrom>.fa files for the query genome",
     )
+    app.add_argument(
+        "--journal",
+        default=None,
+        help="Completion journal path (default: <output>.journal)",
+    )
     return app.parse_args(argv)
 
 
+def read_bulk_manifest(path: str) -> list[str]:
+    """Read the scaffold names of a BULK manifest written by partition.py."""
+    with open(path) as manifest:
+        chroms = [line.strip() for line in manifest if line.strip()]
+    if not chroms:
+        raise ValueError(f"BULK manifest {path!r} lists no chromosomes")
+    return chroms
+
+
 def get_intervals_list(to_align_arg: str, chrom_sizes: dict[str, int]) -> list[str]:
-    """Expand a BULK partition into ranged chromosome arguments."""
+    """Expand a BULK partition into ranged chromosome arguments.
+
+    The chromosomes are listed in the partition string itself or, for
+    "BULK_<n>:<2bit>:@<manifest>", in a manifest file relative to the cwd.
+    """
     if not to_align_arg.startswith("BULK"):
         return [to_align_arg]
 
@@ -131,8 +172,11 @@ def get_intervals_list(to_align_arg: str, chrom_sizes: dict[str, int]) -> list[s
         )
 
     two_bit_path = arg_parts[1]
+    chroms = arg_parts[2:]
+    if len(chroms) == 1 and chroms[0].startswith(BULK_MANIFEST_PREFIX):
+        chroms = read_bulk_manifest(chroms[0][len(BULK_MANIFEST_PREFIX) :])
     intervals: list[str] = []
-    for chrom in arg_parts[2:]:
+    for chrom in chroms:
         try:
             end = chrom_sizes[chrom]
         except KeyError as error:
@@ -149,6 +193,7 @@ def build_lastz_command(
     reference_arg: str,
     query_arg: str,
     params_json_path: str,
+    output_path: str,
 ) -> list[str]:
     """Build one run_lastz.py subprocess command."""
     command = [
@@ -160,7 +205,7 @@ def build_lastz_command(
         "--params_json",
         params_json_path,
         "--output",
-        args.output,
+        output_path,
         "--output_format",
         args.output_format,
         "--axt_to_psl",
@@ -181,7 +226,8 @@ def run_lastz_command(command: list[str]) -> None:
     """Run one child wrapper and fail immediately if it exits non-zero."""
     LOGGER.debug("Running subprocess: %s", shlex.join(command))
     try:
-        subprocess.run(command, check=True)
+        with span("run_lastz.py", f"{command[2]} {command[4]}"):
+            subprocess.run(command, check=True)
     except subprocess.CalledProcessError as error:
         raise RuntimeError(
             f"run_lastz.py subprocess failed with exit code {error.returncode}: "
@@ -189,6 +235,170 @@ def run_lastz_command(command: list[str]) -> None:
         ) from error
 
 
+def interval_key(reference_arg: str, query_arg: str) -> str:
+    """Return the journal key identifying one reference-query interval."""
+    return f"{reference_arg}\t{query_arg}"
+
+
+def journal_header(reference: str, query: str) -> str:
+    """Return the header line binding a journal to its task partitions."""
+    return f"{JOURNAL_HEADER_TAG}\t{reference}\t{query}\n"
+
+
+def read_journal(
+    journal_path: str, reference: str, query: str
+) -> tuple[set[str], list[int], bool, int]:
+    """Return completed interval keys, committed segment ends, sorted flag and
+    the byte offset where the last complete journal line ends.
+
+    A trailing line without a newline is the remnant of an interrupted
+    commit and is ignored, so the interval it describes is run again;
+    open_journal cuts it off at the returned offset. The last segment end is
+    the committed output size.
+    """
+    completed: set[str] = set()
+    segment_ends: list[int] = []
+    if not os.path.exists(journal_path):
+        return completed, segment_ends, False, 0
+
+    with open(journal_path, "rb") as journal_file:
+        lines = journal_file.read().decode().splitlines(keepends=True)
+    header = journal_header(reference, query)
+    if not lines or (not lines[0].endswith("\n") and header.startswith(lines[0])):
+        # Empty, or only a torn header: nothing was committed yet.
+        return completed, segment_ends, False, 0
+    if lines[0] != header:
+        raise ValueError(
+            f"Journal {journal_path} belongs to a different task: "
+            f"expected partitions {reference!r} x {query!r}"
+        )
+
+    valid_end = len(lines[0].encode())
+    for line_number, line in enumerate(lines[1:], start=2):
+        if not line.endswith("\n"):
+            LOGGER.debug("Ignoring torn journal line %d: %r", line_number, line)
+            break
+        if line.startswith(JOURNAL_SORTED_TAG):
+            return completed, segment_ends, True, valid_end + len(line.encode())
+        fields = line.rstrip("\n").split("\t")
+        if len(fields) != 3:
+            raise ValueError(
+                f"Malformed journal row {line_number} in {journal_path}: "
+                f"expected 3 tab-separated fields, got {len(fields)}"
+            )
+        offset, reference_arg, query_arg = fields
+        segment_ends.append(int(offset))
+        completed.add(interval_key(reference_arg, query_arg))
+        valid_end += len(line.encode())
+    return completed, segment_ends, False, valid_end
+
+
+def restore_committed_output(output_path: str, committed_size: int) -> None:
+    """Truncate output bytes appended after the last journaled interval."""
+    if not os.path.exists(output_path):
+        if committed_size:
+            raise RuntimeError(
+                f"Journal records {committed_size} committed bytes but "
+                f"{output_path} is missing; cannot resume"
+            )
+        return
+    current_size = os.path.getsize(output_path)
+    if current_size < committed_size:
+        raise RuntimeError(
+            f"{output_path} is shorter ({current_size} bytes) than its journal "
+            f"records ({committed_size} bytes); cannot resume"
+        )
+    if current_size > committed_size:
+        LOGGER.debug(
+            "Discarding %d uncommitted byte(s) from %s",
+            current_size - committed_size,
+            output_path,
+        )
+        with open(output_path, "r+b") as output_file:
+            output_file.truncate(committed_size)
+
+
+def open_journal(
+    journal_path: str, reference: str, query: str, valid_end: int
+) -> TextIO:
+    """Open the journal for appending after its last complete line.
+
+    A torn trailing line is cut off first so the next row starts on a line of
+    its own; a journal without a complete header is started afresh.
+    """
+    if os.path.exists(journal_path) and os.path.getsize(journal_path) > valid_end:
+        LOGGER.debug(
+            "Truncating %s to its last complete line (%d bytes)",
+            journal_path,
+            valid_end,
+        )
+        with open(journal_path, "r+b") as torn_file:
+            torn_file.truncate(valid_end)
+            torn_file.flush()
+            os.fsync(torn_file.fileno())
+    journal_file = open(journal_path, "a")
+    if valid_end == 0:
+        journal_file.write(journal_header(reference, query))
+        journal_file.flush()
+        os.fsync(journal_file.fileno())
+    return journal_file
+
+
+def commit_interval(
+    output_path: str, part_path: str, journal_file: TextIO, key: str
+) -> int:
+    """Append one finished interval to the output, journal it, return its end."""
+    if os.path.exists(part_path):
+        with open(part_path, "rb") as part_file, open(output_path, "ab") as output_file:
+            shutil.copyfileobj(part_file, output_file)
+            output_file.flush()
+            os.fsync(output_file.fileno())
+        os.unlink(part_path)
+    committed_size = os.path.getsize(output_path) if os.path.exists(output_path) else 0
+    journal_file.write(f"{committed_size}\t{key}\n")
+    journal_file.flush()
+    os.fsync(journal_file.fileno())
+    return committed_size
+
+
+def sort_committed_output(
+    output_path: str,
+    segment_ends: list[int],
+    journal_file: TextIO,
+    tmp_dir: str | None,
+) -> None:
+    """Merge the sorted per-interval segments of the output into one order.
+
+    The sorted tag is journaled before the merged file replaces the output,
+    so a re-execution never merges the reordered file again; it only finishes
+    a pending replace (see finish_sorted_output).
+    """
+    bounds = [0] + segment_ends
+    sources = [
+        (output_path, start, end)
+        for start, end in zip(bounds, bounds[1:])
+        if end > start
+    ]
+    if len(sources) > 1:
+        LOGGER.debug("Merging %d sorted segments of %s", len(sources), output_path)
+        sorted_path = f"{output_path}{SORTED_SUFFIX}"
+        with open(sorted_path, "w") as sorted_file:
+            merge_sources(sources, sorted_file, tmp_dir)
+            sorted_file.flush()
+            os.fsync(sorted_file.fileno())
+    journal_file.write(f"{JOURNAL_SORTED_TAG}\n")
+    journal_file.flush()
+    os.fsync(journal_file.fileno())
+    finish_sorted_output(output_path)
+
+
+def finish_sorted_output(output_path: str) -> None:
+    """Move a merged output left behind by an interrupted task into place."""
+    sorted_path = f"{output_path}{SORTED_SUFFIX}"
+    if os.path.exists(sorted_path):
+        os.replace(sorted_path, output_path)
+
+
 def main(argv: Sequence[str] | None = None) -> None:
     """Expand input partitions and run every reference-query combination."""
     args = parse_args(argv)
@@ -212,10 +422,49 @@ def main(argv: Sequence[str] | None = None) -> None:
         len(query_coordinates),
     )
 
-    for reference_arg, query_arg in product(reference_coordinates, query_coordinates):
-        command = build_lastz_command(args, reference_arg, query_arg, params_json_path)
-        run_lastz_command(command)
+    journal_path = args.journal or f"{args.output}{JOURNAL_SUFFIX}"
+    part_path = f"{args.output}{PART_SUFFIX}"
+    completed, segment_ends, is_sorted, journal_end = read_journal(
+        journal_path, args.reference, args.query
+    )
+    if is_sorted:
+        LOGGER.debug("%s is complete and sorted; nothing to do", args.output)
+        finish_sorted_output(args.output)
+        return
+    restore_committed_output(args.output, segment_ends[-1] if segment_ends else 0)
+    if completed:
+        LOGGER.debug(
+            "Resuming from %s: %d interval(s) already complete",
+            journal_path,
+            len(completed),
+        )
+
+    with open_journal(
+        journal_path, args.reference, args.query, journal_end
+    ) as journal_file:
+        for reference_arg, query_arg in product(
+            reference_coordinates, query_coordinates
+        ):
+            key = interval_key(reference_arg, query_arg)
+            if key in completed:
+                LOGGER.debug(
+                    "Skipping journaled interval: %s x %s", reference_arg, query_arg
+                )
+                continue
+            if os.path.exists(part_path):
+                os.unlink(part_path)
+            command = build_lastz_command(
+                args, reference_arg, query_arg, params_json_path, part_path
+            )
+            run_lastz_command(command)
+            segment_ends.append(
+                commit_interval(args.output, part_path, journal_file, key)
+            )
+        if args.output_format == "psl":
+            sort_committed_output(
+                args.output, segment_ends, journal_file, args.temp_dir
+            )
 
 
 if __name__ == "__main__":
-    main()
+    run_main(main)
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""Run a pack of LASTZ partition pairs inside one multi-core task.
+
+Each pair is handed to run_lastz_intermediate_layer.py exactly as a single
+LASTZ task would do, with its own output file and completion journal. Pairs
+are ordered by reference partition so that concurrently running pairs share
+the same reference chunk in the page cache, and are started only while both a
+CPU slot and the estimated memory for the pair are available.
+
+Every finished pair is appended to the done manifest (--done) as
+"<reference_part>\t<query_part>\t<output>", which the pipeline uses to route
+outputs to reference buckets and to count completed pairs.
+"""
+
+import argparse
+import logging
+import os
+import shlex
+import subprocess
+import sys
+import threading
+import time
+from typing import Sequence
+
+from profiling import run_main, span
+from run_lastz_intermediate_layer import (
+    get_intervals_list,
+    read_chrom_sizes,
+    read_json_file,
+    require_string_param,
+)
+
+__author__ = "Alejandro Gonzales-Irribarren"
+__credits__ = ["Bogdan M. Kirilenko, Nil Tianchen Mu"]
+__email__ = "alejandrxgzi@gmail.com"
+__github__ = "https://github.com/hillerlab/make_lastz_chains"
+__version__ = "0.0.1"
+
+
+LOGGER = logging.getLogger("run_lastz_packed")
+
+# Rough LASTZ footprint: the target is indexed (seed positions), the query is
+# only held as sequence. Used for admission control, not as a hard limit.
+PAIR_BASE_BYTES = 256 * 1024**2
+BYTES_PER_REFERENCE_BASE = 8
+BYTES_PER_QUERY_BASE = 2
+# Bulk partitions are filled up to this fraction of the chunk size (partition.py).
+BULK_FILL_FRACTION = 0.75
+
+Pair = tuple[str, str]
+
+
+def configure_logging(verbose: bool) -> None:
+    """Log per-pair progress to stderr; add subprocess detail when verbose."""
+    logging.basicConfig(format="%(levelname)s %(name)s: %(message)s")
+    LOGGER.setLevel(logging.DEBUG if verbose else logging.INFO)
+
+
+def parse_args(argv: Sequence[str] | None = None) -> argparse.Namespace:
+    """Parse the packed LASTZ command-line interface."""
+    app = argparse.ArgumentParser()
+    app.add_argument(
+        "--pairs",
+        required=True,
+        help="TSV of <reference_part>\\t<query_part>, one pair per line",
+    )
+    app.add_argument(
+        "--params_json", required=True, help="Pipeline configuration JSON file"
+    )
+    app.add_argument(
+        "--done",
+        default="packed_pairs.tsv",
+        help="Manifest of finished pairs (default: packed_pairs.tsv)",
+    )
+    app.add_argument(
+        "--threads", type=int, default=1, help="Maximum concurrently running pairs"
+    )
+    app.add_argument(
+        "--max_memory",
+        type=int,
+        default=0,
+        help="Memory budget in bytes for concurrently running pairs (0: unlimited)",
+    )
+    app.add_argument(
+        "--intermediate_script",
+        default="run_lastz_intermediate_layer.py",
+        help="Path to run_lastz_intermediate_layer.py",
+    )
+    app.add_argument(
+        "--run_lastz_script", default="run_lastz.py", help="Path to run_lastz.py"
+    )
+    app.add_argument("--output_format", default="psl", choices=["psl", "axt"])
+    app.add_argument("--reference_chrom_dir", default=None)
+    app.add_argument("--query_chrom_dir", default=None)
+    app.add_argument("--verbose", "-v", action="store_true")
+    return app.parse_args(argv)
+
+
+def read_pairs(path: str) -> list[Pair]:
+    """Read partition pairs and order them by reference, then query partition."""
+    pairs: list[Pair] = []
+    with open(path) as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            fields = line.split("\t")
+            if len(fields) != 2:
+                raise ValueError(
+                    f"Malformed pair on line {line_number} of {path}: "
+                    f"expected 2 tab-separated fields, got {len(fields)}"
+                )
+            pairs.append((fields[0], fields[1]))
+    return sorted(pairs)
+
+
+def output_name(reference_part: str, query_part: str, output_format: str) -> str:
+    """Return the per-pair output file name used by the LASTZ module.
+
+    BULK partitions are named by their bulk id; regular partitions by
+    "<chrom>_<start>-<end>".
+    """
+
+    def safe_part(part: str) -> str:
+        fields = part.split(":")
+        if part.startswith("BULK"):
+            return fields[0]
+        return f"{fields[1]}_{fields[2]}"
+
+    return f"{safe_part(reference_part)}__{safe_part(query_part)}.{output_format}"
+
+
+def partition_bases(
+    part: str, chrom_sizes: dict[str, int], chunk_size: int | None = None
+) -> int:
+    """Return the number of bases covered by a partition string.
+
+    BULK members (inline or in a manifest) are summed from chrom_sizes. With
+    chunk_size, a BULK that cannot be resolved is estimated as a full bulk
+    instead, as nextflow.config does for every BULK.
+    """
+    try:
+        intervals = get_intervals_list(part, chrom_sizes)
+    except (OSError, ValueError):
+        if chunk_size is None or not part.startswith("BULK"):
+            raise
+        return int(chunk_size * BULK_FILL_FRACTION)
+    total = 0
+    for interval in intervals:
+        start, end = interval.rsplit(":", 1)[1].split("-")
+        total += int(end) - int(start)
+    return total
+
+
+def estimate_pair_memory(reference_bases: int, query_bases: int) -> int:
+    """Estimate the peak memory of one LASTZ pair in bytes."""
+    return (
+        PAIR_BASE_BYTES
+        + reference_bases * BYTES_PER_REFERENCE_BASE
+        + query_bases * BYTES_PER_QUERY_BASE
+    )
+
+
+def build_pair_command(
+    args: argparse.Namespace, pair: Pair, params_json_path: str, output_path: str
+) -> list[str]:
+    """Build the intermediate-layer command for one pair."""
+    command = [
+        args.intermediate_script,
+        "--reference",
+        pair[0],
+        "--query",
+        pair[1],
+        "--params_json",
+        params_json_path,
+        "--output",
+        output_path,
+        "--run_lastz_script",
+        args.run_lastz_script,
+        "--output_format",
+        args.output_format,
+    ]
+    if args.reference_chrom_dir:
+        command.extend(["--reference_chrom_dir", args.reference_chrom_dir])
+    if args.query_chrom_dir:
+        command.extend(["--query_chrom_dir", args.query_chrom_dir])
+    if args.verbose:
+        command.append("--verbose")
+    return command
+
+
+class PackScheduler:
+    """Admit pairs while a CPU slot and their estimated memory are free."""
+
+    def __init__(self, threads: int, max_memory: int) -> None:
+        self.threads = max(1, threads)
+        self.max_memory = max_memory
+        self.running = 0
+        self.memory_in_use = 0
+        self.failed: list[Pair] = []
+        self._cond = threading.Condition()
+
+    def acquire(self, memory: int) -> bool:
+        """Block until the pair fits; return False once a pair has failed.
+
+        A pair larger than the whole budget is still admitted when nothing
+        else runs, so oversized pairs degrade to serial execution.
+        """
+        with self._cond:
+            while not self.failed and not self._fits(memory):
+                self._cond.wait()
+            if self.failed:
+                return False
+            self.running += 1
+            self.memory_in_use += memory
+            return True
+
+    def release(self, memory: int, failed_pair: Pair | None = None) -> None:
+        """Return a pair's slot and memory reservation."""
+        with self._cond:
+            self.running -= 1
+            self.memory_in_use -= memory
+            if failed_pair is not None:
+                self.failed.append(failed_pair)
+            self._cond.notify_all()
+
+    def wait_idle(self) -> None:
+        """Block until every admitted pair has finished."""
+        with self._cond:
+            while self.running:
+                self._cond.wait()
+
+    def _fits(self, memory: int) -> bool:
+        if self.running >= self.threads:
+            return False
+        if self.max_memory <= 0 or self.running == 0:
+            return True
+        return self.memory_in_use + memory <= self.max_memory
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    """Run all pairs of the pack and record each finished one."""
+    args = parse_args(argv)
+    configure_logging(args.verbose)
+    params_json_path = os.path.abspath(args.params_json)
+    pipeline_params = read_json_file(params_json_path)
+    reference_chrom_sizes = read_chrom_sizes(
+        require_string_param(pipeline_params, "seq_1_len")
+    )
+    query_chrom_sizes = read_chrom_sizes(
+        require_string_param(pipeline_params, "seq_2_len")
+    )
+
+    pairs = read_pairs(args.pairs)
+    LOGGER.info(
+        "Running %d pair(s) with up to %d concurrent, memory budget %s",
+        len(pairs),
+        args.threads,
+        f"{args.max_memory / 1024**3:.1f} GB" if args.max_memory > 0 else "unlimited",
+    )
+
+    scheduler = PackScheduler(args.threads, args.max_memory)
+    done_lock = threading.Lock()
+    started = time.monotonic()
+
+    with open(args.done, "w") as done_file:
+
+        def run_pair(pair: Pair, memory: int) -> None:
+            output_path = output_name(pair[0], pair[1], args.output_format)
+            command = build_pair_command(args, pair, params_json_path, output_path)
+            LOGGER.debug("Running subprocess: %s", shlex.join(command))
+            failed_pair = None
+            pair_started = time.monotonic()
+            try:
+                with span("run_lastz_intermediate_layer", f"{pair[0]} {pair[1]}"):
+                    result = subprocess.run(command)
+                if result.returncode != 0:
+                    LOGGER.error(
+                        "Pair %s vs %s failed with exit code %d",
+                        pair[0],
+                        pair[1],
+                        result.returncode,
+                    )
+                    failed_pair = pair
+                else:
+                    with done_lock:
+                        done_file.write(f"{pair[0]}\t{pair[1]}\t{output_path}\n")
+                        done_file.flush()
+                    LOGGER.info(
+                        "Finished %s in %.0f s",
+                        output_path,
+                        time.monotonic() - pair_started,
+                    )
+            except OSError as error:
+                LOGGER.error("Could not start pair %s vs %s: %s", *pair, error)
+                failed_pair = pair
+            finally:
+                scheduler.release(memory, failed_pair)
+
+        for pair in pairs:
+            memory = estimate_pair_memory(
+                partition_bases(pair[0], reference_chrom_sizes),
+                partition_bases(pair[1], query_chrom_sizes),
+            )
+            if not scheduler.acquire(memory):
+                break
+            threading.Thread(target=run_pair, args=(pair, memory)).start()
+        scheduler.wait_idle()
+
+    if scheduler.failed:
+        failed = ", ".join(f"{ref} vs {qry}" for ref, qry in scheduler.failed)
+        LOGGER.error("Packed LASTZ task failed: %s", failed)
+        sys.exit(1)
+    LOGGER.info(
+        "All %d pair(s) finished in %.0f s", len(pairs), time.monotonic() - started
+    )
+
+
+if __name__ == "__main__":
+    run_main(main)
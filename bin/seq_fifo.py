@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""Stream decoded .2bit sequences to a reader through a named pipe (FIFO).
+
+lastz cannot read v1 .2bit files and takes one file per side, so v1
+chromosome ranges and multi-scaffold BULK lists used to be written out as
+FASTA first. A SequenceFifo instead decodes the requested ranges with the
+pure-Python reader in twobit.py and writes them as FASTA into a FIFO that
+lastz opens like a regular file; no sequence data reaches the disk.
+
+A writer thread waits for the reader, streams the records once and removes
+the FIFO. When no reader opens it within the open timeout the writer gives
+up and removes the FIFO, so lastz fails instead of hanging; a reader that
+stops early only ends the stream. Closing the SequenceFifo (also on errors)
+stops the writer, removes the FIFO and re-raises a writer failure.
+
+Usage (debugging; serves one reader, e.g. `lastz target.2bit ref.fa`):
+    seq_fifo.py --fifo ref.fa --twobit genome.2bit --seq chr1:0-1000000
+"""
+
+import argparse
+import errno
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Sequence
+
+from profiling import run_main, span
+from seq_store import FASTA_LINE_WIDTH
+from twobit import TwoBitFile
+
+LOGGER = logging.getLogger("seq_fifo")
+
+# Bases decoded per read; a multiple of the FASTA line width.
+DECODE_WINDOW: int = 1_000_000
+OPEN_POLL_SECONDS: float = 0.05
+DEFAULT_OPEN_TIMEOUT: float = 600.0
+
+# (2bit path, sequence name, start, end); end None means the whole sequence
+FifoRecord = tuple[str, str, int, int | None]
+
+
+def configure_logging(verbose: bool) -> None:
+    """Enable concise stderr diagnostics when verbose logging is requested."""
+    logging.basicConfig(format="%(levelname)s %(name)s: %(message)s")
+    LOGGER.setLevel(logging.DEBUG if verbose else logging.WARNING)
+
+
+def write_records(handle, records: Sequence[FifoRecord]) -> int:
+    """Write records as FASTA, decoding one window at a time; return bases."""
+    written = 0
+    twobits: dict[str, TwoBitFile] = {}
+    try:
+        for path, name, start, end in records:
+            twobit = twobits.get(path)
+            if twobit is None:
+                twobit = twobits[path] = TwoBitFile(path)
+            stop = twobit.size(name) if end is None else end
+            handle.write(f">{name}\n".encode())
+            for window_start in range(start, stop, DECODE_WINDOW):
+                sequence = twobit.read(
+                    name, window_start, min(window_start + DECODE_WINDOW, stop)
+                )
+                lines = [
+                    sequence[i : i + FASTA_LINE_WIDTH]
+                    for i in range(0, len(sequence), FASTA_LINE_WIDTH)
+                ]
+                handle.write(("\n".join(lines) + "\n").encode())
+                written += len(sequence)
+    finally:
+        for twobit in twobits.values():
+            twobit.close()
+    return written
+
+
+class SequenceFifo:
+    """A FIFO that streams decoded .2bit records to the first reader opening it."""
+
+    def __init__(
+        self,
+        path: str,
+        records: Sequence[FifoRecord],
+        open_timeout: float = DEFAULT_OPEN_TIMEOUT,
+    ) -> None:
+        self.path = path
+        self.records = list(records)
+        self.open_timeout = open_timeout
+        self.bases = 0
+        self.error: BaseException | None = None
+        self._stop = threading.Event()
+        os.mkfifo(path)
+        self._thread = threading.Thread(
+            target=self._serve, name=f"fifo:{os.path.basename(path)}", daemon=True
+        )
+        self._thread.start()
+
+    def __enter__(self) -> "SequenceFifo":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def _open_writer(self) -> int | None:
+        """Wait for a reader; return the write descriptor, or None when stopped."""
+        deadline = time.monotonic() + self.open_timeout
+        while not self._stop.is_set():
+            try:
+                return os.open(self.path, os.O_WRONLY | os.O_NONBLOCK)
+            except OSError as error:
+                if error.errno != errno.ENXIO:
+                    raise
+            if time.monotonic() > deadline:
+                raise TimeoutError(
+                    f"No reader opened {self.path} within {self.open_timeout:g} s"
+                )
+            self._stop.wait(OPEN_POLL_SECONDS)
+        return None
+
+    def _serve(self) -> None:
+        try:
+            descriptor = self._open_writer()
+            if descriptor is None:
+                return
+            os.set_blocking(descriptor, True)
+            try:
+                with os.fdopen(descriptor, "wb") as handle:
+                    with span("fifo", os.path.basename(self.path)):
+                        self.bases = write_records(handle, self.records)
+                LOGGER.debug("Streamed %d bases into %s", self.bases, self.path)
+            except BrokenPipeError:
+                LOGGER.debug("Reader closed %s before the end", self.path)
+        except BaseException as error:  # re-raised by close()
+            self.error = error
+        finally:
+            self._remove()
+
+    def _remove(self) -> None:
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    def wait(self) -> None:
+        """Block until the writer has finished or given up."""
+        self._thread.join()
+
+    def close(self) -> None:
+        """Stop the writer, remove the FIFO and re-raise a writer failure."""
+        self._stop.set()
+        self._remove()
+        self._thread.join(timeout=1.0)
+        if self.error is not None:
+            raise self.error
+
+
+def parse_seq(value: str) -> tuple[str, int, int | None]:
+    """Parse NAME or NAME:START-END."""
+    name, _sep, interval = value.partition(":")
+    if not interval:
+        return name, 0, None
+    start, end = (int(bound) for bound in interval.split("-"))
+    return name, start, end
+
+
+def parse_args(argv: Sequence[str] | None = None) -> argparse.Namespace:
+    """Parse the FIFO debugging command line."""
+    app = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    app.add_argument("--fifo", required=True, help="FIFO path to create")
+    app.add_argument("--twobit", required=True, help=".2bit file (v0 or v1)")
+    app.add_argument(
+        "--seq",
+        action="append",
+        required=True,
+        help="Sequence NAME or NAME:START-END (repeatable)",
+    )
+    app.add_argument(
+        "--open_timeout",
+        type=float,
+        default=DEFAULT_OPEN_TIMEOUT,
+        help="Seconds to wait for a reader",
+    )
+    app.add_argument("--verbose", "-v", action="store_true", help="Debug logging")
+    if argv is None and len(sys.argv) < 2:
+        app.print_help()
+        sys.exit(1)
+    return app.parse_args(argv)
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    """Serve the requested sequences to one reader of a FIFO."""
+    args = parse_args(argv)
+    configure_logging(args.verbose)
+    records = [(args.twobit, *parse_seq(seq)) for seq in args.seq]
+    with SequenceFifo(args.fifo, records, args.open_timeout) as fifo:
+        fifo.wait()
+
+
+if __name__ == "__main__":
+    run_main(main)
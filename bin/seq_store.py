@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""Node-local store of decoded sequences shared by concurrent LASTZ workers.
+
+LASTZ tasks that run on the same node often need the same decoded sequence:
+every query partition of a reference BULK collapses the same scaffolds into a
+FASTA file, and every chunk of a v1 .2bit chromosome extracts the same
+chromosome. This store keeps one copy of each such FASTA file in a
+memory-backed directory (by default under /dev/shm) so it is decoded once
+per node instead of once per task.
+
+Layout:
+    <root>/<key>.fa           published FASTA; mtime drives LRU eviction
+    <root>/<key>.lock         shared flock held by every current user
+    <root>/<key>.build        exclusive flock held while <key>.fa is decoded
+    <root>/<key>.fa.tmp.<pid> FASTA being decoded
+    <root>/.store.lock        serializes eviction
+
+Users hold a shared flock on the entry lock for as long as they read the
+entry; the kernel drops it when the process exits, so the lock count is a
+crash-safe reference count that also works across container PID namespaces.
+Eviction removes least-recently-used entries whose exclusive lock can be
+taken without blocking, until the new entry fits under the size cap. When
+it cannot fit, the caller falls back to its own task-local copy.
+
+Usage:
+    seq_store.py list  --root /dev/shm/make_lastz_chains
+    seq_store.py evict --root /dev/shm/make_lastz_chains --max_size 8G
+"""
+
+import argparse
+import fcntl
+import hashlib
+import logging
+import os
+import sys
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Sequence
+
+from genome_cache import SIZE_UNITS, parse_size
+from profiling import run_main
+
+LOGGER = logging.getLogger("seq_store")
+
+STORE_FORMAT_VERSION: int = 1
+ENTRY_SUFFIX: str = ".fa"
+LOCK_SUFFIX: str = ".lock"
+BUILD_SUFFIX: str = ".build"
+TMP_MARKER: str = ".fa.tmp."
+STORE_LOCK_NAME: str = ".store.lock"
+FASTA_LINE_WIDTH: int = 50
+
+
+def configure_logging(verbose: bool) -> None:
+    """Enable concise stderr diagnostics when verbose logging is requested."""
+    logging.basicConfig(format="%(levelname)s %(name)s: %(message)s")
+    LOGGER.setLevel(logging.DEBUG if verbose else logging.INFO)
+
+
+def make_key(parts: Sequence[str]) -> str:
+    """Combine the identity of a decoded sequence into one store key."""
+    digest = hashlib.sha256(f"format={STORE_FORMAT_VERSION}\n".encode())
+    for part in parts:
+        digest.update(f"{part}\n".encode())
+    return digest.hexdigest()
+
+
+def file_identity(path: str) -> str:
+    """Return a cheap identity of a source file shared by all tasks on a node.
+
+    Staged inputs are symlinks into the upstream work or cache directory, so
+    the resolved path, size and modification time identify the same file in
+    every task that stages it.
+    """
+    real_path = os.path.realpath(path)
+    stat = os.stat(real_path)
+    return f"{real_path}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def fasta_size(sequence_sizes: Sequence[tuple[str, int]]) -> int:
+    """Return the byte size of a FASTA file of the given (name, length) records."""
+    total = 0
+    for name, length in sequence_sizes:
+        lines = -(-length // FASTA_LINE_WIDTH)
+        total += len(name) + 2 + length + lines
+    return total
+
+
+@contextmanager
+def flock(path: str, exclusive: bool, blocking: bool = True) -> Iterator[bool]:
+    """Hold a shared or exclusive flock on path; yield whether it was taken."""
+    with open(path, "a") as lock_file:
+        operation = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+        if not blocking:
+            operation |= fcntl.LOCK_NB
+        try:
+            fcntl.flock(lock_file, operation)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class SequenceStore:
+    """Size-capped, reference-counted store of decoded FASTA files."""
+
+    def __init__(self, root: str, max_bytes: int) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key: str, suffix: str) -> str:
+        return os.path.join(self.root, f"{key}{suffix}")
+
+    @contextmanager
+    def fasta(
+        self, key: str, size_hint: int, build: Callable[[str], None]
+    ) -> Iterator[str | None]:
+        """Yield the stored FASTA of key, decoding it with build(path) on a miss.
+
+        The entry cannot be evicted while the context is open. Yields None when
+        the entry does not fit under the size cap; the caller then builds its
+        own copy.
+        """
+        entry_path = self._path(key, ENTRY_SUFFIX)
+        stored = True
+        with flock(self._path(key, LOCK_SUFFIX), exclusive=False):
+            if os.path.exists(entry_path):
+                LOGGER.debug("Sequence store hit: %s", entry_path)
+            else:
+                with flock(self._path(key, BUILD_SUFFIX), exclusive=True):
+                    if not os.path.exists(entry_path):
+                        stored = self._make_room(size_hint, keep=key)
+                        if stored:
+                            self._build(key, build)
+            if stored:
+                os.utime(entry_path)
+                yield entry_path
+                return
+        LOGGER.debug("Sequence store full, not storing %s", key)
+        yield None
+
+    def _build(self, key: str, build: Callable[[str], None]) -> None:
+        """Decode one entry into a private file and publish it atomically."""
+        entry_path = self._path(key, ENTRY_SUFFIX)
+        tmp_path = self._path(key, f"{TMP_MARKER}{os.getpid()}")
+        LOGGER.debug("Decoding into sequence store: %s", entry_path)
+        try:
+            build(tmp_path)
+            os.replace(tmp_path, entry_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+    def entries(self) -> list[tuple[float, str, int]]:
+        """Return (last used, key, bytes) of every published entry."""
+        rows = []
+        for name in os.listdir(self.root):
+            if not name.endswith(ENTRY_SUFFIX):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.root, name))
+            except FileNotFoundError:
+                continue
+            rows.append((stat.st_mtime, name[: -len(ENTRY_SUFFIX)], stat.st_size))
+        return sorted(rows)
+
+    def in_use(self, key: str) -> bool:
+        """Return whether any process currently holds the entry."""
+        with flock(self._path(key, LOCK_SUFFIX), True, blocking=False) as locked:
+            return not locked
+
+    def _remove_orphans(self) -> int:
+        """Delete partial entries left by builders that died; return their bytes."""
+        released = 0
+        for name in os.listdir(self.root):
+            if TMP_MARKER not in name:
+                continue
+            key = name.split(TMP_MARKER)[0]
+            with flock(self._path(key, BUILD_SUFFIX), True, blocking=False) as locked:
+                if not locked:
+                    continue
+                path = os.path.join(self.root, name)
+                try:
+                    released += os.path.getsize(path)
+                    os.unlink(path)
+                except FileNotFoundError:
+                    continue
+                LOGGER.debug("Removed orphaned partial entry: %s", path)
+        return released
+
+    def _pending_bytes(self) -> int:
+        """Return the bytes of entries that are still being decoded."""
+        total = 0
+        for name in os.listdir(self.root):
+            if TMP_MARKER in name:
+                try:
+                    total += os.path.getsize(os.path.join(self.root, name))
+                except FileNotFoundError:
+                    continue
+        return total
+
+    def evict(self, max_bytes: int, keep: str | None = None) -> tuple[int, int]:
+        """Remove unused entries, least recently used first, down to max_bytes.
+
+        Returns (bytes released, bytes remaining).
+        """
+        with flock(os.path.join(self.root, STORE_LOCK_NAME), exclusive=True):
+            released = self._remove_orphans()
+            entries = self.entries()
+            total = sum(size for *_rest, size in entries) + self._pending_bytes()
+            for _last_used, key, size in entries:
+                if total <= max_bytes:
+                    break
+                if key == keep:
+                    continue
+                lock_path = self._path(key, LOCK_SUFFIX)
+                with flock(lock_path, exclusive=True, blocking=False) as locked:
+                    if not locked:
+                        continue
+                    LOGGER.debug("Evicting %s (%d bytes)", key, size)
+                    os.unlink(self._path(key, ENTRY_SUFFIX))
+                released += size
+                total -= size
+        return released, total
+
+    def _make_room(self, needed: int, keep: str) -> bool:
+        """Evict until needed more bytes fit under the cap; return whether they do."""
+        if needed > self.max_bytes:
+            return False
+        _released, remaining = self.evict(self.max_bytes - needed, keep=keep)
+        return remaining + needed <= self.max_bytes
+
+
+def cmd_list(args: argparse.Namespace) -> int:
+    """Print one line per entry, least recently used first."""
+    store = SequenceStore(args.root, 0)
+    for last_used, key, size in store.entries():
+        print(
+            f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(last_used))}\t"
+            f"{key}\t{size}\t{'in_use' if store.in_use(key) else 'idle'}"
+        )
+    return 0
+
+
+def cmd_evict(args: argparse.Namespace) -> int:
+    """Remove idle entries until the store fits in --max_size."""
+    store = SequenceStore(args.root, 0)
+    released, remaining = store.evict(parse_size(args.max_size))
+    LOGGER.info(
+        "Released %.2f GB, %.2f GB remain",
+        released / SIZE_UNITS["G"],
+        remaining / SIZE_UNITS["G"],
+    )
+    return 0
+
+
+def parse_args(argv: Sequence[str] | None = None) -> argparse.Namespace:
+    """Parse the store sub-command line."""
+    app = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    app.add_argument("--verbose", "-v", action="store_true", help="Debug logging")
+    commands = app.add_subparsers(dest="command", required=True)
+
+    list_cmd = commands.add_parser("list", help="List store entries")
+    list_cmd.add_argument("--root", required=True, help="Store directory")
+    list_cmd.set_defaults(func=cmd_list)
+
+    evict_cmd = commands.add_parser("evict", help="Size-based LRU eviction")
+    evict_cmd.add_argument("--root", required=True, help="Store directory")
+    evict_cmd.add_argument(
+        "--max_size", required=True, help="Target store size, e.g. 8G (0 empties it)"
+    )
+    evict_cmd.set_defaults(func=cmd_evict)
+
+    if argv is None and len(sys.argv) < 2:
+        app.print_help()
+        sys.exit(1)
+    return app.parse_args(argv)
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    """Dispatch one store sub-command."""
+    args = parse_args(argv)
+    configure_logging(args.verbose)
+    sys.exit(args.func(args))
+
+
+if __name__ == "__main__":
+    run_main(main)
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""Minimal pure-Python .2bit reader.
+
+Reads the sequence index, sizes, N-block and soft-mask tables of v0 (32-bit
+offsets) and v1 (64-bit offsets, faToTwoBit -long) .2bit files, and decodes
+sequence ranges without reading whole chromosomes. Used by partition.py to
+place chunk boundaries in assembly gaps.
+
+Usage:
+    twobit.py --twobit genome.2bit [--n_blocks]
+"""
+
+import argparse
+import bisect
+import hashlib
+import struct
+import sys
+from array import array
+from typing import BinaryIO
+
+from profiling import run_main
+
+TWOBIT_SIGNATURE: int = 0x1A412743
+BASES: bytes = b"TCAG"
+
+Blocks = list[tuple[int, int]]
+
+
+def _decode_table() -> list[bytes]:
+    """Return the four bases encoded by every possible packed byte."""
+    return [
+        bytes(BASES[(byte >> shift) & 3] for shift in (6, 4, 2, 0))
+        for byte in range(256)
+    ]
+
+
+DECODE_TABLE: list[bytes] = _decode_table()
+
+
+class TwoBitFile:
+    """Random access to the sequences of one .2bit file."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._handle: BinaryIO = open(path, "rb")
+        header = self._handle.read(16)
+        if len(header) < 16:
+            raise ValueError(f"Not a .2bit file: {path}")
+        if struct.unpack("<I", header[:4])[0] == TWOBIT_SIGNATURE:
+            self._endian = "<"
+        elif struct.unpack(">I", header[:4])[0] == TWOBIT_SIGNATURE:
+            self._endian = ">"
+        else:
+            raise ValueError(f"Not a .2bit file: {path}")
+        self.version, count, _reserved = struct.unpack(f"{self._endian}III", header[4:])
+        if self.version not in (0, 1):
+            raise ValueError(f"Unsupported .2bit version {self.version}: {path}")
+
+        offset_format = f"{self._endian}{'Q' if self.version == 1 else 'I'}"
+        offset_size = struct.calcsize(offset_format)
+        self.offsets: dict[str, int] = {}
+        for _ in range(count):
+            name_size = self._handle.read(1)[0]
+            name = self._handle.read(name_size).decode()
+            (self.offsets[name],) = struct.unpack(
+                offset_format, self._handle.read(offset_size)
+            )
+        self._records: dict[str, tuple[int, Blocks, Blocks, int]] = {}
+
+    def close(self) -> None:
+        """Close the underlying file."""
+        self._handle.close()
+
+    def __enter__(self) -> "TwoBitFile":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    @property
+    def names(self) -> list[str]:
+        """Return sequence names in file order."""
+        return list(self.offsets)
+
+    def _read_uints(self, count: int) -> array:
+        values = array("I")
+        values.frombytes(self._handle.read(4 * count))
+        if (self._endian == "<") != (sys.byteorder == "little"):
+            values.byteswap()
+        return values
+
+    def block_tables(self, name: str) -> tuple[int, array, array, array, array]:
+        """Return size, N starts, N sizes, mask starts and mask sizes of name.
+
+        The tables are the raw arrays of the file, not cached, so whole-genome
+        scans can sum them without building per-block tuples.
+        """
+        self._handle.seek(self.offsets[name])
+        size, n_count = self._read_uints(2)
+        n_starts = self._read_uints(n_count)
+        n_sizes = self._read_uints(n_count)
+        (mask_count,) = self._read_uints(1)
+        mask_starts = self._read_uints(mask_count)
+        mask_sizes = self._read_uints(mask_count)
+        self._read_uints(1)  # reserved
+        return size, n_starts, n_sizes, mask_starts, mask_sizes
+
+    def _record(self, name: str) -> tuple[int, Blocks, Blocks, int]:
+        """Return (size, N blocks, mask blocks, packed DNA offset) of name."""
+        record = self._records.get(name)
+        if record is None:
+            size, n_starts, n_sizes, mask_starts, mask_sizes = self.block_tables(name)
+            record = (
+                size,
+                [(s, s + n) for s, n in zip(n_starts, n_sizes)],
+                [(s, s + n) for s, n in zip(mask_starts, mask_sizes)],
+                self._handle.tell(),
+            )
+            self._records[name] = record
+        return record
+
+    def size(self, name: str) -> int:
+        """Return the length of a sequence."""
+        return self._record(name)[0]
+
+    def n_blocks(self, name: str) -> Blocks:
+        """Return the sorted [start, end) runs of N of a sequence."""
+        return self._record(name)[1]
+
+    def mask_blocks(self, name: str) -> Blocks:
+        """Return the sorted [start, end) soft-masked runs of a sequence."""
+        return self._record(name)[2]
+
+    def read(self, name: str, start: int = 0, end: int | None = None) -> str:
+        """Decode [start, end) of a sequence with Ns and soft-masking applied."""
+        size, n_blocks, mask_blocks, dna_offset = self._record(name)
+        end = size if end is None else min(end, size)
+        if start >= end:
+            return ""
+        first_byte = start // 4
+        self._handle.seek(dna_offset + first_byte)
+        packed = self._handle.read((end + 3) // 4 - first_byte)
+        bases = bytearray(b"".join(DECODE_TABLE[byte] for byte in packed))
+        shift = start - first_byte * 4
+        bases = bases[shift : shift + end - start]
+        for block_start, block_end in overlapping(n_blocks, start, end):
+            length = block_end - block_start
+            bases[block_start - start : block_end - start] = b"N" * length
+        sequence = bases.decode()
+        if not mask_blocks:
+            return sequence
+        pieces = []
+        cursor = 0
+        for block_start, block_end in overlapping(mask_blocks, start, end):
+            pieces.append(sequence[cursor : block_start - start])
+            pieces.append(sequence[block_start - start : block_end - start].lower())
+            cursor = block_end - start
+        pieces.append(sequence[cursor:])
+        return "".join(pieces)
+
+    def layout_digest(self) -> str:
+        """Return a digest of all sequence names, sizes and N-block tables."""
+        digest = hashlib.sha256()
+        for name in self.names:
+            digest.update(f"{name}\t{self.size(name)}\t".encode())
+            digest.update(repr(self.n_blocks(name)).encode())
+        return digest.hexdigest()
+
+
+def overlapping(blocks: Blocks, start: int, end: int) -> Blocks:
+    """Return blocks clipped to [start, end), for sorted, disjoint blocks."""
+    index = max(0, bisect.bisect_right(blocks, (start, start)) - 1)
+    clipped = []
+    for block_start, block_end in blocks[index:]:
+        if block_start >= end:
+            break
+        if block_end > start:
+            clipped.append((max(block_start, start), min(block_end, end)))
+    return clipped
+
+
+def covered_bases(blocks: Blocks, start: int, end: int) -> int:
+    """Return how many bases of [start, end) lie inside blocks."""
+    return sum(e - s for s, e in overlapping(blocks, start, end))
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command-line arguments for the .2bit inspector."""
+    app = argparse.ArgumentParser(description=__doc__)
+    app.add_argument("--twobit", required=True, help="Input .2bit file")
+    app.add_argument(
+        "--n_blocks", action="store_true", help="Print N blocks as BED instead"
+    )
+    return app.parse_args()
+
+
+def main() -> None:
+    """Print sequence sizes (chrom.sizes format) or N blocks (BED)."""
+    args = parse_args()
+    with TwoBitFile(args.twobit) as twobit:
+        for name in twobit.names:
+            if args.n_blocks:
+                for start, end in twobit.n_blocks(name):
+                    print(f"{name}\t{start}\t{end}")
+            else:
+                print(f"{name}\t{twobit.size(name)}")
+
+
+if __name__ == "__main__":
+    run_main(main)
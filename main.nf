@@ -41,6 +41,18 @@ if (params.help) {
             --outdir        results/ \\
             -profile        apptainer,slurm
 
+    Usage (all-vs-all from a sheet of genome pairs):
+        nextflow run main.nf \\
+            --pairs         pairs.tsv \\
+            --outdir        results/ \\
+            -profile        apptainer,slurm
+
+        pairs.tsv is tab-separated, one pair per line, no header:
+            <reference_name>  <reference_genome>  <query_name>  <query_genome>
+        Each genome is prepared and partitioned once, LASTZ tasks of all
+        pairs share one queue, and every pair gets its own chain build in
+        <outdir>/<reference_name>.<query_name>/.
+
     Checkpoint entry points (resume from a published intermediate):
         -entry FROM_FILL_CHAINS   Start from *.all.chain.gz  (skips LASTZ + chain building)
         -entry FROM_CLEAN_CHAINS  Start from *.filled.chain.gz (skips fill step)
@@ -98,10 +110,10 @@ include { MAKE_LASTZ_CHAINS as CHAINS } from './workflows/make_lastz_chains'
 include { FILL_CLEAN_CHAINS } from './subworkflows/local/fill_clean_chains/main'
 include { CHAIN_CLEANER     } from './modules/local/chain_cleaner/main'
 include { CHAINTOOLS_FILTER as CHAINTOOLS_FILTER_CLEANED_CHAINS } from './modules/local/chaintools/filter/main'
-include { PREPARE_GENOMES as PREPARE_REFERENCE_GENOME } from './subworkflows/local/prepare_genomes/main'
-include { PREPARE_GENOMES as PREPARE_QUERY_GENOME } from './subworkflows/local/prepare_genomes/main'
+include { PREPARE_GENOMES   } from './subworkflows/local/prepare_genomes/main'
 include { CHAINTOOLS_ANTIREPEAT } from './modules/local/chaintools/antirepeat/main'
 include { CHAINTOOLS_MERGE } from './modules/local/chaintools/merge/main'
+include { pairMeta; pairGenomes; withTwobits; withGenomes; groupByPair } from './subworkflows/local/utils_pairs/main'
 
 /*
 ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
@@ -117,6 +129,59 @@ def validateFullRun() {
     if (!params.query_genome)  errors << "  --query_genome is required"
     if (!(['loose', 'medium'].contains(params.chain_linear_gap)))
         errors << "  --chain_linear_gap must be 'loose' or 'medium'"
+    if (params.intermediate_lifecycle && !(['track', 'compress', 'delete'].contains(params.intermediate_lifecycle)))
+        errors << "  --intermediate_lifecycle must be 'track', 'compress' or 'delete'"
+    if (params.preflight && !(['warn', 'abort'].contains(params.preflight)))
+        errors << "  --preflight must be 'warn' or 'abort'"
+    if (!(['reference', 'auto'].contains(params.lastz_orientation)))
+        errors << "  --lastz_orientation must be 'reference' or 'auto'"
+    if (errors) {
+        log.error "Parameter validation failed:\n${errors.join('\n')}"
+        System.exit(1)
+    }
+}
+
+// Rows of the --pairs sheet: [reference_name, reference_genome, query_name, query_genome].
+// Blank lines and lines starting with '#' are skipped.
+def readPairsSheet(sheet) {
+    return file(sheet).readLines()
+        .findAll { line -> line.trim() && !line.startsWith('#') }
+        .collect { line -> line.split('\t').collect { it.trim() } }
+}
+
+def validateAllVsAll() {
+    def errors = []
+    if (params.from) errors << "  --from cannot be combined with --pairs"
+    if (!file(params.pairs).exists()) {
+        errors << "  --pairs file not found: ${params.pairs}"
+    } else {
+        def genomes = [:]
+        def seen    = [] as Set
+        readPairsSheet(params.pairs).eachWithIndex { row, i ->
+            if (row.size() != 4 || row.any { !it }) {
+                errors << "  --pairs line ${i + 1}: expected 4 tab-separated columns " +
+                          "(reference_name, reference_genome, query_name, query_genome)"
+                return
+            }
+            def (ref, ref_genome, qry, qry_genome) = row
+            if (ref == qry) errors << "  --pairs line ${i + 1}: reference and query must differ (${ref})"
+            if (!seen.add("${ref}.${qry}".toString())) errors << "  --pairs line ${i + 1}: duplicate pair ${ref}.${qry}"
+            [ [ ref, ref_genome ], [ qry, qry_genome ] ].each { name, path ->
+                if (genomes.containsKey(name) && genomes[name] != path)
+                    errors << "  --pairs line ${i + 1}: genome ${name} given as both ${genomes[name]} and ${path}"
+                genomes[name] = path
+            }
+        }
+        if (!seen) errors << "  --pairs lists no genome pairs"
+    }
+    if (!(['loose', 'medium'].contains(params.chain_linear_gap)))
+        errors << "  --chain_linear_gap must be 'loose' or 'medium'"
+    if (params.intermediate_lifecycle && !(['track', 'compress', 'delete'].contains(params.intermediate_lifecycle)))
+        errors << "  --intermediate_lifecycle must be 'track', 'compress' or 'delete'"
+    if (params.preflight && !(['warn', 'abort'].contains(params.preflight)))
+        errors << "  --preflight must be 'warn' or 'abort'"
+    if (!(['reference', 'auto'].contains(params.lastz_orientation)))
+        errors << "  --lastz_orientation must be 'reference' or 'auto'"
     if (errors) {
         log.error "Parameter validation failed:\n${errors.join('\n')}"
         System.exit(1)
@@ -132,6 +197,12 @@ def validateAliasBase() {
     if (!params.query_genome)       errors << "  --query_twobit is required (path to query .2bit)"
     if (!(['loose', 'medium'].contains(params.chain_linear_gap)))
         errors << "  --chain_linear_gap must be 'loose' or 'medium'"
+    if (params.intermediate_lifecycle && !(['track', 'compress', 'delete'].contains(params.intermediate_lifecycle)))
+        errors << "  --intermediate_lifecycle must be 'track', 'compress' or 'delete'"
+    if (params.preflight && !(['warn', 'abort'].contains(params.preflight)))
+        errors << "  --preflight must be 'warn' or 'abort'"
+    if (!(['reference', 'auto'].contains(params.lastz_orientation)))
+        errors << "  --lastz_orientation must be 'reference' or 'auto'"
     return errors
 }
 
@@ -169,7 +240,11 @@ def validateFromCleanChains() {
 */
 
 workflow MAKE_LASTZ_CHAINS {
-    if (params.from == "fill_chains") {
+    if (params.pairs) {
+        // ── All-vs-all: every pair of the sheet in one run ────────────────────
+        log.info "Aligning all pairs of ${params.pairs}"
+        ALL_VS_ALL()
+    } else if (params.from == "fill_chains") {
         // ── Checkpoint: start from merged chain (skip LASTZ + chain building) ──────
         log.info "Resuming from ${params.from} checkpoint — skipping LASTZ + chain building"
         FROM_FILL_CHAINS()
@@ -217,10 +292,33 @@ workflow FULL_RUN {
     """.stripIndent()
 
     CHAINS(
-        params.reference_name,
-        params.query_name,
-        params.reference_genome,
-        params.query_genome
+        Channel.of( [ params.reference_name, params.reference_genome, params.query_name, params.query_genome ] )
+    )
+}
+
+// ── All-vs-all: all pairs of a --pairs sheet ─────────────────────────────
+// Results of each pair are written to <outdir>/<reference_name>.<query_name>/
+workflow ALL_VS_ALL {
+    validateAllVsAll()
+
+    def rows = readPairsSheet(params.pairs)
+    def n_genomes = rows.collectMany { row -> [ row[0], row[2] ] }.unique().size()
+
+    log.info """
+    make_lastz_chains v${workflow.manifest.version} — ALL_VS_ALL
+
+    Authors: ${workflow.manifest.author}
+    Github:  ${workflow.manifest.homePage}
+
+      Pairs  : ${rows.size()} pairs of ${n_genomes} genomes (${params.pairs})
+      Outdir : ${params.outdir}/<reference>.<query>
+      Fill   : ${params.skip_fill_chains ? 'SKIPPED' : 'enabled'}
+      Clean  : ${params.skip_clean_chain ? 'SKIPPED' : 'enabled'}
+      Profile: ${workflow.profile}
+    """.stripIndent()
+
+    CHAINS(
+        Channel.fromList(rows)
     )
 }
 
@@ -246,55 +344,35 @@ workflow FROM_CHAIN_ANTIREPEAT {
     """.stripIndent()
 
     // ── 1. Prepare genomes ─────────────────────────────────────────────────
-    PREPARE_REFERENCE_GENOME (
-        params.reference_name,
-        params.reference_genome,
-        false
-    )
-    PREPARE_QUERY_GENOME (
-        params.query_name,
-        params.query_genome,
+    def pair = pairMeta(params.reference_name, params.query_name)
+    PREPARE_GENOMES (
+        Channel.of( [ params.reference_name, params.reference_genome ], [ params.query_name, params.query_genome ] ),
         false
     )
 
-    // INFO: (reference_name, reference_twobit, reference_chrom_sizes)
-    reference_prepared    = PREPARE_REFERENCE_GENOME.out.prepared
-    reference_twobit      = reference_prepared.map { _n, tb, _cs -> tb }.first()
-    reference_chrom_sizes = reference_prepared.map { _n, _tb, cs -> cs }.first()
-
-    query_prepared    = PREPARE_QUERY_GENOME.out.prepared
-    query_twobit      = query_prepared.map  { _n, tb, _cs -> tb }.first()
-    query_chrom_sizes = query_prepared.map { _n, _tb, cs -> cs }.first()
+    // INFO: (pair, reference_twobit, query_twobit, reference_chrom_sizes, query_chrom_sizes)
+    ch_genomes = pairGenomes(Channel.of(pair), PREPARE_GENOMES.out.prepared)
 
     // ── 2. Collect all bundled chains from axtChain ───────────────────────────────────
     Channel.fromPath(params.axtchain_path, type: 'dir', checkIfExists: true, maxDepth: 1)
         .map { chain -> chain.listFiles().findAll { it.name.endsWith('.chain') } }
-        .flatten()
-        // .map { chain -> [ [ id: chain.baseName ], chain ] }
+        .flatMap { chains -> chains.collect { chain -> [ [ pair: pair.id, bundles: chains.size() ], chain ] } }
         .set { ch_axtchain_chains }
 
     // ── 3. Run anti repeat on each chain ─────────────────────────────────────────
     CHAINTOOLS_ANTIREPEAT (
-      ch_axtchain_chains,
-      reference_twobit,
-      query_twobit,
+      withTwobits(ch_axtchain_chains, ch_genomes)
     )
 
     // ── 4. Merge all chain files into one ────────────────────────────────────────
     CHAINTOOLS_MERGE (
-        CHAINTOOLS_ANTIREPEAT.out.chain
-          .collect()
-          .map { chains -> [ [ id: params.reference_name + '.' + params.query_name ], chains ] }
+        groupByPair(CHAINTOOLS_ANTIREPEAT.out.chain, 'bundles')
+          .map { id, chains -> [ [ id: id, pair: id ], chains ] }
     )
 
     FILL_CLEAN_CHAINS(
         CHAINTOOLS_MERGE.out.chain_gz,
-        reference_twobit,
-        query_twobit,
-        reference_chrom_sizes,
-        query_chrom_sizes,
-        params.reference_name,
-        params.query_name
+        ch_genomes
     )
 }
 
@@ -320,38 +398,22 @@ workflow FROM_FILL_CHAINS {
     """.stripIndent()
 
     // ── 1. Prepare genomes ─────────────────────────────────────────────────
-    PREPARE_REFERENCE_GENOME (
-        params.reference_name,
-        params.reference_genome,
+    def pair = pairMeta(params.reference_name, params.query_name)
+    PREPARE_GENOMES (
+        Channel.of( [ params.reference_name, params.reference_genome ], [ params.query_name, params.query_genome ] ),
         false
     )
-    PREPARE_QUERY_GENOME (
-        params.query_name,
-        params.query_genome,
-        false
-    )
-
-    // INFO: (reference_name, reference_twobit, reference_chrom_sizes)
-    reference_prepared    = PREPARE_REFERENCE_GENOME.out.prepared
-    reference_twobit      = reference_prepared.map { _n, tb, _cs -> tb }.first()
-    reference_chrom_sizes = reference_prepared.map { _n, _tb, cs -> cs }.first()
 
-    query_prepared    = PREPARE_QUERY_GENOME.out.prepared
-    query_twobit      = query_prepared.map  { _n, tb, _cs -> tb }.first()
-    query_chrom_sizes = query_prepared.map { _n, _tb, cs -> cs }.first()
+    // INFO: (pair, reference_twobit, query_twobit, reference_chrom_sizes, query_chrom_sizes)
+    ch_genomes = pairGenomes(Channel.of(pair), PREPARE_GENOMES.out.prepared)
 
     Channel.fromPath(params.merged_chain_path)
-        .map { chain -> [ [ id: params.reference_name + '.' + params.query_name ], chain ] }
+        .map { chain -> [ [ id: pair.id, pair: pair.id ], chain ] }
         .set { ch_merged_chain }
 
     FILL_CLEAN_CHAINS(
         ch_merged_chain,
-        reference_twobit,
-        query_twobit,
-        reference_chrom_sizes,
-        query_chrom_sizes,
-        params.reference_name,
-        params.query_name
+        ch_genomes
     )
 }
 
@@ -374,36 +436,21 @@ workflow FROM_CLEAN_CHAINS {
     """.stripIndent()
 
     // ── 1. Prepare genomes ─────────────────────────────────────────────────
-    PREPARE_REFERENCE_GENOME (
-        params.reference_name,
-        params.reference_genome,
+    def pair = pairMeta(params.reference_name, params.query_name)
+    PREPARE_GENOMES (
+        Channel.of( [ params.reference_name, params.reference_genome ], [ params.query_name, params.query_genome ] ),
         false
     )
-    PREPARE_QUERY_GENOME (
-        params.query_name,
-        params.query_genome,
-        false
-    )
-
-    // INFO: (reference_name, reference_twobit, reference_chrom_sizes)
-    reference_prepared = PREPARE_REFERENCE_GENOME.out.prepared
-    reference_twobit      = reference_prepared.map { _n, tb, _cs -> tb }.first()
-    reference_chrom_sizes = reference_prepared.map { _n, _tb, cs -> cs }.first()
 
-    query_prepared  = PREPARE_QUERY_GENOME.out.prepared
-    query_twobit      = query_prepared.map  { _n, tb, _cs -> tb }.first()
-    query_chrom_sizes = query_prepared.map { _n, _tb, cs -> cs }.first()
+    // INFO: (pair, reference_twobit, query_twobit, reference_chrom_sizes, query_chrom_sizes)
+    ch_genomes = pairGenomes(Channel.of(pair), PREPARE_GENOMES.out.prepared)
 
     Channel.fromPath(params.filled_chain_path)
-        .map { chain -> [ [ id: params.reference_name + '.' + params.query_name ], chain ] }
+        .map { chain -> [ [ id: pair.id, pair: pair.id ], chain ] }
         .set { ch_filled_chain }
 
     CHAIN_CLEANER(
-        ch_filled_chain,
-        reference_twobit,
-        query_twobit,
-        reference_chrom_sizes,
-        query_chrom_sizes,
+        withGenomes(ch_filled_chain, ch_genomes),
         params.chain_linear_gap,
         params.clean_chain_parameters
     )
@@ -424,12 +471,18 @@ workflow FROM_CLEAN_CHAINS {
 
 workflow.onComplete {
     if (workflow.success) {
-        def final_chain = file("${params.outdir}/07_final/${params.reference_name}.${params.query_name}.allfilled.chain.gz")
+        def final_chains = params.pairs
+            ? readPairsSheet(params.pairs).collect { row ->
+                file("${params.outdir}/${row[0]}.${row[2]}/07_final/${row[0]}.${row[2]}.allfilled.chain.gz")
+            }
+            : [ file("${params.outdir}/07_final/${params.reference_name}.${params.query_name}.allfilled.chain.gz") ]
         log.info "Pipeline completed successfully!"
-        if (final_chain.exists()) {
-            log.info "Final chain: ${final_chain}"
-        } else {
-            log.warn "Pipeline reported success but final chain file was not produced — check that all steps ran"
+        final_chains.each { final_chain ->
+            if (final_chain.exists()) {
+                log.info "Final chain: ${final_chain}"
+            } else {
+                log.warn "Pipeline reported success but final chain file ${final_chain.name} was not produced — check that all steps ran"
+            }
         }
         log.info "Run time   : ${workflow.duration}"
     } else {
@@ -16,16 +16,14 @@ process AXT_CHAIN {
         'quay.io/biocontainers/ucsc-axtchain:482--h0b57e2e_2' }"
 
     input:
-    path bundle_psl          // one bundle.N.psl file
-    path target_twobit
-    path query_twobit
+    tuple val(meta), path(bundle_psl), path(target_twobit), path(query_twobit) // one bundle.N.psl file
     val  min_chain_score
     val  chain_linear_gap
     val  lastz_q             // path to score matrix file, or empty string ''
 
     output:
-    path "*.chain",      emit: chain
-    path "versions.yml", emit: versions
+    tuple val(meta), path("*.chain"), emit: chain
+    path "versions.yml",              emit: versions
 
     script:
     def out_chain = "${bundle_psl.baseName}.chain"
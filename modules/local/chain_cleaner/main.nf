@@ -3,6 +3,7 @@
     CHAIN_CLEANER — Remove weak and suspicious chains using chainCleaner.
     chainCleaner requires additional Kent binaries (chainNet, NetFilterNonNested.perl)
     in PATH; these are handled by the container/conda environment.
+    task.ext.prefix (set for sharded cleaning) is prepended to both output names.
 ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 */
 
@@ -16,21 +17,18 @@ process CHAIN_CLEANER {
         'ghcr.io/hillerlab/chaincleaner:latest' }"
 
     input:
-    tuple val(meta), path(input_chain_gz) // filled.chain.gz or all.chain.gz
-    path target_twobit
-    path query_twobit
-    path target_chrom_sizes
-    path query_chrom_sizes
+    tuple val(meta), path(input_chain_gz), path(target_twobit), path(query_twobit), path(target_chrom_sizes), path(query_chrom_sizes) // filled.chain.gz or all.chain.gz
     val  chain_linear_gap
     val  clean_chain_parameters
 
     output:
-    tuple val(meta), path("cleaned_intermediate.chain"), emit: cleaned_chain
-    tuple val(meta), path("removed_suspects.bed"),       emit: suspects_bed
+    tuple val(meta), path("*cleaned_intermediate.chain"), emit: cleaned_chain
+    tuple val(meta), path("*removed_suspects.bed"),       emit: suspects_bed
     path "versions.yml",               emit: versions
 
     script:
     def clean_args = clean_chain_parameters.split()
+    def prefix     = task.ext.prefix ?: ''
 
     meta.id = input_chain_gz.baseName + '.cleaned'
     """
@@ -38,8 +36,8 @@ process CHAIN_CLEANER {
         ${input_chain_gz} \\
         ${target_twobit} \\
         ${query_twobit} \\
-        cleaned_intermediate.chain \\
-        removed_suspects.bed \\
+        ${prefix}cleaned_intermediate.chain \\
+        ${prefix}removed_suspects.bed \\
         -linearGap=${chain_linear_gap} \\
         -tSizes=${target_chrom_sizes} \\
         -qSizes=${query_chrom_sizes} \\
@@ -0,0 +1,49 @@
+/*
+Copyright (c) 2026 The Hiller Lab at the Senckenberg Gessellschaft für Naturforschung
+Distributed under the terms of the Apache License, Version 2.0.
+*/
+
+/*
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    CHAIN_SHARD_MERGE — Merge chainCleaner shard outputs.
+    Calls bin/chain_shard.py merge. Context chains copied into other shards are
+    dropped, chain ids colliding across shards are renumbered, and the outputs
+    carry the names of a serial CHAIN_CLEANER run.
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+*/
+
+process CHAIN_SHARD_MERGE {
+    tag "$meta.id"
+    label 'process_low'
+
+    conda "${moduleDir}/environment.yml"
+    container "${ workflow.containerEngine == 'singularity' && !task.ext.singularity_pull_docker_container ?
+        'https://depot.galaxyproject.org/singularity/python:3.8.0--2' :
+        'biocontainers/python:3.11' }"
+
+    input:
+    tuple val(meta), path(manifest), path(chains, stageAs: 'cleaned/*'), path(beds, stageAs: 'suspects/*')
+
+    output:
+    tuple val(meta), path("cleaned_intermediate.chain"), emit: cleaned_chain
+    tuple val(meta), path("removed_suspects.bed"),       emit: suspects_bed
+    path "versions.yml",                                 emit: versions
+
+    when:
+    task.ext.when == null || task.ext.when
+
+    script:
+    """
+    chain_shard.py merge \\
+        --manifest ${manifest} \\
+        --chains cleaned/* \\
+        --beds suspects/* \\
+        --output cleaned_intermediate.chain \\
+        --bed_output removed_suspects.bed
+
+    cat <<-END_VERSIONS > versions.yml
+    "${task.process}":
+        python: \$(python --version 2>&1 | awk '{print \$2}')
+    END_VERSIONS
+    """
+}
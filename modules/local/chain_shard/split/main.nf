@@ -0,0 +1,51 @@
+/*
+Copyright (c) 2026 The Hiller Lab at the Senckenberg Gessellschaft für Naturforschung
+Distributed under the terms of the Apache License, Version 2.0.
+*/
+
+/*
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    CHAIN_SHARD_SPLIT — Split the chains to clean into independent shards.
+    Calls bin/chain_shard.py split. Every shard holds the complete chain set of
+    the chromosomes it owns, so chainCleaner can run on the shards in parallel.
+    shard_manifest.tsv records the owned target chromosomes per shard.
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+*/
+
+process CHAIN_SHARD_SPLIT {
+    tag "$chain.name"
+    label 'process_low'
+
+    conda "${moduleDir}/environment.yml"
+    container "${ workflow.containerEngine == 'singularity' && !task.ext.singularity_pull_docker_container ?
+        'https://depot.galaxyproject.org/singularity/python:3.8.0--2' :
+        'biocontainers/python:3.11' }"
+
+    input:
+    tuple val(meta), path(chain)
+    val shards
+    val mode           // "component" or "target"
+
+    output:
+    tuple val(meta), path("shards/shard_*.chain"), emit: shards
+    tuple val(meta), path("shard_manifest.tsv"),   emit: manifest
+    path "versions.yml",                           emit: versions
+
+    when:
+    task.ext.when == null || task.ext.when
+
+    script:
+    """
+    chain_shard.py split \\
+        --chain ${chain} \\
+        --shards ${shards} \\
+        --mode ${mode} \\
+        --output_dir shards \\
+        --manifest shard_manifest.tsv
+
+    cat <<-END_VERSIONS > versions.yml
+    "${task.process}":
+        python: \$(python --version 2>&1 | awk '{print \$2}')
+    END_VERSIONS
+    """
+}
@@ -0,0 +1,48 @@
+/*
+Copyright (c) 2026 The Hiller Lab at the Senckenberg Gessellschaft für Naturforschung
+Distributed under the terms of the Apache License, Version 2.0.
+*/
+
+/*
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    CHAIN_SHARD_VERIFY — Compare sharded and serial chainCleaner results.
+    Calls bin/chain_shard.py verify, which compares the aligned blocks of both
+    chain files and the removed_suspects.bed lines as multisets and writes the
+    differences to shard_verification.tsv.
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+*/
+
+process CHAIN_SHARD_VERIFY {
+    tag "shard verification"
+    label 'process_low'
+
+    conda "${moduleDir}/environment.yml"
+    container "${ workflow.containerEngine == 'singularity' && !task.ext.singularity_pull_docker_container ?
+        'https://depot.galaxyproject.org/singularity/python:3.8.0--2' :
+        'biocontainers/python:3.11' }"
+
+    input:
+    tuple val(meta), path(serial_chain, stageAs: 'serial/*'), path(serial_bed, stageAs: 'serial/*'), path(sharded_chain, stageAs: 'sharded/*'), path(sharded_bed, stageAs: 'sharded/*')
+
+    output:
+    tuple val(meta), path("shard_verification.tsv"), emit: report
+    path "versions.yml",                             emit: versions
+
+    when:
+    task.ext.when == null || task.ext.when
+
+    script:
+    """
+    chain_shard.py verify \\
+        --serial ${serial_chain} \\
+        --serial_bed ${serial_bed} \\
+        --sharded ${sharded_chain} \\
+        --sharded_bed ${sharded_bed} \\
+        --report shard_verification.tsv
+
+    cat <<-END_VERSIONS > versions.yml
+    "${task.process}":
+        python: \$(python --version 2>&1 | awk '{print \$2}')
+    END_VERSIONS
+    """
+}
@@ -8,6 +8,8 @@ Distributed under the terms of the Apache License, Version 2.0.
     CHAINTOOLS_MERGE — Merge chains into a single chain file.
     Merges multiple chain files into a single chain file that 
     can be sorted and/or gzipped.
+    With task.ext.partial (merge-tree batches) the output is sorted by id
+    but neither renamed nor compressed, so the final merge takes it as is.
 ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 */
 
@@ -35,6 +37,8 @@ process CHAINTOOLS_MERGE {
     def args      = task.ext.args ?: ''
     def prefix    = task.ext.prefix ?: "${meta.id}"
     def max_gb    = task.memory ? task.memory.toGiga() : 32
+    def finish    = task.ext.partial ? '' : '--rename --gzip'
+    def out_chain = task.ext.partial ? "${prefix}.all.chain" : "${prefix}.all.chain.gz"
     """
     ls *.chain > chains.list
 
@@ -44,9 +48,8 @@ process CHAINTOOLS_MERGE {
         --threads ${task.cpus} \\
         --max-gb $max_gb \\
         --sort-by id \\
-        --rename \\
-        --gzip \\
-        --out-chain ${prefix}.all.chain.gz
+        $finish \\
+        --out-chain $out_chain
 
     cat <<-END_VERSIONS > versions.yml
     "${task.process}":
@@ -20,14 +20,12 @@ process CHAINTOOLS_SCORE {
         'ghcr.io/alejandrogzi/chaintools:latest' }"
 
     input:
-    path chain
-    path reference
-    path query
+    tuple val(meta), path(chain), path(reference), path(query)
 
     output:
-    path "*.scored.chain"       , optional: true, emit: chain
-    path "*.scored.chain.gz"    , optional: true, emit: chain_gz
-    path "versions.yml"         , emit: versions
+    tuple val(meta), path("*.scored.chain")   , optional: true, emit: chain
+    tuple val(meta), path("*.scored.chain.gz"), optional: true, emit: chain_gz
+    path "versions.yml"                         , emit: versions
 
     when:
     task.ext.when == null || task.ext.when
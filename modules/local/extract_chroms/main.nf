@@ -8,6 +8,8 @@
 
     For v0 .2bit files, lastz reads them natively — this process emits an empty
     directory (sentinel) and run_lastz.py falls back to its native .2bit code path.
+    With task.ext.seq_fifo set (params.seq_fifo), v1 genomes get the same sentinel:
+    run_lastz.py then streams the ranges it needs through named pipes.
 ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 */
 
@@ -28,6 +30,7 @@ process EXTRACT_CHROMS {
     path "versions.yml",                                     emit: versions
 
     script:
+    def fifo = task.ext.seq_fifo ? 'true' : 'false'
     """
     mkdir -p ${genome_name}_chroms
 
@@ -47,7 +50,9 @@ process EXTRACT_CHROMS {
         exit 1
     fi
 
-    if [ "\$ver" -eq 1 ]; then
+    if [ "\$ver" -eq 1 ] && [ "${fifo}" = "true" ]; then
+        echo "v1 .2bit — no extraction (seq_fifo streams ranges to lastz)" >&2
+    elif [ "\$ver" -eq 1 ]; then
         n=\$(wc -l < ${chrom_sizes})
         echo "v1 .2bit detected — extracting \$n chromosomes" >&2
         while IFS=\$'\\t' read -r chrom size; do
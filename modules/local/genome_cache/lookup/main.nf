@@ -0,0 +1,56 @@
+/*
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    GENOME_CACHE_LOOKUP — Look up a prepared genome in the persistent genome cache.
+    Hashes the input genome (FASTA or .2bit) and, on a hit, materializes the
+    cached .2bit, chrom.sizes and per-chromosome FASTA directory (v1 only) so
+    FA_TO_TWO_BIT, CHROMSIZE and EXTRACT_CHROMS can be skipped. The cache key
+    and hit/miss status are always emitted so a miss can be stored afterwards.
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+*/
+
+process GENOME_CACHE_LOOKUP {
+    tag "$genome_name"
+    label 'process_fast'
+
+    conda "${moduleDir}/environment.yml"
+    container "${ workflow.containerEngine == 'singularity' && !task.ext.singularity_pull_docker_container ?
+        'https://depot.galaxyproject.org/singularity/python:3.8.0--2' :
+        'biocontainers/python:3.11' }"
+
+    input:
+    tuple val(genome_name), path(genome)
+    val   cache_dir
+    val   extract_chroms
+
+    output:
+    tuple val(genome_name), env(CACHE_KEY), env(CACHE_STATUS),                                     emit: status
+    tuple val(genome_name), path("cached/${genome_name}.2bit"), path("cached/${genome_name}.chrom.sizes"), optional: true, emit: prepared
+    tuple val(genome_name), path("cached/${genome_name}_chroms"),                                  optional: true, emit: chroms_dir
+    path "versions.yml",                                                                          emit: versions
+
+    script:
+    // seq_fifo runs stream v1 ranges and need no per-chromosome FASTA.
+    def chroms_arg = !extract_chroms ? '' : task.ext.seq_fifo ? '--empty_chroms' : '--require_chroms'
+    """
+    CACHE_KEY=\$(genome_cache.py key \\
+        --genome ${genome} \\
+        --extra force_long_2bit=${params.force_long_2bit})
+
+    if genome_cache.py fetch \\
+        --cache_dir ${cache_dir} \\
+        --key \$CACHE_KEY \\
+        --name ${genome_name} \\
+        --dest cached \\
+        ${chroms_arg}; then
+        CACHE_STATUS=hit
+    else
+        CACHE_STATUS=miss
+        rm -rf cached
+    fi
+
+    cat <<-END_VERSIONS > versions.yml
+    "${task.process}":
+        python: \$(python --version 2>&1 | awk '{print \$2}')
+    END_VERSIONS
+    """
+}
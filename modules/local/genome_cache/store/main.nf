@@ -0,0 +1,46 @@
+/*
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    GENOME_CACHE_STORE — Publish a freshly prepared genome into the genome cache.
+    Runs only after a GENOME_CACHE_LOOKUP miss. The entry is written under an
+    exclusive lock and renamed into place atomically, so concurrent runs that
+    prepared the same genome simply keep the first published copy.
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+*/
+
+process GENOME_CACHE_STORE {
+    tag "$genome_name"
+    label 'process_fast'
+
+    conda "${moduleDir}/environment.yml"
+    container "${ workflow.containerEngine == 'singularity' && !task.ext.singularity_pull_docker_container ?
+        'https://depot.galaxyproject.org/singularity/python:3.8.0--2' :
+        'biocontainers/python:3.11' }"
+
+    input:
+    tuple val(genome_name), val(cache_key), path(twobit), path(chrom_sizes), path(chroms_dirs, stageAs: 'chroms_in/*')
+    val   cache_dir
+
+    output:
+    path "versions.yml", emit: versions
+
+    script:
+    """
+    chroms_arg=""
+    for chroms_dir in chroms_in/*/; do
+        [ -d "\$chroms_dir" ] && chroms_arg="--chroms_dir \$chroms_dir"
+    done
+
+    genome_cache.py store \\
+        --cache_dir ${cache_dir} \\
+        --key ${cache_key} \\
+        --name ${genome_name} \\
+        --twobit ${twobit} \\
+        --chrom_sizes ${chrom_sizes} \\
+        \$chroms_arg
+
+    cat <<-END_VERSIONS > versions.yml
+    "${task.process}":
+        python: \$(python --version 2>&1 | awk '{print \$2}')
+    END_VERSIONS
+    """
+}
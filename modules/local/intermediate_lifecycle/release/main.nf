@@ -0,0 +1,55 @@
+/*
+Copyright (c) 2026 The Hiller Lab at the Senckenberg Gessellschaft für Naturforschung
+Distributed under the terms of the Apache License, Version 2.0.
+*/
+
+/*
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    INTERMEDIATE_RELEASE — Release intermediates a stage has fully consumed.
+    Calls bin/intermediate_lifecycle.py release on the work-dir targets of the
+    staged files (track, compress or delete) and writes one ledger row per
+    file for the disk high-water report. task.ext.link_dir names the directory
+    of symlink-published copies to update.
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+*/
+
+process INTERMEDIATE_RELEASE {
+    tag "${meta.id}:${stage}"
+    label 'process_fast'
+
+    conda "${moduleDir}/environment.yml"
+    container "${ workflow.containerEngine == 'singularity' && !task.ext.singularity_pull_docker_container ?
+        'https://depot.galaxyproject.org/singularity/python:3.8.0--2' :
+        'biocontainers/python:3.11' }"
+
+    input:
+    tuple val(meta), path(files, stageAs: 'release_?/*')
+    val stage
+    val action
+
+    output:
+    tuple val(meta), path("*.lifecycle.tsv"), emit: ledger
+    path "versions.yml",                      emit: versions
+
+    when:
+    task.ext.when == null || task.ext.when
+
+    script:
+    def prefix    = task.ext.prefix ?: "${meta.id}.${stage}"
+    def link_dirs = task.ext.link_dir ? "--link_dir ${task.ext.link_dir}" : ''
+    """
+    intermediate_lifecycle.py release \\
+        --pair ${meta.pair} \\
+        --stage ${stage} \\
+        --action ${action} \\
+        --work_dir ${workflow.workDir} \\
+        ${link_dirs} \\
+        --output ${prefix}.lifecycle.tsv \\
+        release_*/*
+
+    cat <<-END_VERSIONS > versions.yml
+    "${task.process}":
+        python: \$(python --version 2>&1 | awk '{print \$2}')
+    END_VERSIONS
+    """
+}
@@ -0,0 +1,44 @@
+/*
+Copyright (c) 2026 The Hiller Lab at the Senckenberg Gessellschaft für Naturforschung
+Distributed under the terms of the Apache License, Version 2.0.
+*/
+
+/*
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    INTERMEDIATE_REPORT — Disk high-water marks of a run.
+    Calls bin/intermediate_lifecycle.py report on the merged release ledger:
+    bytes held per stage at its own peak and the run's overall high-water mark.
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+*/
+
+process INTERMEDIATE_REPORT {
+    tag "$ledger.name"
+    label 'process_fast'
+
+    conda "${moduleDir}/environment.yml"
+    container "${ workflow.containerEngine == 'singularity' && !task.ext.singularity_pull_docker_container ?
+        'https://depot.galaxyproject.org/singularity/python:3.8.0--2' :
+        'biocontainers/python:3.11' }"
+
+    input:
+    path ledger
+
+    output:
+    path "disk_high_water.tsv", emit: report
+    path "versions.yml",        emit: versions
+
+    when:
+    task.ext.when == null || task.ext.when
+
+    script:
+    """
+    intermediate_lifecycle.py report \\
+        --ledger ${ledger} \\
+        --output disk_high_water.tsv
+
+    cat <<-END_VERSIONS > versions.yml
+    "${task.process}":
+        python: \$(python --version 2>&1 | awk '{print \$2}')
+    END_VERSIONS
+    """
+}
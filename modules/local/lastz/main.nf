@@ -16,21 +16,25 @@ process LASTZ {
         'ghcr.io/hillerlab/pylastz:latest' }"
 
     input:
-    tuple val(reference_part), val(query_part)
-    path  reference_twobit                     // staged as its basename, e.g. reference.2bit
-    path  query_twobit
-    path  reference_chrom_sizes
-    path  query_chrom_sizes
-    path  reference_chroms_dir                 // dir of pre-extracted <chrom>.fa (v1) or empty (v0)
-    path  query_chroms_dir
+    // meta.pair names the alignment; the genome files are those of its pair:
+    // .2bit files staged as their basename (e.g. reference.2bit), chrom.sizes,
+    // dirs of pre-extracted <chrom>.fa (v1) or empty (v0), and BULK manifest
+    // dirs (BULK_<n>.lst) referenced by partition strings.
+    tuple val(meta), val(reference_part), val(query_part),
+          path(reference_twobit), path(query_twobit),
+          path(reference_chrom_sizes), path(query_chrom_sizes),
+          path(reference_chroms_dir), path(query_chroms_dir),
+          path(reference_bulks), path(query_bulks)
     val   lastz_k
     val   lastz_h
     val   lastz_l
     val   lastz_y
 
     output:
-    tuple val(reference_part), path("*.psl"), optional: true, emit: psl
-    path  "versions.yml",                                   emit: versions
+    tuple val(meta), val(reference_part), path("*.psl"), optional: true, emit: psl
+    // One record per finished pair, also when it found no alignments
+    tuple val(meta), val(reference_part), path("*.psl", arity: '0..*'), emit: done
+    path  "versions.yml",                                              emit: versions
 
     script:
     // Build a short, stable identifier from each partition string. BULK partitions
@@ -57,7 +61,12 @@ process LASTZ {
         "lastz_k": ${lastz_k},
         "lastz_h": ${lastz_h},
         "lastz_l": ${lastz_l},
-        "lastz_y": ${lastz_y}
+        "lastz_y": ${lastz_y},
+        "seq_store_dir": "${task.ext.seq_store_dir ?: ''}",
+        "seq_store_max_size": "${task.ext.seq_store_max_size ?: ''}",
+        "seq_fifo": ${task.ext.seq_fifo ? 'true' : 'false'},
+        "seq_fifo_timeout": "${task.ext.seq_fifo_timeout ?: ''}",
+        "orientation": "${task.ext.orientation ?: 'reference'}"
     }
     JSONEOF
 
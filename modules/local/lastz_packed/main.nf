@@ -0,0 +1,81 @@
+/*
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    LASTZ_PACKED — Pairwise alignment for a pack of reference × query partition pairs
+    One multi-core task runs bin/run_lastz_packed.py, which schedules the pairs
+    locally (ordered by reference partition, bounded by task.cpus and
+    task.memory) and calls run_lastz_intermediate_layer.py for each of them.
+    Outputs are the same per-pair files the LASTZ module writes, plus
+    packed_pairs.tsv mapping every finished pair to its output file.
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+*/
+
+process LASTZ_PACKED {
+    tag "${pairs.size()} pairs from ${pairs[0][0]}"
+    label 'process_medium'
+
+    conda "${moduleDir}/environment.yml"
+    container "${ workflow.containerEngine == 'singularity' && !task.ext.singularity_pull_docker_container ?
+        'https://depot.galaxyproject.org/singularity/lastz:1.04.52--h7b50bb2_1' :
+        'ghcr.io/hillerlab/pylastz:latest' }"
+
+    input:
+    // pairs: list of [reference_part, query_part] of one alignment (meta.pair),
+    // followed by the genome files of that alignment as in LASTZ.
+    tuple val(meta), val(pairs),
+          path(reference_twobit), path(query_twobit),
+          path(reference_chrom_sizes), path(query_chrom_sizes),
+          path(reference_chroms_dir), path(query_chroms_dir),
+          path(reference_bulks), path(query_bulks)
+    val   lastz_k
+    val   lastz_h
+    val   lastz_l
+    val   lastz_y
+
+    output:
+    // Empty pairs write no PSL, so a pack may finish with none at all.
+    tuple val(meta), path("packed_pairs.tsv"), path("*.psl", arity: '0..*'), emit: psl
+    path  "versions.yml",                                    emit: versions
+
+    script:
+    def max_memory = task.memory ? task.memory.toBytes() : 0
+    def pair_args  = pairs.collect { ref, qry -> "'${ref}' '${qry}'" }.join(' ')
+    """
+    printf '%s\\t%s\\n' ${pair_args} > pairs.tsv
+
+    # Write minimal pipeline params JSON so run_lastz* scripts can read chrom.sizes
+    cat > params.json << 'JSONEOF'
+    {
+        "seq_1_len": "${reference_chrom_sizes.name}",
+        "seq_2_len": "${query_chrom_sizes.name}",
+        "lastz_k": ${lastz_k},
+        "lastz_h": ${lastz_h},
+        "lastz_l": ${lastz_l},
+        "lastz_y": ${lastz_y},
+        "seq_store_dir": "${task.ext.seq_store_dir ?: ''}",
+        "seq_store_max_size": "${task.ext.seq_store_max_size ?: ''}",
+        "seq_fifo": ${task.ext.seq_fifo ? 'true' : 'false'},
+        "seq_fifo_timeout": "${task.ext.seq_fifo_timeout ?: ''}",
+        "orientation": "${task.ext.orientation ?: 'reference'}"
+    }
+    JSONEOF
+
+    run_lastz_packed.py \\
+        --pairs pairs.tsv \\
+        --params_json params.json \\
+        --done packed_pairs.tsv \\
+        --threads ${task.cpus} \\
+        --max_memory ${max_memory} \\
+        --intermediate_script run_lastz_intermediate_layer.py \\
+        --run_lastz_script run_lastz.py \\
+        --output_format psl \\
+        --reference_chrom_dir ${reference_chroms_dir} \\
+        --query_chrom_dir ${query_chroms_dir}
+
+    cat <<-END_VERSIONS > versions.yml
+    "${task.process}":
+        lastz: \$(lastz --version 2>&1 | head -1)
+        python: \$(python --version 2>&1 | awk '{print \$2}')
+        axtToPsl: 482
+    END_VERSIONS
+    """
+}
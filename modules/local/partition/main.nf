@@ -2,7 +2,14 @@
 ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     PARTITION — Divide genome into chunks for parallel LASTZ alignment
     Calls bin/partition.py which outputs partition strings using the .2bit basename
-    so they resolve correctly in Nextflow work directories.
+    so they resolve correctly in Nextflow work directories. With
+    params.genome_cache_dir set, partitions are reused from the genome cache.
+    With params.partition_gap_aware, the .2bit N-block table is read so chunk
+    boundaries move into assembly gaps and all-N windows are dropped.
+    With params.bulk_manifests, small scaffolds are packed first-fit decreasing
+    and each BULK partition references its member list in <label>_bulks/
+    instead of naming every scaffold; the directory is always emitted (empty
+    otherwise) and staged into the LASTZ tasks.
 ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 */
 
@@ -23,16 +30,28 @@ process PARTITION {
 
     output:
     tuple val(genome_name), path("${genome_label}_partitions.txt"), emit: partitions
+    tuple val(genome_name), path("${genome_label}_bulks"),          emit: bulks
+    tuple val(genome_name), path("${genome_label}_partition_report.tsv"), emit: report, optional: true
     path "versions.yml",                                              emit: versions
 
     script:
+    def cache_arg = params.genome_cache_dir ? "--cache_dir ${params.genome_cache_dir}" : ''
+    def bulk_args = params.bulk_manifests ? "--bulk_manifest_dir ${genome_label}_bulks" : ''
+    if (params.bulk_max_bases)  bulk_args += " --bulk_max_bases ${params.bulk_max_bases}"
+    if (params.bulk_max_chroms) bulk_args += " --bulk_max_chroms ${params.bulk_max_chroms}"
+    def gap_args  = params.partition_gap_aware ?
+        "--twobit ${twobit} --gap_tolerance ${params.partition_gap_tolerance} --min_gap ${params.partition_min_gap} --report ${genome_label}_partition_report.tsv" : ''
     """
+    mkdir -p ${genome_label}_bulks
     partition.py \\
         --chrom_sizes ${chrom_sizes} \\
         --twobit_name ${twobit.name} \\
         --chunk_size ${chunk_size} \\
         --overlap ${overlap} \\
-        --output ${genome_label}_partitions.txt
+        --output ${genome_label}_partitions.txt \\
+        ${cache_arg} \\
+        ${bulk_args} \\
+        ${gap_args}
 
     cat <<-END_VERSIONS > versions.yml
     "${task.process}":
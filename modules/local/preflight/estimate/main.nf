@@ -0,0 +1,50 @@
+/*
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    PREFLIGHT_ESTIMATE — Predict the LASTZ CPU-hours of one alignment.
+    Calls bin/preflight.py estimate, which partitions both chrom.sizes files
+    like PARTITION and sums the LASTZ runtime of the resource model over all
+    reference x query tasks. In abort mode (task.ext.mode) an estimate above
+    task.ext.max_cpu_hours fails the task before LASTZ tasks are submitted.
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+*/
+
+process PREFLIGHT_ESTIMATE {
+    tag "$pair"
+    label 'process_fast'
+
+    conda "${moduleDir}/environment.yml"
+    container "${ workflow.containerEngine == 'singularity' && !task.ext.singularity_pull_docker_container ?
+        'https://depot.galaxyproject.org/singularity/python:3.8.0--2' :
+        'biocontainers/python:3.11' }"
+
+    input:
+    tuple val(pair), path(reference_chrom_sizes, stageAs: 'reference/*'), path(query_chrom_sizes, stageAs: 'query/*')
+    path resource_model
+
+    output:
+    tuple val(pair), path("${pair}.preflight.tsv"),        emit: report
+    tuple val(pair), path("${pair}.preflight_issues.txt"), emit: issues
+    path "versions.yml",                                   emit: versions
+
+    script:
+    def mode      = task.ext.mode ?: 'warn'
+    def max_hours = task.ext.max_cpu_hours ? "--max_cpu_hours ${task.ext.max_cpu_hours}" : ''
+    """
+    preflight.py estimate \\
+        --reference_chrom_sizes ${reference_chrom_sizes} \\
+        --query_chrom_sizes ${query_chrom_sizes} \\
+        --seq1_chunk ${params.seq1_chunk} \\
+        --seq1_lap ${params.seq1_lap} \\
+        --seq2_chunk ${params.seq2_chunk} \\
+        --seq2_lap ${params.seq2_lap} \\
+        --name ${pair} \\
+        --resource_model ${resource_model} \\
+        --mode ${mode} \\
+        ${max_hours}
+
+    cat <<-END_VERSIONS > versions.yml
+    "${task.process}":
+        python: \$(python --version 2>&1 | awk '{print \$2}')
+    END_VERSIONS
+    """
+}
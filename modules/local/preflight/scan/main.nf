@@ -0,0 +1,44 @@
+/*
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    PREFLIGHT_SCAN — Check the masking and scaffold names of a prepared genome.
+    Calls bin/preflight.py scan, which reads only the sequence index, N-block
+    and soft-mask tables of the .2bit: soft-masked fraction, N content,
+    interior N runs per Mb (hardmasking) and scaffold names that break
+    partition strings. In abort mode (task.ext.mode) an error-level finding
+    fails the task before any partition or LASTZ task starts.
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+*/
+
+process PREFLIGHT_SCAN {
+    tag "$genome_name"
+    label 'process_fast'
+
+    conda "${moduleDir}/environment.yml"
+    container "${ workflow.containerEngine == 'singularity' && !task.ext.singularity_pull_docker_container ?
+        'https://depot.galaxyproject.org/singularity/python:3.8.0--2' :
+        'biocontainers/python:3.11' }"
+
+    input:
+    tuple val(genome_name), path(twobit)
+
+    output:
+    tuple val(genome_name), path("${genome_name}.preflight.tsv"),        emit: report
+    tuple val(genome_name), path("${genome_name}.preflight_issues.txt"), emit: issues
+    path "versions.yml",                                                 emit: versions
+
+    script:
+    def mode       = task.ext.mode ?: 'warn'
+    def min_masked = task.ext.min_masked != null ? "--min_masked ${task.ext.min_masked}" : ''
+    """
+    preflight.py scan \\
+        --twobit ${twobit} \\
+        --name ${genome_name} \\
+        --mode ${mode} \\
+        ${min_masked}
+
+    cat <<-END_VERSIONS > versions.yml
+    "${task.process}":
+        python: \$(python --version 2>&1 | awk '{print \$2}')
+    END_VERSIONS
+    """
+}
@@ -0,0 +1,51 @@
+/*
+Copyright (c) 2026 The Hiller Lab at the Senckenberg Gessellschaft für Naturforschung
+Distributed under the terms of the Apache License, Version 2.0.
+*/
+
+/*
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    PSL_DEDUP — Drop alignments duplicated by overlapping query chunks.
+    Calls bin/psl_dedup.py on one sorted reference bucket (PSL_MERGE_SORTED
+    output). All copies of an alignment
+    found by adjacent query chunks share the reference chunk, so they always
+    land in the same bucket.
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+*/
+
+process PSL_DEDUP {
+    tag "$meta.id"
+    label 'process_fast'
+
+    conda "${moduleDir}/environment.yml"
+    container "${ workflow.containerEngine == 'singularity' && !task.ext.singularity_pull_docker_container ?
+        'https://depot.galaxyproject.org/singularity/python:3.8.0--2' :
+        'biocontainers/python:3.11' }"
+
+    input:
+    tuple val(meta), path(psl), path(query_partitions)
+
+    output:
+    tuple val(meta), path("*.dedup.psl"), emit: psl
+    tuple val(meta), path("*.dedup_report.tsv"), emit: report
+    path "versions.yml",                  emit: versions
+
+    when:
+    task.ext.when == null || task.ext.when
+
+    script:
+    def prefix = task.ext.prefix ?: "${meta.id}"
+    """
+    psl_dedup.py \\
+        --psl ${psl} \\
+        --query_partitions ${query_partitions} \\
+        --output ${prefix}.dedup.psl \\
+        --report ${prefix}.dedup_report.tsv \\
+        --name ${meta.id}
+
+    cat <<-END_VERSIONS > versions.yml
+    "${task.process}":
+        python: \$(python --version 2>&1 | awk '{print \$2}')
+    END_VERSIONS
+    """
+}
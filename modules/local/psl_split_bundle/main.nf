@@ -0,0 +1,60 @@
+/*
+Copyright (c) 2026 The Hiller Lab at the Senckenberg Gessellschaft für Naturforschung
+Distributed under the terms of the Apache License, Version 2.0.
+*/
+
+/*
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    PSL_SPLIT_BUNDLE — Split merged PSL files by target chromosome into bundles.
+    Calls bin/psl_split_bundle.py, which plans bundles from chrom.sizes and
+    routes every record to its bundle (bundle.N.psl) in one streaming pass.
+    Each bundle is processed independently by AXT_CHAIN. With min_score > 0,
+    (target, query, strand) groups that cannot reach that chain score are
+    dropped first; axtChain would discard their chains anyway.
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+*/
+
+process PSL_SPLIT_BUNDLE {
+    tag "$meta.id"
+    label 'process_fast'
+
+    conda "${moduleDir}/environment.yml"
+    container "${ workflow.containerEngine == 'singularity' && !task.ext.singularity_pull_docker_container ?
+        'https://depot.galaxyproject.org/singularity/python:3.8.0--2' :
+        'biocontainers/python:3.11' }"
+
+    input:
+    tuple val(meta), path(psls, stageAs: "psl_in/*"), path(reference_chrom_sizes)
+    val   max_bases
+    val   min_score     // 0 keeps every record
+    val   score_scheme  // axtChain score matrix file, or empty string ''
+
+    output:
+    tuple val(meta), path("split_psl/*.psl"), emit: bundles
+    path "versions.yml",                      emit: versions
+
+    when:
+    task.ext.when == null || task.ext.when
+
+    script:
+    def args = task.ext.args ?: ''
+    def prune_args = min_score ? "--min_score ${min_score}" : ''
+    if (min_score && score_scheme) prune_args += " --score_scheme ${score_scheme}"
+    """
+    ls psl_in/* > psl.list
+
+    psl_split_bundle.py \\
+        $args \\
+        --file_list psl.list \\
+        --chrom_sizes ${reference_chrom_sizes} \\
+        --output_dir split_psl \\
+        --max_bases ${max_bases} \\
+        --tmp_dir . \\
+        ${prune_args}
+
+    cat <<-END_VERSIONS > versions.yml
+    "${task.process}":
+        python: \$(python --version 2>&1 | awk '{print \$2}')
+    END_VERSIONS
+    """
+}
@@ -16,9 +16,7 @@ process REPEAT_FILLER {
         'ghcr.io/hillerlab/repeat_filler:latest' }"
 
     input:
-    path chain_chunk         // one infill_chain_N file
-    path target_twobit
-    path query_twobit
+    tuple val(meta), path(chain_chunk), path(target_twobit), path(query_twobit) // one infill_chain_N file
     val  chain_min_score
     val  fill_gap_max_size_t
     val  fill_gap_max_size_q
@@ -31,8 +29,8 @@ process REPEAT_FILLER {
     val  skip_fill_unmask
 
     output:
-    path "${chain_chunk.name}.filled.chain", emit: filled_chain
-    path "versions.yml",                      emit: versions
+    tuple val(meta), path("${chain_chunk.name}.filled.chain"), emit: filled_chain
+    path "versions.yml",                                       emit: versions
 
     script:
     def unmask_arg = skip_fill_unmask ? '' : '--unmask'
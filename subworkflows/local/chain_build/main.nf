@@ -6,76 +6,197 @@ Distributed under the terms of the Apache License, Version 2.0.
 /*
 ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     CHAIN_BUILD subworkflow
-    1. PSL_SORT_ACC — sort all PSL files by target chromosome
-    2. PSL_BUNDLE   — group sorted PSL files into chromosome bundles
-    3. AXT_CHAIN    — convert each PSL bundle to chains (parallel)
-    4. CHAINTOOLS_MERGE — merge all chain files into one compressed chain
+    1. PSL_SPLIT_BUNDLE — route every PSL record to its target-chromosome
+                          bundle in one streaming pass; with
+                          params.psl_score_prune, records that cannot form
+                          a chain of params.min_chain_score are dropped
+    2. AXT_CHAIN    — convert each PSL bundle to chains (parallel)
+    3. CHAINTOOLS_ANTIREPEAT — anti-repeat filter on each chain file
+    4. CHAINTOOLS_MERGE — merge all chain files into one compressed chain;
+                          with params.chain_merge_fan_in > 1 the chains are
+                          first merged in batches (CHAIN_MERGE_TREE)
+
+    Runs once per alignment (meta.pair); the merge of an alignment starts as
+    soon as all of its own bundles are chained. With params.chain_streaming
+    the PSL arrives per reference chromosome group (meta.group, meta.groups)
+    and every group is split and chained as soon as LASTZ has finished it
+    (groups without alignments arrive with no files and are only counted);
+    the merge then also waits for the LASTZ integrity check. With
+    params.intermediate_lifecycle each step's inputs are released once every
+    task of the alignment has consumed them; the merged chain is kept as the
+    FROM_FILL_CHAINS checkpoint.
 
     Emits: merged_chain — *.all.chain.gz
+           ledger       — release ledgers (empty unless params.intermediate_lifecycle)
 ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 */
 
-include { PSL_BUNDLE       } from '../../../modules/local/psl_bundle/main'
+include { PSL_SPLIT_BUNDLE } from '../../../modules/local/psl_split_bundle/main'
 include { AXT_CHAIN        } from '../../../modules/local/axt_chain/main'
 include { CHAINTOOLS_ANTIREPEAT } from '../../../modules/local/chaintools/antirepeat/main'
 include { CHAINTOOLS_MERGE } from '../../../modules/local/chaintools/merge/main'
-include { PSLTOOLS_SPLIT } from '../../../modules/local/psltools/split/main'
+include { INTERMEDIATE_RELEASE as RELEASE_ALIGNMENT_PSL     } from '../../../modules/local/intermediate_lifecycle/release/main'
+include { INTERMEDIATE_RELEASE as RELEASE_BUNDLES           } from '../../../modules/local/intermediate_lifecycle/release/main'
+include { INTERMEDIATE_RELEASE as RELEASE_AXT_CHAINS        } from '../../../modules/local/intermediate_lifecycle/release/main'
+include { INTERMEDIATE_RELEASE as RELEASE_ANTIREPEAT_CHAINS } from '../../../modules/local/intermediate_lifecycle/release/main'
+include { INTERMEDIATE_RELEASE as RELEASE_PARTIAL_CHAINS    } from '../../../modules/local/intermediate_lifecycle/release/main'
+include { CHAIN_MERGE_TREE } from '../chain_merge_tree/main'
+include { withTwobits; groupByPair; scatterByPair } from '../utils_pairs/main'
 
 workflow CHAIN_BUILD {
     take:
-    psl_files              // channel of .psl files from LASTZ_ALIGNMENT
-    reference_twobit       // path
-    query_twobit           // path
-    reference_chrom_sizes  // path
-    reference_name         // val
-    query_name             // val
+    psl_files   // tuple: (meta, [merged .psl files]) from LASTZ_ALIGNMENT
+    genomes     // tuple: (pair, reference_twobit, query_twobit, reference_chrom_sizes, query_chrom_sizes)
+    verified    // val: completed LASTZ pairs, once the integrity check has passed
 
     main:
-    // ── Split all PSL files by chromosome ───────────────────────────────────
-    PSLTOOLS_SPLIT (
-        psl_files
+    // Streamed chromosome groups without alignments only count towards the
+    // groups of their alignment.
+    ch_psl_groups   = psl_files.filter { _meta, psls -> psls }
+    ch_empty_groups = psl_files
+        .filter { _meta, psls -> !psls }
+        .map { meta, _psls -> [ meta, [] ] }
+
+    // ── Split PSL by chromosome straight into bundles for parallel axtChain ─
+    PSL_SPLIT_BUNDLE (
+        ch_psl_groups
+            .map { meta, psls -> [ meta.pair, meta, psls ] }
+            .combine( genomes.map { pair, _rtb, _qtb, rcs, _qcs -> [ pair, rcs ] }, by: 0 )
+            .map { _pair, meta, psls, reference_chrom_sizes -> [ meta, psls, reference_chrom_sizes ] },
+        params.bundle_psl_max_bases,
+        params.psl_score_prune ? params.min_chain_score : 0,
+        params.lastz_q ?: ''
     )
 
-    PSLTOOLS_SPLIT.out.psl
-        .map { meta, psl -> psl }
-        .collect()
-        .set { ch_psl_files }
+    // INFO: (pair, [bundles]) once every chromosome group of the alignment
+    // is split (a single item without params.chain_streaming)
+    ch_pair_bundles = PSL_SPLIT_BUNDLE.out.bundles
+        .mix( ch_empty_groups )
+        .map { meta, bundles -> [ groupKey(meta.pair, meta.groups ?: 1), bundles ] }
+        .groupTuple( remainder: true )
+        .map { key, bundles ->
+            [ key.getGroupTarget(), bundles.collectMany { b -> b instanceof List ? b : [ b ] } ]
+        }
 
-    // ── Bundle sorted PSL files by chromosome for parallel axtChain ────────
-    PSL_BUNDLE (
-        ch_psl_files,
-        reference_chrom_sizes,
-        params.bundle_psl_max_bases
+    // ── Run axtChain on each bundle in parallel ─────────────────────────────
+    // one channel item per bundle file
+    ch_bundles = scatterByPair(
+        PSL_SPLIT_BUNDLE.out.bundles.map { meta, bundles -> [ [ pair: meta.pair ], bundles ] },
+        'group_bundles'
     )
 
-    // ── Run axtChain on each bundle in parallel ─────────────────────────────
     AXT_CHAIN (
-        PSL_BUNDLE.out.bundles.flatten(),  // one channel item per bundle file
-        reference_twobit,
-        query_twobit,
+        withTwobits(ch_bundles, genomes),
         params.min_chain_score,
         params.chain_linear_gap,
         params.lastz_q ?: ''
     )
 
+    // Number of bundles of the whole alignment, known once all of its
+    // groups are split; chaining does not wait for it.
+    ch_chains = AXT_CHAIN.out.chain
+        .map { meta, chain -> [ meta.pair, meta, chain ] }
+        .combine( ch_pair_bundles.map { pair, bundles -> [ pair, bundles.size() ] }, by: 0 )
+        .map { _pair, meta, chain, n -> [ meta + [ bundles: n ], chain ] }
+
     // ── Run anti repeat on each chain ─────────────────────────────────────────
     CHAINTOOLS_ANTIREPEAT (
-      AXT_CHAIN.out.chain,
-      reference_twobit,
-      query_twobit,
+        withTwobits(ch_chains, genomes)
     )
 
-    // ── Merge all chain files into one ────────────────────────────────────────
+    // ── Merge all chain files of each alignment into one ──────────────────────
+    // INFO: (pair, [chains]) once every bundle of the alignment is done
+    ch_axt_chains        = groupByPair(ch_chains, 'bundles')
+    ch_antirepeat_chains = groupByPair(CHAINTOOLS_ANTIREPEAT.out.chain, 'bundles')
+
+    // With params.chain_merge_fan_in > 1 the chains are pre-merged in batches
+    // while the last bundles are still chained.
+    ch_merge_inputs = ch_antirepeat_chains
+    ch_partials     = Channel.empty()
+    ch_versions     = Channel.empty()
+    if (params.chain_merge_fan_in > 1) {
+        CHAIN_MERGE_TREE ( CHAINTOOLS_ANTIREPEAT.out.chain, 'bundles', params.chain_merge_fan_in )
+        ch_merge_inputs = CHAIN_MERGE_TREE.out.chains
+        ch_partials     = CHAIN_MERGE_TREE.out.chains
+        ch_versions     = CHAIN_MERGE_TREE.out.versions
+    }
+
+    // Streamed alignments are only merged once no LASTZ pair was lost.
+    if (params.chain_streaming) {
+        ch_merge_inputs = ch_merge_inputs
+            .combine( verified )
+            .map { pair, chains, _n -> [ pair, chains ] }
+    }
+
     CHAINTOOLS_MERGE (
-        CHAINTOOLS_ANTIREPEAT.out.chain
-          .collect()
-          .map { chains -> [ [ id: reference_name + '.' + query_name ], chains ] }
+        ch_merge_inputs
+          .map { pair, chains -> [ [ id: pair, pair: pair ], chains ] }
     )
 
+    ch_versions = ch_versions
+        .mix( PSL_SPLIT_BUNDLE.out.versions,
+              AXT_CHAIN.out.versions,
+              CHAINTOOLS_ANTIREPEAT.out.versions,
+              CHAINTOOLS_MERGE.out.versions )
+
+    // ── Release intermediates as soon as they are consumed ──────────────────
+    ch_ledger = Channel.empty()
+    if (params.intermediate_lifecycle) {
+        // Merged (or deduplicated) bucket PSLs, once bundled
+        RELEASE_ALIGNMENT_PSL (
+            ch_psl_groups
+                .join( PSL_SPLIT_BUNDLE.out.bundles )
+                .map { meta, psls, _bundles -> [ meta, psls ] },
+            params.dedup_query_overlaps ? 'dedup_psl' : 'merged_psl',
+            params.intermediate_lifecycle
+        )
+
+        // PSL bundles, once every bundle is chained
+        RELEASE_BUNDLES (
+            ch_pair_bundles
+                .join( ch_axt_chains )
+                .map { pair, bundles, _chains -> [ [ id: pair, pair: pair ], bundles ] },
+            'psl_bundles',
+            params.intermediate_lifecycle
+        )
+
+        // Raw axtChain chains, once every chain is anti-repeat filtered
+        RELEASE_AXT_CHAINS (
+            ch_axt_chains
+                .join( ch_antirepeat_chains )
+                .map { pair, chains, _filtered -> [ [ id: pair, pair: pair ], chains ] },
+            'axt_chains',
+            params.intermediate_lifecycle
+        )
+
+        // Filtered chains, once merged
+        RELEASE_ANTIREPEAT_CHAINS (
+            ch_antirepeat_chains
+                .join( CHAINTOOLS_MERGE.out.chain_gz.map { meta, chain_gz -> [ meta.pair, chain_gz ] } )
+                .map { pair, chains, _merged -> [ [ id: pair, pair: pair ], chains ] },
+            'antirepeat_chains',
+            params.intermediate_lifecycle
+        )
+
+        // Partial merges of the merge tree, once merged (none without it)
+        RELEASE_PARTIAL_CHAINS (
+            ch_partials
+                .join( CHAINTOOLS_MERGE.out.chain_gz.map { meta, chain_gz -> [ meta.pair, chain_gz ] } )
+                .map { pair, chains, _merged -> [ [ id: pair, pair: pair ], chains ] },
+            'partial_chains',
+            params.intermediate_lifecycle
+        )
+
+        ch_ledger = RELEASE_ALIGNMENT_PSL.out.ledger
+            .mix( RELEASE_BUNDLES.out.ledger,
+                  RELEASE_AXT_CHAINS.out.ledger,
+                  RELEASE_ANTIREPEAT_CHAINS.out.ledger,
+                  RELEASE_PARTIAL_CHAINS.out.ledger )
+        ch_versions = ch_versions.mix(RELEASE_ALIGNMENT_PSL.out.versions)
+    }
+
     emit:
     merged_chain = CHAINTOOLS_MERGE.out.chain_gz
-    versions     = PSL_BUNDLE.out.versions
-                     .mix( AXT_CHAIN.out.versions,
-                           CHAINTOOLS_ANTIREPEAT.out.versions,
-                           CHAINTOOLS_MERGE.out.versions )
+    ledger       = ch_ledger
+    versions     = ch_versions
 }
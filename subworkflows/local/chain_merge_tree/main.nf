@@ -0,0 +1,61 @@
+/*
+Copyright (c) 2026 The Hiller Lab at the Senckenberg Gessellschaft für Naturforschung
+Distributed under the terms of the Apache License, Version 2.0.
+*/
+
+/*
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    CHAIN_MERGE_TREE subworkflow
+    First level of a tree-reduction merge of the chains of every alignment.
+
+    Chains are batched per alignment in arrival order: every fan_in chains
+    (or the last few of the alignment) are merged by one CHAINTOOLS_MERGE_PARTIAL
+    task as soon as they are done, so merging overlaps with the tail of the
+    upstream stage. Partial merges are sorted by chain id and keep the
+    original ids; the caller's final CHAINTOOLS_MERGE then combines
+    ceil(chains / fan_in) pre-sorted files and renames and compresses the
+    result as before.
+
+    Emits: chains — (pair, [partially merged chains]) once every batch of the
+                    alignment is merged, the shape of groupByPair
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+*/
+
+include { CHAINTOOLS_MERGE as CHAINTOOLS_MERGE_PARTIAL } from '../../../modules/local/chaintools/merge/main'
+include { groupByPair } from '../utils_pairs/main'
+
+workflow CHAIN_MERGE_TREE {
+    take:
+    chains    // tuple: (meta, chain) — meta.pair and meta[size_key] as from scatterByPair
+    size_key  // val: meta key holding the number of chains of the alignment
+    fan_in    // val: chains merged by one partial merge (> 1)
+
+    main:
+    // INFO: batch b of a pair holds its chains number b*fan_in .. (b+1)*fan_in-1
+    // in arrival order; the group key size releases each batch once complete.
+    def arrived = [:]
+    ch_batches = chains
+        .map { meta, chain ->
+            def total = meta[size_key] as int
+            def index
+            synchronized (arrived) {
+                index = arrived[meta.pair] ?: 0
+                arrived[meta.pair] = index + 1
+            }
+            def batch   = index.intdiv(fan_in)
+            def batches = (total + fan_in - 1).intdiv(fan_in)
+            def size    = Math.min(fan_in, total - batch * fan_in)
+            [ groupKey([ meta.pair, batch, batches ], size), chain ]
+        }
+        .groupTuple( remainder: true )
+        .map { key, group ->
+            def (pair, batch, batches) = key.getGroupTarget()
+            [ [ id: "${pair}.part${batch}".toString(), pair: pair, batches: batches ], group ]
+        }
+
+    CHAINTOOLS_MERGE_PARTIAL ( ch_batches )
+
+    emit:
+    chains   = groupByPair(CHAINTOOLS_MERGE_PARTIAL.out.chain, 'batches')
+    versions = CHAINTOOLS_MERGE_PARTIAL.out.versions
+}
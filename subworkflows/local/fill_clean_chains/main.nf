@@ -11,34 +11,58 @@ Distributed under the terms of the Apache License, Version 2.0.
     Steps (both conditional on params flags):
     1. CHAINTOOLS_SPLIT       — split merged chain into N parts
     2. REPEAT_FILLER          — fill gaps in each part in parallel
-    3. CHAINTOOLS_MERGE       — merge filled parts
-    4. CHAIN_CLEANER          — remove suspicious chains
+    3. CHAINTOOLS_MERGE       — merge filled parts; with
+                                params.chain_merge_fan_in > 1 they are first
+                                merged in batches (CHAIN_MERGE_TREE)
+    4. CHAIN_CLEANER          — remove suspicious chains; with
+                                params.clean_chain_shards > 1 the chains are
+                                split into independent shards (CHAIN_SHARD_SPLIT),
+                                cleaned in parallel and merged (CHAIN_SHARD_MERGE),
+                                optionally checked against a serial run
+                                (CHAIN_SHARD_VERIFY)
     5. CHAINTOOLS_FILTER      — apply minimum score filter → final.chain.gz
 
+    Runs once per alignment (meta.pair); per-alignment merges start as soon
+    as all parts of that alignment are done. With params.intermediate_lifecycle
+    each step's inputs are released once every task of the alignment has
+    consumed them; the filled and sorted chains are kept (published results
+    and the FROM_CLEAN_CHAINS checkpoint).
+
     Emits: final_chain — *.allfilled.chain.gz
+           ledger      — release ledgers (empty unless params.intermediate_lifecycle)
 ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 */
 
 include { REPEAT_FILLER     } from '../../../modules/local/repeat_filler/main'
 include { CHAIN_CLEANER     } from '../../../modules/local/chain_cleaner/main'
+include { CHAIN_CLEANER as CHAIN_CLEANER_SHARD  } from '../../../modules/local/chain_cleaner/main'
+include { CHAIN_CLEANER as CHAIN_CLEANER_SERIAL } from '../../../modules/local/chain_cleaner/main'
+include { CHAIN_SHARD_SPLIT  } from '../../../modules/local/chain_shard/split/main'
+include { CHAIN_SHARD_MERGE  } from '../../../modules/local/chain_shard/merge/main'
+include { CHAIN_SHARD_VERIFY } from '../../../modules/local/chain_shard/verify/main'
 include { CHAINTOOLS_SPLIT  } from '../../../modules/local/chaintools/split/main'
 include { CHAINTOOLS_SCORE  } from '../../../modules/local/chaintools/score/main'
 include { CHAINTOOLS_MERGE as CHAINTOOLS_MERGE_FILLED_CHAINS } from '../../../modules/local/chaintools/merge/main'
 include { CHAINTOOLS_FILTER as CHAINTOOLS_FILTER_CLEANED_CHAINS } from '../../../modules/local/chaintools/filter/main'
 include { CHAINTOOLS_SORT as CHAINTOOLS_SORT_MERGED_FILLED_CHAINS } from '../../../modules/local/chaintools/sort/main'
+include { INTERMEDIATE_RELEASE as RELEASE_FILL_CHUNKS    } from '../../../modules/local/intermediate_lifecycle/release/main'
+include { INTERMEDIATE_RELEASE as RELEASE_FILLED_CHAINS  } from '../../../modules/local/intermediate_lifecycle/release/main'
+include { INTERMEDIATE_RELEASE as RELEASE_SCORED_CHAINS  } from '../../../modules/local/intermediate_lifecycle/release/main'
+include { INTERMEDIATE_RELEASE as RELEASE_CHAIN_SHARDS   } from '../../../modules/local/intermediate_lifecycle/release/main'
+include { INTERMEDIATE_RELEASE as RELEASE_CLEANED_SHARDS } from '../../../modules/local/intermediate_lifecycle/release/main'
+include { INTERMEDIATE_RELEASE as RELEASE_CLEANED_CHAIN  } from '../../../modules/local/intermediate_lifecycle/release/main'
+include { INTERMEDIATE_RELEASE as RELEASE_PARTIAL_FILLED } from '../../../modules/local/intermediate_lifecycle/release/main'
+include { CHAIN_MERGE_TREE } from '../chain_merge_tree/main'
+include { withTwobits; withGenomes; groupByPair; scatterByPair } from '../utils_pairs/main'
 
 workflow FILL_CLEAN_CHAINS {
     take:
-    merged_chain        // path: *.all.chain.gz
-    reference_twobit       // path
-    query_twobit        // path
-    reference_chrom_sizes  // path
-    query_chrom_sizes   // path
-    reference_name         // val
-    query_name          // val
+    merged_chain   // tuple: (meta, *.all.chain.gz) — meta.pair names the alignment
+    genomes        // tuple: (pair, reference_twobit, query_twobit, reference_chrom_sizes, query_chrom_sizes)
 
     main:
     ch_versions = Channel.empty()
+    ch_ledger   = Channel.empty()
 
     // ── Fill chains (optional) ──────────────────────────────────────────────
     if (!params.skip_fill_chains) {
@@ -47,15 +71,13 @@ workflow FILL_CLEAN_CHAINS {
             params.num_fill_jobs
         )
 
-        CHAINTOOLS_SPLIT.out.chains
-        .map { meta, chains -> chains }
-        .flatten()
-        .set { ch_chains_to_fill }
+        ch_chains_to_fill = scatterByPair(
+            CHAINTOOLS_SPLIT.out.chains.map { meta, chains -> [ [ pair: meta.pair ], chains ] },
+            'chunks'
+        )
 
         REPEAT_FILLER (
-            ch_chains_to_fill,
-            reference_twobit,
-            query_twobit,
+            withTwobits(ch_chains_to_fill, genomes),
             params.min_chain_score,
             params.fill_gap_max_size_t,
             params.fill_gap_max_size_q,
@@ -69,15 +91,26 @@ workflow FILL_CLEAN_CHAINS {
         )
 
         CHAINTOOLS_SCORE (
-            REPEAT_FILLER.out.filled_chain,
-            reference_twobit,
-            query_twobit
+            withTwobits(REPEAT_FILLER.out.filled_chain, genomes)
         )
 
+        // INFO: (pair, [chains]) once every chunk of the alignment is done
+        ch_filled_chains = groupByPair(REPEAT_FILLER.out.filled_chain, 'chunks')
+        ch_scored_chains = groupByPair(CHAINTOOLS_SCORE.out.chain, 'chunks')
+
+        // Pre-merge scored chunks in batches while the last ones are filled
+        ch_merge_inputs = ch_scored_chains
+        ch_partials     = Channel.empty()
+        if (params.chain_merge_fan_in > 1) {
+            CHAIN_MERGE_TREE ( CHAINTOOLS_SCORE.out.chain, 'chunks', params.chain_merge_fan_in )
+            ch_merge_inputs = CHAIN_MERGE_TREE.out.chains
+            ch_partials     = CHAIN_MERGE_TREE.out.chains
+            ch_versions     = ch_versions.mix(CHAIN_MERGE_TREE.out.versions)
+        }
+
         CHAINTOOLS_MERGE_FILLED_CHAINS (
-            CHAINTOOLS_SCORE.out.chain
-              .collect()
-              .map { chains -> [ [ id: reference_name + '.' + query_name + '.filled' ], chains ] }
+            ch_merge_inputs
+              .map { pair, chains -> [ [ id: "${pair}.filled".toString(), pair: pair ], chains ] }
         )
 
         CHAINTOOLS_SORT_MERGED_FILLED_CHAINS (
@@ -90,36 +123,167 @@ workflow FILL_CLEAN_CHAINS {
         ch_versions = ch_versions.mix(REPEAT_FILLER.out.versions)
         ch_versions = ch_versions.mix(CHAINTOOLS_MERGE_FILLED_CHAINS.out.versions)
         ch_versions = ch_versions.mix(CHAINTOOLS_SCORE.out.versions)
+
+        if (params.intermediate_lifecycle) {
+            // Chain chunks once filled, filled chunks once scored, scored
+            // chunks once merged
+            RELEASE_FILL_CHUNKS (
+                CHAINTOOLS_SPLIT.out.chains
+                    .map { meta, chains -> [ meta.pair, meta, chains ] }
+                    .join( ch_filled_chains )
+                    .map { _pair, meta, chains, _filled -> [ meta, chains ] },
+                'fill_chunks',
+                params.intermediate_lifecycle
+            )
+            RELEASE_FILLED_CHAINS (
+                ch_filled_chains
+                    .join( ch_scored_chains )
+                    .map { pair, chains, _scored -> [ [ id: pair, pair: pair ], chains ] },
+                'filled_chains',
+                params.intermediate_lifecycle
+            )
+            RELEASE_SCORED_CHAINS (
+                ch_scored_chains
+                    .join( CHAINTOOLS_MERGE_FILLED_CHAINS.out.chain_gz.map { meta, chain_gz -> [ meta.pair, chain_gz ] } )
+                    .map { pair, chains, _merged -> [ [ id: pair, pair: pair ], chains ] },
+                'scored_chains',
+                params.intermediate_lifecycle
+            )
+            RELEASE_PARTIAL_FILLED (
+                ch_partials
+                    .join( CHAINTOOLS_MERGE_FILLED_CHAINS.out.chain_gz.map { meta, chain_gz -> [ meta.pair, chain_gz ] } )
+                    .map { pair, chains, _merged -> [ [ id: pair, pair: pair ], chains ] },
+                'partial_filled_chains',
+                params.intermediate_lifecycle
+            )
+            ch_ledger = ch_ledger.mix( RELEASE_FILL_CHUNKS.out.ledger,
+                                       RELEASE_FILLED_CHAINS.out.ledger,
+                                       RELEASE_SCORED_CHAINS.out.ledger,
+                                       RELEASE_PARTIAL_FILLED.out.ledger )
+            ch_versions = ch_versions.mix(RELEASE_FILL_CHUNKS.out.versions)
+        }
     } else {
         ch_chain_for_clean = merged_chain
     }
 
     // ── Clean chains (optional) ─────────────────────────────────────────────
     if (!params.skip_clean_chain) {
-        CHAIN_CLEANER (
-            ch_chain_for_clean,
-            reference_twobit,
-            query_twobit,
-            reference_chrom_sizes,
-            query_chrom_sizes,
-            params.chain_linear_gap,
-            params.clean_chain_parameters
-        )
+        if (params.clean_chain_shards > 1) {
+            CHAIN_SHARD_SPLIT (
+                ch_chain_for_clean,
+                params.clean_chain_shards,
+                params.clean_chain_shard_mode
+            )
+
+            // One chainCleaner task per shard; meta.shard names its outputs.
+            ch_shards = scatterByPair(CHAIN_SHARD_SPLIT.out.shards, 'shards')
+                .map { meta, shard -> [ meta + [ shard: shard.baseName ], shard ] }
+
+            CHAIN_CLEANER_SHARD (
+                withGenomes(ch_shards, genomes),
+                params.chain_linear_gap,
+                params.clean_chain_parameters
+            )
+
+            // INFO: (pair, [files]) once every shard of the alignment is cleaned
+            ch_cleaned_shards = groupByPair(CHAIN_CLEANER_SHARD.out.cleaned_chain, 'shards')
+            ch_suspect_shards = groupByPair(CHAIN_CLEANER_SHARD.out.suspects_bed, 'shards')
+
+            CHAIN_SHARD_MERGE (
+                CHAIN_SHARD_SPLIT.out.manifest
+                    .map { meta, manifest -> [ meta.pair, meta, manifest ] }
+                    .join( ch_cleaned_shards )
+                    .join( ch_suspect_shards )
+                    .map { _pair, meta, manifest, chains, beds -> [ meta, manifest, chains, beds ] }
+            )
+
+            ch_cleaned = CHAIN_SHARD_MERGE.out.cleaned_chain
+
+            ch_versions = ch_versions.mix(CHAIN_SHARD_SPLIT.out.versions)
+            ch_versions = ch_versions.mix(CHAIN_CLEANER_SHARD.out.versions)
+            ch_versions = ch_versions.mix(CHAIN_SHARD_MERGE.out.versions)
+
+            if (params.intermediate_lifecycle) {
+                // Shards once all are cleaned, cleaned shards once merged
+                RELEASE_CHAIN_SHARDS (
+                    CHAIN_SHARD_SPLIT.out.shards
+                        .map { meta, shards -> [ meta.pair, meta, shards ] }
+                        .join( ch_cleaned_shards )
+                        .map { _pair, meta, shards, _cleaned -> [ meta, shards ] },
+                    'chain_shards',
+                    params.intermediate_lifecycle
+                )
+                RELEASE_CLEANED_SHARDS (
+                    ch_cleaned_shards
+                        .join( ch_suspect_shards )
+                        .join( CHAIN_SHARD_MERGE.out.cleaned_chain.map { meta, chain -> [ meta.pair, chain ] } )
+                        .map { pair, chains, beds, _merged -> [ [ id: pair, pair: pair ], chains + beds ] },
+                    'cleaned_shards',
+                    params.intermediate_lifecycle
+                )
+                ch_ledger = ch_ledger.mix( RELEASE_CHAIN_SHARDS.out.ledger,
+                                           RELEASE_CLEANED_SHARDS.out.ledger )
+            }
+
+            if (params.clean_chain_verify_sharding) {
+                CHAIN_CLEANER_SERIAL (
+                    withGenomes(ch_chain_for_clean, genomes),
+                    params.chain_linear_gap,
+                    params.clean_chain_parameters
+                )
+
+                CHAIN_SHARD_VERIFY (
+                    CHAIN_SHARD_MERGE.out.cleaned_chain.map { meta, chain -> [ meta.pair, meta, chain ] }
+                        .join( CHAIN_SHARD_MERGE.out.suspects_bed.map { meta, bed -> [ meta.pair, bed ] } )
+                        .join( CHAIN_CLEANER_SERIAL.out.cleaned_chain.map { meta, chain -> [ meta.pair, chain ] } )
+                        .join( CHAIN_CLEANER_SERIAL.out.suspects_bed.map { meta, bed -> [ meta.pair, bed ] } )
+                        .map { _pair, meta, sharded_chain, sharded_bed, serial_chain, serial_bed ->
+                            [ meta, serial_chain, serial_bed, sharded_chain, sharded_bed ]
+                        }
+                )
+
+                ch_versions = ch_versions.mix(CHAIN_CLEANER_SERIAL.out.versions)
+                ch_versions = ch_versions.mix(CHAIN_SHARD_VERIFY.out.versions)
+            }
+        } else {
+            CHAIN_CLEANER (
+                withGenomes(ch_chain_for_clean, genomes),
+                params.chain_linear_gap,
+                params.clean_chain_parameters
+            )
+
+            ch_cleaned = CHAIN_CLEANER.out.cleaned_chain
+
+            ch_versions = ch_versions.mix(CHAIN_CLEANER.out.versions)
+        }
 
         CHAINTOOLS_FILTER_CLEANED_CHAINS (
-            CHAIN_CLEANER.out.cleaned_chain,
+            ch_cleaned,
             params.min_chain_score,
         )
 
         ch_final = CHAINTOOLS_FILTER_CLEANED_CHAINS.out.chain_gz
 
-        ch_versions = ch_versions.mix(CHAIN_CLEANER.out.versions)
         ch_versions = ch_versions.mix(CHAINTOOLS_FILTER_CLEANED_CHAINS.out.versions)
+
+        // The cleaned chain once filtered; CHAIN_SHARD_VERIFY reads it too
+        if (params.intermediate_lifecycle && !(params.clean_chain_shards > 1 && params.clean_chain_verify_sharding)) {
+            RELEASE_CLEANED_CHAIN (
+                ch_cleaned
+                    .map { meta, chain -> [ meta.pair, meta, chain ] }
+                    .join( ch_final.map { meta, chain_gz -> [ meta.pair, chain_gz ] } )
+                    .map { _pair, meta, chain, _final -> [ meta, chain ] },
+                'cleaned_chain',
+                params.intermediate_lifecycle
+            )
+            ch_ledger   = ch_ledger.mix(RELEASE_CLEANED_CHAIN.out.ledger)
+            ch_versions = ch_versions.mix(RELEASE_CLEANED_CHAIN.out.versions)
+        }
     } else {
         // If not cleaning, the output of the fill step is the final chain.
         // Rename for consistent output naming.
-        ch_final = ch_chain_for_clean.map { chain_gz ->
-            def final_name = "${reference_name}.${query_name}.final.chain.gz"
+        ch_final = ch_chain_for_clean.map { meta, chain_gz ->
+            def final_name = "${meta.pair}.final.chain.gz"
             // Stage a copy with the final name
             [ chain_gz, final_name ]
         }
@@ -129,5 +293,6 @@ workflow FILL_CLEAN_CHAINS {
 
     emit:
     final_chain = ch_final
+    ledger      = ch_ledger
     versions    = ch_versions
 }
@@ -6,20 +6,42 @@ Distributed under the terms of the Apache License, Version 2.0.
 /*
 ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     LASTZ_ALIGNMENT subworkflow
-    1. Partition reference and query genomes into chunks
-    2. Create N×K alignment pairs via channel.combine()
-    3. Run LASTZ on each pair in parallel
-    4. Group PSL outputs by reference-partition bucket
-    5. Concatenate (PSLTOOLS_MERGE)
+    Aligns any number of genome pairs; every genome is partitioned once per
+    role (reference/query) however many pairs it takes part in.
+    1. Partition reference and query genomes into chunks (gap-aware with
+       params.partition_gap_aware: boundaries in assembly gaps, no all-N chunks)
+    2. Create the N×K partition pairs of every alignment via channel.combine()
+    3. Run LASTZ on each pair in parallel — one task per pair (LASTZ), or
+       packs of params.lastz_pack_size pairs per multi-core task (LASTZ_PACKED).
+       Tasks of all alignments form one queue ordered by estimated cost,
+       largest first.
+    4. Group finished pairs by alignment and reference-partition bucket;
+       buckets without any alignment skip the merge
+    5. Merge each bucket's sorted per-pair PSLs in one streaming pass (PSL_MERGE_SORTED)
+    6. Optionally drop alignments duplicated by query chunk overlaps (PSL_DEDUP)
+    7. With params.intermediate_lifecycle, release the per-pair PSLs of each
+       bucket once it is merged (and merged buckets once deduplicated)
 
-    Emits: psl_gz — all .psl.gz files ready for PSL_SORT_ACC
+    Emits: psl_gz   — one (meta, [merged .psl files]) item per alignment, released
+                      as soon as all of its buckets are merged; with
+                      params.chain_streaming one item per reference chromosome
+                      group (every chunk of a chromosome, or one BULK) instead,
+                      released as soon as the buckets of the group are merged;
+                      a group whose pairs found no alignment has no files
+           verified — number of completed LASTZ pairs, once the integrity
+                      check of the whole run has passed
+           ledger   — release ledgers (empty unless params.intermediate_lifecycle)
 ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 */
 
 include { PARTITION as PARTITION_REFERENCE } from '../../../modules/local/partition/main'
 include { PARTITION as PARTITION_QUERY  } from '../../../modules/local/partition/main'
 include { LASTZ     } from '../../../modules/local/lastz/main'
-include { PSLTOOLS_MERGE } from '../../../modules/local/psltools/merge/main'
+include { LASTZ_PACKED } from '../../../modules/local/lastz_packed/main'
+include { PSL_MERGE_SORTED } from '../../../modules/local/psl_merge_sorted/main'
+include { PSL_DEDUP      } from '../../../modules/local/psl_dedup/main'
+include { INTERMEDIATE_RELEASE as RELEASE_LASTZ_PSL  } from '../../../modules/local/intermediate_lifecycle/release/main'
+include { INTERMEDIATE_RELEASE as RELEASE_MERGED_PSL } from '../../../modules/local/intermediate_lifecycle/release/main'
 
 // Derive the bucket key from a reference partition string.
 // Regular: "reference.2bit:chr1:0-175000000"  → "bucket_ref_chr1_in_0_175000000"
@@ -36,86 +58,227 @@ def get_bucket_key(String partition) {
     }
 }
 
+// Reference chromosome group of a partition string: all chunks of a
+// chromosome form one group, every BULK partition is a group of its own.
+// Regular: "reference.2bit:chr1:0-175000000"  → "chrom_chr1"
+// Bulk:    "BULK_1:reference.2bit:chr1:chr2"  → "bulk_1"
+def get_chrom_group(String partition) {
+    if (partition.startsWith("BULK")) {
+        return "bulk_${partition.split(":")[0].split("_")[1]}".toString()
+    }
+    return "chrom_${partition.split(":")[1]}".toString()
+}
+
+// Bases covered by a partition string; BULK partitions are estimated as a
+// full bulk (0.75 × chunk size, see partition.py).
+def partition_bases(String partition, chunk) {
+    if (partition.startsWith("BULK")) {
+        return (long) ((chunk as long) * 0.75)
+    }
+    def startEnd = partition.split(":")[2].split("-")
+    return (startEnd[1] as long) - (startEnd[0] as long)
+}
+
+// LASTZ runtime grows with the product of both partition lengths.
+def pair_cost(String reference_part, String query_part) {
+    return (partition_bases(reference_part, params.seq1_chunk) as double) *
+           partition_bases(query_part, params.seq2_chunk)
+}
+
 workflow LASTZ_ALIGNMENT {
     take:
-    reference_prepared    // tuple: (reference_name, reference_twobit, reference_chrom_sizes)
-    query_prepared        // tuple: (query_name,  query_twobit,  query_chrom_sizes)
-    reference_chroms_dir  // tuple: (reference_name, dir/) — pre-extracted v1 FASTAs
-    query_chroms_dir      // tuple: (query_name,  dir/) — pre-extracted v1 FASTAs
+    pairs       // meta: [ id: "<reference>.<query>", reference: name, query: name ]
+    prepared    // tuple: (genome_name, twobit, chrom_sizes) — every genome of the run
+    chroms_dir  // tuple: (genome_name, dir/) — pre-extracted v1 FASTAs
 
     main:
     // ── Partition ───────────────────────────────────────────────────────────
     PARTITION_REFERENCE (
-        reference_prepared,
+        pairs.map { meta -> [ meta.reference ] }.unique().join( prepared ),
         'reference',
         params.seq1_chunk,
         params.seq1_lap
     )
     PARTITION_QUERY (
-        query_prepared,
+        pairs.map { meta -> [ meta.query ] }.unique().join( prepared ),
         'query',
         params.seq2_chunk,
         params.seq2_lap
     )
 
+    // ── Report LASTZ pairs saved by gap-aware partitioning ──────────────────
+    if (params.partition_gap_aware) {
+        def read_report = { report ->
+            report.readLines()
+                .findAll { it }
+                .collectEntries { line ->
+                    def fields = line.split('\t')
+                    [ (fields[0]): fields[1] as long ]
+                }
+        }
+        pairs
+            .map { meta -> [ meta.reference, meta ] }
+            .combine( PARTITION_REFERENCE.out.report, by: 0 )
+            .map { _ref, meta, reference_report -> [ meta.query, meta, reference_report ] }
+            .combine( PARTITION_QUERY.out.report, by: 0 )
+            .subscribe { _qry, meta, reference_report, query_report ->
+                def ref      = read_report(reference_report)
+                def qry      = read_report(query_report)
+                def baseline = ref.windows_baseline * qry.windows_baseline
+                def kept     = ref.windows * qry.windows
+                log.info "Gap-aware partitioning (${meta.id}): ${baseline - kept} of ${baseline} LASTZ pairs saved; " +
+                    "${ref.bases_saved} reference and ${qry.bases_saved} query bases removed from chunks"
+            }
+    }
+
     // ── Emit individual partition strings as channel items ──────────────────
+    // (genome_name, partition_str), one line per channel item
     reference_parts_ch = PARTITION_REFERENCE.out.partitions
-        .map { _name, part_file -> part_file }
-        .splitText()      // one line per channel item
-        .map { it.trim() }
-        .filter { it }    // drop empty lines
+        .splitText( elem: 1 )
+        .map { name, line -> [ name, line.trim() ] }
+        .filter { _name, part -> part }    // drop empty lines
 
     query_parts_ch = PARTITION_QUERY.out.partitions
-        .map { _name, part_file -> part_file }
-        .splitText()
-        .map { it.trim() }
-        .filter { it }
+        .splitText( elem: 1 )
+        .map { name, line -> [ name, line.trim() ] }
+        .filter { _name, part -> part }
 
-    // ── Cross-product N×K pairs ─────────────────────────────────────────────
+    // ── Cross-product N×K pairs of every alignment ──────────────────────────
     // Materialise the full pair list so we can both count it (for the
     // post-LASTZ integrity check) and feed it to LASTZ without consuming the
     // channel twice.
-    pairs_list  = reference_parts_ch.combine(query_parts_ch).collect(flat: false)
-    expected_n  = pairs_list.map { it.size() }
-    pairs_ch    = pairs_list.flatMap { it }
-    // pairs_ch emits: (reference_partition_str, query_partition_str)
+    pairs_list = pairs
+        .map { meta -> [ meta.reference, meta ] }
+        .combine( reference_parts_ch, by: 0 )
+        .map { _ref, meta, reference_part -> [ meta.query, meta, reference_part ] }
+        .combine( query_parts_ch, by: 0 )
+        .map { _qry, meta, reference_part, query_part -> [ meta, reference_part, query_part ] }
+        .collect(flat: false)
+    expected_n = pairs_list.map { it.size() }
+    // pairs_list emits: [ (meta, reference_partition_str, query_partition_str), ... ]
+
+    // Number of LASTZ pairs per alignment and reference bucket, so each bucket
+    // is merged as soon as its own pairs are done.
+    bucket_sizes = pairs_list.map { all_pairs ->
+        all_pairs
+            .groupBy { meta, reference_part, _query_part -> [ meta.id, get_bucket_key(reference_part).toString() ] }
+            .collectEntries { key, bucket_pairs -> [ (key): bucket_pairs.size() ] }
+    }
+    // Number of reference buckets per alignment.
+    alignment_sizes = bucket_sizes.map { sizes ->
+        sizes.keySet().countBy { key -> key[0] }
+    }
+    // Number of reference buckets per alignment and chromosome group.
+    group_sizes = pairs_list.map { all_pairs ->
+        all_pairs
+            .collect { meta, reference_part, _query_part ->
+                [ meta.id, get_chrom_group(reference_part), get_bucket_key(reference_part).toString() ]
+            }
+            .unique()
+            .countBy { id, group, _bucket -> [ id, group ] }
+    }
+
+    // ── Genome files of every alignment ─────────────────────────────────────
+    // alignment id → [ reference_twobit, query_twobit, reference_chrom_sizes,
+    //   query_chrom_sizes, reference_chroms_dir, query_chroms_dir,
+    //   reference_bulks, query_bulks ]
+    reference_files = prepared.join( chroms_dir ).join( PARTITION_REFERENCE.out.bulks )
+    query_files     = prepared.join( chroms_dir ).join( PARTITION_QUERY.out.bulks )
+
+    alignment_files = pairs
+        .map { meta -> [ meta.reference, meta ] }
+        .combine( reference_files, by: 0 )
+        .map { _ref, meta, tb, cs, dir, bulks -> [ meta.query, meta, tb, cs, dir, bulks ] }
+        .combine( query_files, by: 0 )
+        .map { _qry, meta, rtb, rcs, rdir, rbulks, qtb, qcs, qdir, qbulks ->
+            [ meta.id, [ rtb, qtb, rcs, qcs, rdir, qdir, rbulks, qbulks ] ]
+        }
+        .collect(flat: false)
+        .map { it.collectEntries() }
 
     // ── LASTZ alignment ─────────────────────────────────────────────────────
-    reference_twobit_ch       = reference_prepared.map { _n, tb, _cs -> tb }
-    reference_chrom_sz_ch     = reference_prepared.map { _n, _tb, cs -> cs }
-    reference_chroms_dir_ch   = reference_chroms_dir.map { _n, d -> d }
-    reference_name            = reference_prepared.map { n, _tb, _cs -> n.toString() }
-
-    query_twobit_ch        = query_prepared.map  { _n, tb, _cs -> tb }
-    query_chrom_sz_ch      = query_prepared.map  { _n, _tb, cs -> cs }
-    query_chroms_dir_ch    = query_chroms_dir.map  { _n, d -> d }
-    query_name             = query_prepared.map  { n, _tb, _cs -> n.toString() }
-
-    LASTZ (
-        pairs_ch,
-        reference_twobit_ch.first(),
-        query_twobit_ch.first(),
-        reference_chrom_sz_ch.first(),
-        query_chrom_sz_ch.first(),
-        reference_chroms_dir_ch.first(),
-        query_chroms_dir_ch.first(),
-        params.lastz_k,
-        params.lastz_h,
-        params.lastz_l,
-        params.lastz_y,
-    )
+    // One queue for all alignments, most expensive tasks first, so long tasks
+    // do not start last and the queue stays full until the end.
+    if (params.lastz_pack_size > 1) {
+        // Sort each alignment by reference partition so each pack covers as
+        // few reference chunks as possible, then cut its pair list into packs.
+        packs_ch = pairs_list
+            .combine( alignment_files )
+            .flatMap { all_pairs, files ->
+                all_pairs
+                    .groupBy { meta, _reference_part, _query_part -> meta.id }
+                    .collectMany { id, alignment_pairs ->
+                        def meta = alignment_pairs[0][0]
+                        alignment_pairs
+                            .collect { _meta, reference_part, query_part -> [ reference_part, query_part ] }
+                            .sort(false) { a, b -> a[0] <=> b[0] ?: a[1] <=> b[1] }
+                            .collate(params.lastz_pack_size as int)
+                            .collect { pack -> [ meta, pack ] + files[id] }
+                    }
+                    .sort(false) { a, b ->
+                        b[1].sum { p -> pair_cost(p[0], p[1]) } <=> a[1].sum { p -> pair_cost(p[0], p[1]) }
+                    }
+            }
+
+        LASTZ_PACKED (
+            packs_ch,
+            params.lastz_k,
+            params.lastz_h,
+            params.lastz_l,
+            params.lastz_y,
+        )
+
+        // packed_pairs.tsv: <reference_part> <query_part> <output file>
+        done_pairs_ch = LASTZ_PACKED.out.psl
+            .flatMap { meta, done, psls ->
+                def by_name = psls.collectEntries { f -> [ (f.name): f ] }
+                done.readLines()
+                    .findAll { it }
+                    .collect { line ->
+                        def fields = line.split('\t')
+                        [ meta, fields[0], by_name[fields[2]] ]
+                    }
+            }
+        lastz_versions_ch = LASTZ_PACKED.out.versions
+    } else {
+        lastz_pairs_ch = pairs_list
+            .combine( alignment_files )
+            .flatMap { all_pairs, files ->
+                all_pairs
+                    .sort(false) { a, b -> pair_cost(b[1], b[2]) <=> pair_cost(a[1], a[2]) }
+                    .collect { meta, reference_part, query_part ->
+                        [ meta, reference_part, query_part ] + files[meta.id]
+                    }
+            }
+
+        LASTZ (
+            lastz_pairs_ch,
+            params.lastz_k,
+            params.lastz_h,
+            params.lastz_l,
+            params.lastz_y,
+        )
+        done_pairs_ch = LASTZ.out.done
+            .map { meta, reference_part, psls ->
+                def files = psls instanceof List ? psls : [ psls ]
+                [ meta, reference_part, files ? files[0] : null ]
+            }
+        lastz_versions_ch = LASTZ.out.versions
+    }
+    // done_pairs_ch: one (meta, reference_part, psl or null) item per finished
+    // pair; pairs without alignments write no PSL.
+    actual_n = done_pairs_ch.count()
 
     // ── Integrity check: every expected pair must have completed ───────────
-    // versions.yml is emitted by every successful LASTZ task (no `optional`),
-    // so its count equals the number of tasks that ran to completion. With
-    // the strict errorStrategy in nextflow.config, a permanently-failed task
-    // already aborts the workflow before reaching this point; this assertion
-    // is the last-line defence against a Nextflow channel bug or a process
-    // that exits 0 without writing versions.yml.
-    actual_n = LASTZ.out.versions.count()
-    expected_n.combine( actual_n ).map { exp, got ->
+    // With the strict errorStrategy in nextflow.config, a permanently-failed
+    // task already aborts the workflow before reaching this point; this
+    // assertion is the last-line defence against a Nextflow channel bug or a
+    // process that exits 0 without finishing all of its pairs. With
+    // params.chain_streaming, chaining starts before it runs, so CHAIN_BUILD
+    // holds the final merge of every alignment back until it has passed.
+    verified_n = expected_n.combine( actual_n ).map { exp, got ->
         if (exp != got) {
-            error "LASTZ integrity check failed: expected ${exp} alignment tasks, " +
+            error "LASTZ integrity check failed: expected ${exp} alignment pairs, " +
                   "only ${got} produced output. ${exp - got} pair(s) were lost silently. " +
                   "Aborting before downstream chain building reads incomplete data."
         }
@@ -123,28 +286,124 @@ workflow LASTZ_ALIGNMENT {
         return got
     }
 
-    // ── Group PSL outputs by reference bucket, then PSLTOOLS_MERGE ───────────────────
-    bucketed_ch = LASTZ.out.psl
-        .map { reference_part, psl_file ->
-            def bucket = get_bucket_key(reference_part)
-            [ [ id:bucket ], psl_file ]
+    // ── Group finished pairs by alignment and reference bucket ──────────────
+    // groupKey counts finished pairs, with or without a PSL, so a bucket is
+    // released as soon as its own pairs are done. Buckets in which no pair
+    // found an alignment have nothing to merge and only mark the bucket done.
+    bucket_done_ch = done_pairs_ch
+        .combine( bucket_sizes )
+        .map { meta, reference_part, psl_file, sizes ->
+            def bucket = get_bucket_key(reference_part).toString()
+            def group  = get_chrom_group(reference_part)
+            [ groupKey([ id:bucket, pair:meta.id, group:group ], sizes[[ meta.id, bucket ]]), psl_file ]
         }
-        .groupTuple()    // ( [ bucket_key ], [psl_file, psl_file, ...] )
-
-    // ── Collect all PSL files into a single channel ───────────────────────────────────
-    PSLTOOLS_MERGE ( bucketed_ch )
-    PSLTOOLS_MERGE.out.psl
-        .map { meta, psl -> psl }
-        .collect()
-        .map { psl_files -> [psl_files] }
-        .combine(reference_name)
-        .combine(query_name)
-        .map { psl_files, ref, query -> 
-            [ [ id: "${ref}.${query}.all.psl" ], psl_files ] 
+        .groupTuple()
+        .map { key, psl_files -> [ key.getGroupTarget(), psl_files.findAll { it != null } ] }    // ( [ bucket_key, pair ], [psl_file, ...] )
+
+    bucketed_ch      = bucket_done_ch.filter { _meta, psl_files -> psl_files }
+    empty_buckets_ch = bucket_done_ch
+        .filter { _meta, psl_files -> !psl_files }
+        .map { meta, _psl_files -> [ meta, null ] }
+
+    PSL_MERGE_SORTED ( bucketed_ch )
+
+    // ── Drop copies of alignments found by two adjacent query chunks ────────
+    ch_versions = PARTITION_REFERENCE.out.versions
+        .mix( PARTITION_QUERY.out.versions, lastz_versions_ch, PSL_MERGE_SORTED.out.versions )
+    if (params.dedup_query_overlaps) {
+        query_partitions_ch = pairs
+            .map { meta -> [ meta.query, meta.id ] }
+            .combine( PARTITION_QUERY.out.partitions, by: 0 )
+            .map { _qry, id, part_file -> [ id, part_file ] }
+
+        PSL_DEDUP (
+            PSL_MERGE_SORTED.out.psl
+                .map { meta, psl -> [ meta.pair, meta, psl ] }
+                .combine( query_partitions_ch, by: 0 )
+                .map { _id, meta, psl, part_file -> [ meta, psl, part_file ] }
+        )
+        // One report per alignment; all-vs-all runs prefix it with the pair.
+        PSL_DEDUP.out.report
+            .collectFile(
+                keepHeader: true,
+                skip: 1,
+                storeDir: "${params.outdir}/03_concat_lastz_output"
+            ) { meta, report ->
+                [ params.pairs ? "${meta.pair}.query_overlap_dedup.tsv" : 'query_overlap_dedup.tsv', report ]
+            }
+        merged_psl_ch = PSL_DEDUP.out.psl
+        ch_versions   = ch_versions.mix(PSL_DEDUP.out.versions)
+    } else {
+        merged_psl_ch = PSL_MERGE_SORTED.out.psl
+    }
+
+    // ── Release intermediates as soon as they are consumed ──────────────────
+    // The per-pair PSLs of a bucket once it is merged; merged buckets once
+    // deduplicated (otherwise CHAIN_BUILD releases them after bundling).
+    ch_ledger = Channel.empty()
+    if (params.intermediate_lifecycle) {
+        RELEASE_LASTZ_PSL (
+            bucketed_ch
+                .join( PSL_MERGE_SORTED.out.psl )
+                .map { meta, psl_files, _merged -> [ meta, psl_files ] },
+            'lastz_psl',
+            params.intermediate_lifecycle
+        )
+        ch_ledger   = ch_ledger.mix(RELEASE_LASTZ_PSL.out.ledger)
+        ch_versions = ch_versions.mix(RELEASE_LASTZ_PSL.out.versions)
+
+        if (params.dedup_query_overlaps) {
+            RELEASE_MERGED_PSL (
+                PSL_MERGE_SORTED.out.psl
+                    .join( PSL_DEDUP.out.psl )
+                    .map { meta, merged, _deduped -> [ meta, merged ] },
+                'merged_psl',
+                params.intermediate_lifecycle
+            )
+            ch_ledger = ch_ledger.mix(RELEASE_MERGED_PSL.out.ledger)
         }
-        .set { ch_psl_files }
+    }
+
+    // ── Collect the merged PSL files of each alignment ──────────────────────
+    if (params.chain_streaming) {
+        // Alignments of a reference chromosome are final once every bucket
+        // of its group is done, so chaining can start while LASTZ runs on.
+        // Empty buckets count towards their group; a group without any PSL
+        // is still emitted (with no files) so CHAIN_BUILD can count it.
+        merged_psl_ch
+            .mix( empty_buckets_ch )
+            .combine( group_sizes )
+            .map { meta, psl, sizes ->
+                [ groupKey([ meta.pair, meta.group ], sizes[[ meta.pair, meta.group ]]), psl ]
+            }
+            .groupTuple()
+            .combine( group_sizes )
+            .map { key, psl_files, sizes ->
+                def (pair, group) = key.getGroupTarget()
+                def groups = sizes.keySet().count { k -> k[0] == pair }
+                [ [ id: "${pair}.${group}".toString(), pair: pair, group: group, groups: groups ],
+                  psl_files.findAll { it != null } ]
+            }
+            .set { ch_psl_files }
+    } else {
+        // Empty buckets count towards their alignment and are dropped after
+        // grouping; an alignment without any PSL is not chained.
+        merged_psl_ch
+            .mix( empty_buckets_ch )
+            .combine( alignment_sizes )
+            .map { meta, psl, sizes -> [ groupKey(meta.pair, sizes[meta.pair]), psl ] }
+            .groupTuple()
+            .map { key, psl_files ->
+                def pair = key.getGroupTarget()
+                [ [ id: "${pair}.all.psl".toString(), pair: pair ], psl_files.findAll { it != null } ]
+            }
+            .filter { _meta, psl_files -> psl_files }
+            .set { ch_psl_files }
+    }
 
     emit:
     psl_gz   = ch_psl_files
-    versions = PARTITION_REFERENCE.out.versions.mix(PARTITION_QUERY.out.versions, LASTZ.out.versions, PSLTOOLS_MERGE.out.versions)
+    verified = verified_n
+    ledger   = ch_ledger
+    versions = ch_versions
 }
@@ -11,6 +11,18 @@ Distributed under the terms of the Apache License, Version 2.0.
     directly — see modules/local/extract_chroms/main.nf). For v0 .2bit the
     chroms_dir is empty and lastz reads the .2bit natively.
 
+    Takes any number of genomes; each one is prepared once, so an all-vs-all
+    run shares the preparation of a genome between all of its pairs.
+
+    With params.genome_cache_dir set, the genome is first looked up in the
+    persistent genome cache (bin/genome_cache.py). A hit skips preparation
+    entirely; a miss prepares the genome as usual and stores the result.
+
+    With params.preflight set, every genome (cache hits included) is scanned
+    for poor soft-masking, hardmasking and unusable scaffold names
+    (bin/preflight.py) and only emitted once its scan has passed; findings
+    are logged as warnings, and in abort mode an error stops the run.
+
     Emits:
       prepared   — (genome_name, twobit_file, chrom_sizes_file)
       chroms_dir — (genome_name, dir_of_<chrom>.fa)   empty dir for v0
@@ -20,34 +32,46 @@ Distributed under the terms of the Apache License, Version 2.0.
 include { FA_TO_TWO_BIT  } from '../../../modules/local/fa_to_two_bit/main'
 include { CHROMSIZE      } from '../../../modules/local/chromsize/main'
 include { EXTRACT_CHROMS } from '../../../modules/local/extract_chroms/main'
+include { GENOME_CACHE_LOOKUP } from '../../../modules/local/genome_cache/lookup/main'
+include { GENOME_CACHE_STORE  } from '../../../modules/local/genome_cache/store/main'
+include { PREFLIGHT_SCAN      } from '../../../modules/local/preflight/scan/main'
 
 workflow PREPARE_GENOMES {
     take:
-    genome_name    // val: e.g. 'hg38'
-    genome_path    // val: path to genome file (FASTA or .2bit)
+    genomes        // channel: (genome_name, genome_path) — FASTA or .2bit
     extract_chroms // val: true/false
 
     main:
     ch_versions = Channel.empty()
+    ch_input    = genomes.map { name, path -> [ name, file(path) ] }
+    ch_genome   = ch_input
 
-    // Generate chrom.sizes format agnostic
-    CHROMSIZE ( Channel.of( [ genome_name, genome_path ] ) )
+    // Consult the persistent genome cache; only misses are prepared below.
+    if (params.genome_cache_dir) {
+        GENOME_CACHE_LOOKUP ( ch_genome, params.genome_cache_dir, extract_chroms )
+        ch_cache_status = GENOME_CACHE_LOOKUP.out.status
+        ch_genome = ch_cache_status
+            .filter { _n, _key, status -> status == 'miss' }
+            .map { n, _key, _status -> [ n ] }
+            .join( ch_input )
 
-    // Determine if the input is already a .2bit file
-    def is_twobit = genome_path.endsWith('.2bit')
+        ch_versions = ch_versions.mix(GENOME_CACHE_LOOKUP.out.versions)
+    }
 
-    if (is_twobit) {
-        // Already .2bit — stage the file directly
-        twobit_ch = Channel.of( [ genome_name, file(genome_path) ] )
-    } else {
-        // Convert FASTA → .2bit
-        fa_ch = Channel.of( [ genome_name, file(genome_path) ] )
-        FA_TO_TWO_BIT ( fa_ch )
-        twobit_ch = FA_TO_TWO_BIT.out.twobit
+    // Generate chrom.sizes format agnostic
+    CHROMSIZE ( ch_genome )
 
-        ch_versions = ch_versions.mix(FA_TO_TWO_BIT.out.versions)
+    // .2bit inputs are staged directly, FASTA inputs are converted
+    ch_format = ch_genome.branch { _n, genome ->
+        twobit: genome.name.endsWith('.2bit')
+        fasta:  true
     }
 
+    FA_TO_TWO_BIT ( ch_format.fasta )
+    twobit_ch = ch_format.twobit.mix( FA_TO_TWO_BIT.out.twobit )
+
+    ch_versions = ch_versions.mix(FA_TO_TWO_BIT.out.versions)
+
     // Join twobit and chrom_sizes on genome_name
     prepared_ch = twobit_ch.join( CHROMSIZE.out.chrom_sizes )
 
@@ -62,6 +86,39 @@ workflow PREPARE_GENOMES {
         ch_versions = ch_versions.mix(EXTRACT_CHROMS.out.versions)
     }
 
+    // Publish freshly prepared genomes and merge cache hits back in.
+    if (params.genome_cache_dir) {
+        ch_store_chroms = extract_chroms
+            ? ch_extracted_chroms.map { n, dir -> [ n, [ dir ] ] }
+            : prepared_ch.map { n, _tb, _cs -> [ n, [] ] }
+
+        GENOME_CACHE_STORE (
+            ch_cache_status
+                .map { n, key, _status -> [ n, key ] }
+                .join( prepared_ch )
+                .join( ch_store_chroms ),
+            params.genome_cache_dir
+        )
+
+        prepared_ch = prepared_ch.mix( GENOME_CACHE_LOOKUP.out.prepared )
+        if (extract_chroms) {
+            ch_extracted_chroms = ch_extracted_chroms.mix( GENOME_CACHE_LOOKUP.out.chroms_dir )
+        }
+
+        ch_versions = ch_versions.mix(GENOME_CACHE_STORE.out.versions)
+    }
+
+    // Hold every genome back until its pre-flight scan has passed.
+    if (params.preflight) {
+        PREFLIGHT_SCAN ( prepared_ch.map { n, twobit, _cs -> [ n, twobit ] } )
+        PREFLIGHT_SCAN.out.issues.subscribe { n, issues ->
+            issues.eachLine { line -> log.warn "Pre-flight ${n}: ${line.replace('\t', ': ')}" }
+        }
+        prepared_ch = prepared_ch.join( PREFLIGHT_SCAN.out.report.map { n, _report -> [ n ] } )
+
+        ch_versions = ch_versions.mix(PREFLIGHT_SCAN.out.versions)
+    }
+
     ch_versions = ch_versions.mix(CHROMSIZE.out.versions)
 
     emit:
@@ -0,0 +1,71 @@
+/*
+Copyright (c) 2026 The Hiller Lab at the Senckenberg Gessellschaft für Naturforschung
+Distributed under the terms of the Apache License, Version 2.0.
+*/
+
+/*
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    Channel helpers for runs over one or more genome pairs
+
+    Every alignment is identified by its pair id "<reference>.<query>". Data
+    items carry it as meta.pair; the genome files of each alignment travel in
+    a separate genomes channel keyed by the pair id:
+      (pair, reference_twobit, query_twobit, reference_chrom_sizes, query_chrom_sizes)
+    A single-pair run is the special case of one pair.
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+*/
+
+// Meta map of one alignment.
+def pairMeta(reference_name, query_name) {
+    return [
+        id:        "${reference_name}.${query_name}".toString(),
+        reference: reference_name.toString(),
+        query:     query_name.toString()
+    ]
+}
+
+// Genome files of every alignment, from the prepared genomes
+// (genome_name, twobit, chrom_sizes).
+def pairGenomes(pairs, prepared) {
+    return pairs
+        .map { meta -> [ meta.reference, meta ] }
+        .combine( prepared, by: 0 )
+        .map { _ref, meta, twobit, chrom_sizes -> [ meta.query, meta.id, twobit, chrom_sizes ] }
+        .combine( prepared, by: 0 )
+        .map { _qry, pair, rtb, rcs, qtb, qcs -> [ pair, rtb, qtb, rcs, qcs ] }
+}
+
+// (meta, file) → (meta, file, reference_twobit, query_twobit)
+def withTwobits(items, genomes) {
+    return items
+        .map { meta, item -> [ meta.pair, meta, item ] }
+        .combine( genomes.map { pair, rtb, qtb, _rcs, _qcs -> [ pair, rtb, qtb ] }, by: 0 )
+        .map { _pair, meta, item, rtb, qtb -> [ meta, item, rtb, qtb ] }
+}
+
+// (meta, file) → (meta, file, reference_twobit, query_twobit,
+//                 reference_chrom_sizes, query_chrom_sizes)
+def withGenomes(items, genomes) {
+    return items
+        .map { meta, item -> [ meta.pair, meta, item ] }
+        .combine( genomes, by: 0 )
+        .map { _pair, meta, item, rtb, qtb, rcs, qcs -> [ meta, item, rtb, qtb, rcs, qcs ] }
+}
+
+// Group the (meta, file) items of every alignment into (pair, [files]).
+// meta[size_key] holds the number of items of the alignment, so each group
+// is released as soon as it is complete rather than when the channel closes.
+def groupByPair(items, String size_key) {
+    return items
+        .map { meta, item -> [ groupKey(meta.pair, meta[size_key]), item ] }
+        .groupTuple( remainder: true )
+        .map { key, group -> [ key.getGroupTarget(), group ] }
+}
+
+// Split (meta, [files]) into one (meta + [pair, size_key], file) item per file.
+def scatterByPair(items, String size_key) {
+    return items.flatMap { meta, files ->
+        def list = files instanceof List ? files : [ files ]
+        list.collect { f -> [ meta + [ (size_key): list.size() ], f ] }
+    }
+}
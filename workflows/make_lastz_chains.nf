@@ -7,95 +7,117 @@ Distributed under the terms of the Apache License, Version 2.0.
 ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     make_lastz_chains — main pipeline workflow (nf-core style)
 
+    Aligns one or more genome pairs (a single run is one pair; --pairs gives
+    an all-vs-all sheet). Genomes shared by several pairs are prepared and
+    partitioned once, LASTZ tasks of all pairs share one queue, and every
+    pair then gets its own chain build, fill and clean.
+
     Steps:
     0. Validate required parameters
-    1. Prepare reference and query genomes (FASTA→2bit if needed, chrom.sizes)
+    1. Prepare every distinct genome (FASTA→2bit if needed, chrom.sizes),
+       with params.preflight scan it and estimate the LASTZ cost of each pair
     2. LASTZ alignment (partition → align → concatenate PSL files)
-    3. Chain building (sort → bundle → axtChain → merge)
+    3. Chain building (sort → bundle → axtChain → merge); with
+       params.chain_streaming per reference chromosome while LASTZ runs on
     4. Fill chains (optional)
     5. Clean chains (optional)
+    6. Disk high-water report of released intermediates (optional)
 ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 */
 
-include { PREPARE_GENOMES as PREPARE_REFERENCE_GENOME } from '../subworkflows/local/prepare_genomes/main'
-include { PREPARE_GENOMES as PREPARE_QUERY_GENOME } from '../subworkflows/local/prepare_genomes/main'
+include { PREPARE_GENOMES    } from '../subworkflows/local/prepare_genomes/main'
 include { LASTZ_ALIGNMENT    } from '../subworkflows/local/lastz_alignment/main'
 include { CHAIN_BUILD        } from '../subworkflows/local/chain_build/main'
 include { FILL_CLEAN_CHAINS  } from '../subworkflows/local/fill_clean_chains/main'
+include { INTERMEDIATE_REPORT } from '../modules/local/intermediate_lifecycle/report/main'
+include { PREFLIGHT_ESTIMATE  } from '../modules/local/preflight/estimate/main'
+include { pairMeta; pairGenomes } from '../subworkflows/local/utils_pairs/main'
 
 workflow MAKE_LASTZ_CHAINS {
     take:
-    reference_name     // val
-    query_name      // val
-    reference_genome   // val: path string
-    query_genome    // val: path string
+    pairs   // tuple: (reference_name, reference_genome, query_name, query_genome)
 
     main:
     ch_versions = Channel.empty()
 
+    ch_pairs = pairs.map { reference_name, _rg, query_name, _qg -> pairMeta(reference_name, query_name) }
+
     // ── 1. Prepare genomes ─────────────────────────────────────────────────
-    PREPARE_REFERENCE_GENOME (
-        reference_name,
-        reference_genome,
-        true
-    )
-    PREPARE_QUERY_GENOME (
-        query_name,
-        query_genome,
+    // Each distinct genome once, whichever role(s) it plays.
+    PREPARE_GENOMES (
+        pairs
+            .flatMap { reference_name, reference_genome, query_name, query_genome ->
+                [ [ reference_name, reference_genome ], [ query_name, query_genome ] ]
+            }
+            .unique(),
         true
     )
+    ch_versions = ch_versions.mix(PREPARE_GENOMES.out.versions)
 
-    ch_versions = ch_versions.mix(
-        PREPARE_REFERENCE_GENOME.out.versions,
-        PREPARE_QUERY_GENOME.out.versions
-    )
+    // INFO: (genome_name, twobit, chrom_sizes)
+    prepared = PREPARE_GENOMES.out.prepared
+    // INFO: (genome_name, dir/) — populated for v1 .2bit, empty for v0
+    chroms_dir = PREPARE_GENOMES.out.chroms_dir
 
-    // INFO: (reference_name, reference_twobit, reference_chrom_sizes)
-    reference_prepared = PREPARE_REFERENCE_GENOME.out.prepared
-    query_prepared  = PREPARE_QUERY_GENOME.out.prepared
+    // INFO: (pair, reference_twobit, query_twobit, reference_chrom_sizes, query_chrom_sizes)
+    ch_genomes = pairGenomes(ch_pairs, prepared)
 
-    // INFO: (reference_name, dir/) — populated for v1 .2bit, empty for v0
-    reference_chroms_dir = PREPARE_REFERENCE_GENOME.out.chroms_dir
-    query_chroms_dir  = PREPARE_QUERY_GENOME.out.chroms_dir
+    // Pre-flight LASTZ cost estimate; a pair is only aligned once it passed.
+    ch_aligned_pairs = ch_pairs
+    if (params.preflight) {
+        PREFLIGHT_ESTIMATE (
+            ch_genomes.map { pair, _rtb, _qtb, rcs, qcs -> [ pair, rcs, qcs ] },
+            file(params.resource_model)
+        )
+        PREFLIGHT_ESTIMATE.out.issues.subscribe { pair, issues ->
+            issues.eachLine { line -> log.warn "Pre-flight ${pair}: ${line.replace('\t', ': ')}" }
+        }
+        ch_aligned_pairs = ch_pairs
+            .map { meta -> [ meta.id, meta ] }
+            .join( PREFLIGHT_ESTIMATE.out.report.map { pair, _report -> [ pair ] } )
+            .map { _pair, meta -> meta }
+        ch_versions = ch_versions.mix(PREFLIGHT_ESTIMATE.out.versions)
+    }
 
     // ── 2. LASTZ alignment ─────────────────────────────────────────────────
     LASTZ_ALIGNMENT (
-        reference_prepared,
-        query_prepared,
-        reference_chroms_dir,
-        query_chroms_dir
+        ch_aligned_pairs,
+        prepared,
+        chroms_dir
     )
     ch_versions = ch_versions.mix(LASTZ_ALIGNMENT.out.versions)
 
     // ── 3. Chain building ──────────────────────────────────────────────────
-    reference_twobit_val     = reference_prepared.map { _n, tb, _cs -> tb }.first()
-    query_twobit_val      = query_prepared.map  { _n, tb, _cs -> tb }.first()
-    reference_chrom_sz_val   = reference_prepared.map { _n, _tb, cs -> cs }.first()
-
     CHAIN_BUILD (
         LASTZ_ALIGNMENT.out.psl_gz,
-        reference_twobit_val,
-        query_twobit_val,
-        reference_chrom_sz_val,
-        reference_name,
-        query_name
+        ch_genomes,
+        LASTZ_ALIGNMENT.out.verified
     )
     ch_versions = ch_versions.mix(CHAIN_BUILD.out.versions)
 
     // ── 4 & 5. Fill and clean chains (optional) ────────────────────────────
-    query_chrom_sz_val = query_prepared.map { _n, _tb, cs -> cs }.first()
-
     FILL_CLEAN_CHAINS (
         CHAIN_BUILD.out.merged_chain,
-        reference_twobit_val,
-        query_twobit_val,
-        reference_chrom_sz_val,
-        query_chrom_sz_val,
-        reference_name,
-        query_name
+        ch_genomes
     )
     ch_versions = ch_versions.mix(FILL_CLEAN_CHAINS.out.versions)
 
+    // ── 6. Disk high-water report (params.intermediate_lifecycle) ──────────
+    if (params.intermediate_lifecycle) {
+        INTERMEDIATE_REPORT (
+            LASTZ_ALIGNMENT.out.ledger
+                .mix( CHAIN_BUILD.out.ledger, FILL_CLEAN_CHAINS.out.ledger )
+                .map { _meta, ledger -> ledger }
+                .collectFile(
+                    name: 'intermediate_ledger.tsv',
+                    keepHeader: true,
+                    skip: 1,
+                    storeDir: "${params.outdir}/pipeline_info"
+                )
+        )
+        ch_versions = ch_versions.mix(INTERMEDIATE_REPORT.out.versions)
+    }
+
     emit:
     final_chain = FILL_CLEAN_CHAINS.out.final_chain
     versions    = ch_versions